@@ -0,0 +1,117 @@
+"""Run Lox scripts with and without some options: check that they behave the
+same, and compare their times.
+
+Each script runs as `pylox SCRIPT` and as `pylox SCRIPT OPTION ...`, in this
+process and alternately, keeping the best time of each. Both runs must print
+the same output and errors and exit with the same status, else the
+differences are shown and the exit status is 1.
+
+    pdm run python benchmarks/compare.py [--repeat R] SCRIPT ... -- OPTION ...
+"""
+
+import argparse
+import contextlib
+import difflib
+import io
+import sys
+import time
+from typing import List, Tuple
+
+import pylox
+from pylox.error import LoxError
+
+# What a run of a script does: its output, its errors and its exit status.
+Behavior = Tuple[str, str, int]
+
+
+def runScript(argv: List[str]) -> Tuple[float, Behavior]:
+    """Run pylox with these arguments, and return the time it took and what
+    it did."""
+    output = io.StringIO()
+    errors = io.StringIO()
+    status = 0
+
+    saved = sys.argv
+    sys.argv = ["pylox", *argv]
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(errors):
+            pylox.main()
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+    finally:
+        elapsed = time.perf_counter() - start
+        sys.argv = saved
+        LoxError.reset_error()
+        LoxError.reset_runtime_error()
+
+    return elapsed, (output.getvalue(), errors.getvalue(), status)
+
+
+def differences(script: str, without: Behavior, with_: Behavior) -> List[str]:
+    lines: List[str] = []
+    for name, a, b in zip(("output", "errors"), without[:2], with_[:2]):
+        if a != b:
+            lines += difflib.unified_diff(
+                a.splitlines(),
+                b.splitlines(),
+                f"{script} {name}",
+                f"{script} {name} with options",
+                lineterm="",
+            )
+    if without[2] != with_[2]:
+        lines.append(f"exit status {without[2]}, {with_[2]} with options")
+    return lines
+
+
+def parse_args(argv: List[str]) -> Tuple[argparse.Namespace, List[str]]:
+    parser = argparse.ArgumentParser(
+        description="Check that Lox scripts behave the same with and without "
+        "some options, and compare their times.",
+        usage="%(prog)s [--repeat R] SCRIPT ... -- OPTION ...",
+    )
+    parser.add_argument("scripts", nargs="+", metavar="SCRIPT")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        metavar="R",
+        help="keep the best time of R runs (default: 3)",
+    )
+
+    if "--" not in argv:
+        parser.error("expected -- and the options to compare")
+    split = argv.index("--")
+    return parser.parse_args(argv[:split]), argv[split + 1 :]
+
+
+def main(argv: List[str]) -> int:
+    args, options = parse_args(argv)
+
+    print(f"options: {' '.join(options)}")
+    print(f"{'script':<40}{'without':>10}{'with':>10}{'ratio':>9}")
+
+    failed = False
+    for script in args.scripts:
+        best = [float("inf"), float("inf")]
+        behaviors: List[Behavior] = []
+        for _ in range(args.repeat):
+            behaviors = []
+            for i, argv in enumerate(([script], [script, *options])):
+                elapsed, behavior = runScript(argv)
+                best[i] = min(best[i], elapsed)
+                behaviors.append(behavior)
+
+        ratio = best[1] / best[0] if best[0] > 0 else float("nan")
+        print(f"{script:<40}{best[0]:>9.3f}s{best[1]:>9.3f}s{ratio:>9.2f}")
+
+        lines = differences(script, *behaviors)
+        if lines:
+            failed = True
+            print("\n".join(f"    {line}" for line in lines))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,333 @@
+"""Scaling benchmarks: how scanning, parsing and running grow with the input.
+
+Each family generates Lox programs of growing N and measures each phase on
+its own: the best time of a few runs, then the peak memory allocated while
+the phase runs, traced with tracemalloc in a separate run so that tracing
+doesn't inflate the times. The output is one table per family, time and
+memory against N, and the growth exponent fitted on a log-log scale: about
+1 for linear growth, 2 for quadratic.
+
+A program that fails, such as by hitting a recursion limit, ends its family
+there and is reported as a failure.
+
+    pdm run python benchmarks/scaling.py [FAMILY ...] [--check EXPONENT]
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pylox.error import LoxError
+from pylox.interpreter import Interpreter
+from pylox.parser import Parser
+from pylox.scanner import Scanner
+
+PHASES = ("scan", "parse", "run")
+
+# Below this many seconds, times are mostly noise: they are shown but not
+# used to fit exponents.
+MIN_FITTED_TIME = 0.005
+
+
+@dataclass
+class Family:
+    description: str
+    generate: Callable[[int], str]
+    # The values of N, doubling.
+    sizes: List[int]
+
+
+@dataclass
+class Measure:
+    n: int
+    # Best time in seconds and peak memory in bytes, by phase.
+    times: Dict[str, float] = field(default_factory=dict)
+    peaks: Dict[str, int] = field(default_factory=dict)
+    failure: Optional[str] = None
+
+
+class PhaseFailed(Exception):
+    pass
+
+
+def name(index: int) -> str:
+    """A distinct identifier for each index, which is never a keyword:
+    identifiers can't have digits."""
+    letters = ""
+    index += 1
+    while index > 0:
+        index, letter = divmod(index - 1, 26)
+        letters = chr(ord("a") + letter) + letters
+
+    return "x" + letters
+
+
+def sizeProgram(n: int) -> str:
+    """N top-level functions, each declared, called and stored."""
+    lines = []
+    for i in range(n):
+        lines.append(f"fun {name(i)}(x) {{ if (x > 1) return x * 2; return x; }}")
+        lines.append(f"var {name(i)}r = {name(i)}({i});")
+    return "\n".join(lines)
+
+
+def nestingProgram(n: int) -> str:
+    """An expression and a block both nested N deep."""
+    expression = "(" * n + "1" + " + 1)" * n
+    blocks = "{ " * n + f"var x = {expression};" + " }" * n
+    return blocks
+
+
+def environmentProgram(n: int) -> str:
+    """A loop reading a variable declared N blocks further out."""
+    lines = ["var total = 0;", "{ var top = 1;"]
+    for i in range(n):
+        lines.append(f"{{ var {name(i)} = {i};")
+    lines.append("for (var i = 0; i < 2000; i = i + 1) total = total + top;")
+    lines.append("}" * (n + 1))
+    return "\n".join(lines)
+
+
+def callProgram(n: int) -> str:
+    """A function recursing N calls deep, a few times."""
+    return f"""
+fun down(n) {{
+  if (n < 1) return 0;
+  return down(n - 1) + 1;
+}}
+for (var i = 0; i < 20; i = i + 1) down({n});
+"""
+
+
+def stringProgram(n: int) -> str:
+    """A string built by N concatenations."""
+    return f"""
+var s = "";
+for (var i = 0; i < {n}; i = i + 1) s = s + "x";
+"""
+
+
+FAMILIES: Dict[str, Family] = {
+    "size": Family("top-level declarations", sizeProgram, [250, 500, 1000, 2000, 4000]),
+    "nesting": Family(
+        "nesting depth of expressions and blocks",
+        nestingProgram,
+        [8, 16, 32, 64, 128, 256, 512],
+    ),
+    "env": Family(
+        "environment depth of a variable read",
+        environmentProgram,
+        [8, 16, 32, 64, 128, 256, 512],
+    ),
+    "calls": Family("call depth", callProgram, [8, 16, 32, 64, 128, 256, 512]),
+    "strings": Family(
+        "concatenations building a string",
+        stringProgram,
+        [2000, 4000, 8000, 16000, 32000],
+    ),
+}
+
+
+def scan(source: str) -> Any:
+    return Scanner(source).scan_tokens()
+
+
+def parse(tokens: Any) -> Any:
+    statements = Parser(tokens).parse()
+    if LoxError.had_error():
+        raise PhaseFailed("syntax error")
+    return statements
+
+
+def run(statements: Any) -> Any:
+    Interpreter().interpret(statements)
+    if LoxError.had_runtime_error():
+        raise PhaseFailed("runtime error")
+
+
+def runPhases(source: str, traced: bool) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """Scan, parse and run a program, and return the time and the peak memory
+    of each phase. Peaks are only measured when `traced`."""
+    times: Dict[str, float] = {}
+    peaks: Dict[str, int] = {}
+
+    value: Any = source
+    output = io.StringIO()
+    for phase, function in zip(PHASES, (scan, parse, run)):
+        if traced:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                value = function(value)
+        except RecursionError:
+            raise PhaseFailed(f"{phase}: Python recursion limit") from None
+        except PhaseFailed as e:
+            message = output.getvalue().strip().splitlines()
+            detail = f" ({message[0]})" if message else ""
+            raise PhaseFailed(f"{phase}: {e}{detail}") from None
+        finally:
+            LoxError.reset_error()
+            LoxError.reset_runtime_error()
+        times[phase] = time.perf_counter() - start
+
+        if traced:
+            peaks[phase] = tracemalloc.get_traced_memory()[1] - before
+
+    return times, peaks
+
+
+def measure(source: str, n: int, repeat: int) -> Measure:
+    result = Measure(n)
+    try:
+        for _ in range(repeat):
+            times, _ = runPhases(source, traced=False)
+            for phase, elapsed in times.items():
+                result.times[phase] = min(result.times.get(phase, elapsed), elapsed)
+
+        tracemalloc.start()
+        try:
+            _, result.peaks = runPhases(source, traced=True)
+        finally:
+            tracemalloc.stop()
+    except PhaseFailed as e:
+        result.failure = str(e)
+
+    return result
+
+
+def exponent(points: List[Tuple[int, float]]) -> Optional[float]:
+    """The slope of the least-squares line through the points on a log-log
+    scale, or None with fewer than two."""
+    points = [(n, y) for n, y in points if y > 0]
+    if len(points) < 2:
+        return None
+
+    xs = [math.log(n) for n, _ in points]
+    ys = [math.log(y) for _, y in points]
+    meanX = sum(xs) / len(xs)
+    meanY = sum(ys) / len(ys)
+    variance = sum((x - meanX) ** 2 for x in xs)
+    covariance = sum((x - meanX) * (y - meanY) for x, y in zip(xs, ys))
+    return covariance / variance
+
+
+def exponents(measures: List[Measure]) -> Dict[str, Optional[float]]:
+    """Fitted exponents of time and memory, keyed like the table columns."""
+    done = [m for m in measures if m.failure is None]
+    fitted: Dict[str, Optional[float]] = {}
+    for phase in PHASES:
+        fitted[f"{phase} s"] = exponent(
+            [(m.n, m.times[phase]) for m in done if m.times[phase] >= MIN_FITTED_TIME]
+        )
+        fitted[f"{phase} KiB"] = exponent([(m.n, m.peaks[phase]) for m in done])
+    return fitted
+
+
+def report(key: str, family: Family, measures: List[Measure]) -> Dict[str, Any]:
+    columns = [f"{phase} s" for phase in PHASES] + [f"{phase} KiB" for phase in PHASES]
+    print(f"{key}: N = {family.description}")
+    print(f"{'N':>8}" + "".join(f"{column:>11}" for column in columns))
+
+    for m in measures:
+        if m.failure is not None:
+            print(f"{m.n:>8}  failed: {m.failure}")
+            continue
+
+        cells = [f"{m.times[phase]:>11.4f}" for phase in PHASES]
+        cells += [f"{m.peaks[phase] / 1024:>11.0f}" for phase in PHASES]
+        print(f"{m.n:>8}" + "".join(cells))
+
+    fitted = exponents(measures)
+    cells = [
+        f"{'-' if fitted[column] is None else format(fitted[column], '.2f'):>11}"
+        for column in columns
+    ]
+    print(f"{'~N^':>8}" + "".join(cells))
+    print()
+
+    return fitted
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure how scanning, parsing and running Lox programs "
+        "scale with their size, nesting, environment depth and call depth."
+    )
+    parser.add_argument(
+        "families",
+        nargs="*",
+        metavar="FAMILY",
+        help=f"families of programs to run (default: all of {', '.join(FAMILIES)})",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        metavar="R",
+        help="keep the best time of R runs (default: 3)",
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=1,
+        metavar="K",
+        help="multiply every N by K",
+    )
+    parser.add_argument(
+        "--recursion-limit",
+        type=int,
+        metavar="FRAMES",
+        help="set Python's recursion limit, to measure past the default one",
+    )
+    parser.add_argument(
+        "--check",
+        type=float,
+        metavar="EXPONENT",
+        help="exit with status 1 if a program fails or a time or memory curve "
+        "grows faster than N^EXPONENT",
+    )
+
+    args = parser.parse_args(argv)
+    for key in args.families:
+        if key not in FAMILIES:
+            parser.error(f"unknown family '{key}'")
+
+    return args
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    if args.recursion_limit is not None:
+        sys.setrecursionlimit(args.recursion_limit)
+
+    failed = False
+    for key in args.families or list(FAMILIES):
+        family = FAMILIES[key]
+        measures: List[Measure] = []
+        for n in family.sizes:
+            n *= args.scale
+            measures.append(measure(family.generate(n), n, args.repeat))
+            if measures[-1].failure is not None:
+                break
+
+        fitted = report(key, family, measures)
+        if args.check is not None:
+            failed = failed or measures[-1].failure is not None
+            failed = failed or any(
+                value is not None and value > args.check for value in fitted.values()
+            )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,32 +1,238 @@
+import argparse
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
 
-from pylox.error import LoxError
-from pylox.interpreter import Interpreter
-from pylox.parser import Parser
-from pylox.scanner import Scanner
+# The interpreter is imported when needed, so that --connect starts quickly.
+if TYPE_CHECKING:
+    from pylox.budget import Budget
+    from pylox.interpreter import Interpreter
 
 
 def main() -> None:
-    arg_count = len(sys.argv)
-    if arg_count > 2:
-        print("Usage: jlox [script]")
-        sys.exit(64)
+    args = parse_args(sys.argv[1:])
 
-    interpreter = Interpreter()
+    if args.lsp:
+        from pylox.lsp import serve
 
-    if arg_count > 1:
-        run_file(interpreter, Path(sys.argv[1]))
-    else:
-        run_prompt(interpreter)
+        serve()
+        return
+
+    if args.fork_server is not None:
+        from pylox import fork_server
+
+        fork_server.serve(args.fork_server)
+        return
+
+    if args.connect is not None:
+        from pylox import fork_server
+
+        if args.script is None:
+            raise RuntimeError("--connect needs a Lox script")
+
+        sys.exit(fork_server.request(args.connect, sys.argv[1:]))
+
+    from pylox.interpreter import Interpreter
+
+    interpreter_class = Interpreter
+    if args.use_async:
+        from pylox.async_interpreter import AsyncInterpreter
+
+        interpreter_class = AsyncInterpreter
+
+    interpreter = interpreter_class(
+        memoize=args.memoize,
+        memo_size=args.memo_size,
+        trace=args.trace,
+        budget=make_budget(args),
+    )
+    if args.map_jobs is not None:
+        interpreter.map_jobs = args.map_jobs
+    if args.snapshot is not None:
+        from pylox.snapshot import Snapshot
+
+        interpreter.snapshot = Snapshot(args.snapshot)
+
+    try:
+        if args.script is not None:
+            run_file(interpreter, args.script, args)
+        else:
+            run_prompt(interpreter, args)
+    finally:
+        if args.memo_stats:
+            for cache in interpreter.memo_caches:
+                print(cache, file=sys.stderr)
+        if args.trace_stats and interpreter.tracer is not None:
+            print(interpreter.tracer.stats, file=sys.stderr)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="pylox")
+    parser.add_argument("script", nargs="?", type=Path)
+    parser.add_argument(
+        "--lsp",
+        action="store_true",
+        help="run a language server over stdio instead of a script",
+    )
+    parser.add_argument(
+        "--fork-server",
+        type=Path,
+        metavar="SOCKET",
+        help="serve scripts sent with --connect on a Unix socket, from forks of "
+        "a warmed-up process",
+    )
+    parser.add_argument(
+        "--connect",
+        type=Path,
+        metavar="SOCKET",
+        help="run the script in the fork server listening on SOCKET",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="run the script on an asyncio event loop, with the natives sleep, "
+        "readFile, run, spawn and wait",
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="run the script in the debugger, stopping before its first statement",
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=Path,
+        metavar="FILE",
+        help="save the globals to FILE when the script calls snapshot(), and "
+        "resume from FILE on later runs of the same script",
+    )
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="parse function bodies on their first call",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="with --lazy, still report syntax errors in bodies before running",
+    )
+    parser.add_argument(
+        "--parse-jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="parse large programs on N processes (default: 1)",
+    )
+    parser.add_argument(
+        "--map-jobs",
+        type=int,
+        metavar="N",
+        help="run parallelMap on N processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--memoize",
+        action="store_true",
+        help="cache the results of pure functions",
+    )
+    parser.add_argument(
+        "--memo-size",
+        type=int,
+        default=256,
+        metavar="N",
+        help="maximum number of cached results per function (default: 256)",
+    )
+    parser.add_argument(
+        "--memo-stats",
+        action="store_true",
+        help="print memoization hits and misses to stderr on exit",
+    )
+
+    parser.add_argument(
+        "--inline",
+        action="store_true",
+        help="replace calls to small functions by the expression they return",
+    )
+
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="compute loop invariants once per loop and reuse repeated expressions",
+    )
+
+    parser.add_argument(
+        "--infer-types",
+        action="store_true",
+        help="skip checking the operands of arithmetic proven to be numbers",
+    )
+
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="compile hot loops over numbers and booleans to Python",
+    )
+    parser.add_argument(
+        "--trace-stats",
+        action="store_true",
+        help="with --trace, print how many loops were compiled, run and "
+        "deoptimized to stderr on exit",
+    )
+
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        metavar="N",
+        help="stop the script after N loop iterations and function calls",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        metavar="N",
+        help="stop the script when calls nest more than N deep",
+    )
+    parser.add_argument(
+        "--max-time",
+        type=float,
+        metavar="SECONDS",
+        help="stop the script after running for SECONDS",
+    )
+    parser.add_argument(
+        "--max-values",
+        type=int,
+        metavar="N",
+        help="stop the script after it allocates about N values",
+    )
+
+    args = parser.parse_args(argv)
+    if args.debug and args.use_async:
+        parser.error("--debug can't be combined with --async")
+    if args.snapshot is not None:
+        if args.script is None:
+            parser.error("--snapshot needs a Lox script")
+        if args.debug or args.use_async:
+            parser.error("--snapshot can't be combined with --debug or --async")
 
+    return args
+
+
+def make_budget(args: argparse.Namespace) -> Optional["Budget"]:
+    limits = (args.max_steps, args.max_depth, args.max_time, args.max_values)
+    if all(limit is None for limit in limits):
+        return None
+
+    from pylox.budget import Budget
+
+    return Budget(*limits)
+
+
+def run_file(interpreter: "Interpreter", path: Path, args: argparse.Namespace) -> None:
+    from pylox.error import LoxError
 
-def run_file(interpreter: Interpreter, path: Path) -> None:
     if not path.exists():
         raise RuntimeError("could not open Lox script")
 
     content = path.read_text()
-    run(interpreter, content)
+    interpreter.directory = path.resolve().parent
+    run(interpreter, content, args)
 
     # Indicate an error in the system exit code.
     if LoxError.had_error():
@@ -35,24 +241,80 @@ def run_file(interpreter: Interpreter, path: Path) -> None:
         sys.exit(70)
 
 
-def run_prompt(interpreter: Interpreter) -> None:
+def run_prompt(interpreter: "Interpreter", args: argparse.Namespace) -> None:
+    from pylox.error import LoxError
+
     while True:
         try:
             line = input("> ")
         except EOFError:
             break
 
-        run(interpreter, line)
+        run(interpreter, line, args)
         LoxError.reset_error()
 
 
-def run(interpreter: Interpreter, source: str) -> None:
-    tokens = Scanner(source).scan_tokens()
-    parser = Parser(tokens)
-    statements = parser.parse()
+def run(interpreter: "Interpreter", source: str, args: argparse.Namespace) -> None:
+    from pylox.error import LoxError
+    from pylox.parallel_parser import parseParallel
+    from pylox.parser import Parser
+    from pylox.scanner import Scanner
+
+    # The debugger needs every statement up front.
+    lazy = args.lazy and not args.debug
+
+    if args.parse_jobs > 1:
+        statements = parseParallel(
+            source, args.parse_jobs, lazy=lazy, strict=args.strict
+        )
+    else:
+        tokens = Scanner(source).scan_tokens()
+        parser = Parser(tokens, lazy=lazy, strict=args.strict)
+        statements = parser.parse()
 
     # Stop if there was a syntax error
     if LoxError.had_error():
         return
 
-    interpreter.interpret(statements)
+    # Only whole scripts: a later line in the prompt could redefine a function.
+    inline = args.inline and args.script is not None and not args.debug
+    if inline and interpreter.budget is None:
+        from pylox.inliner import Inliner
+
+        Inliner().inline(statements)
+
+    # The async interpreter runs loops without emptying the slots of their
+    # invariants.
+    optimize = args.optimize and not (args.debug or args.use_async)
+    if optimize and interpreter.budget is None:
+        from pylox.optimizer import optimize as optimizeProgram
+
+        optimizeProgram(statements)
+
+    # Only whole scripts: a function from an earlier line in the prompt could
+    # assign to any variable.
+    if args.infer_types and args.script is not None and not args.debug:
+        from pylox.type_inference import TypeInference
+
+        TypeInference().infer(statements)
+
+    # After the passes, which need the whole program.
+    if interpreter.snapshot is not None:
+        from pylox.snapshot import SnapshotError
+
+        try:
+            statements = interpreter.snapshot.resume(interpreter, source, statements)
+        except SnapshotError as e:
+            print(e, file=sys.stderr)
+            sys.exit(70)
+
+    if args.debug:
+        from pylox.debugger import Debugger
+
+        Debugger(interpreter, source).run(statements)
+    elif args.use_async:
+        import asyncio
+
+        asyncio.run(interpreter.interpretAsync(statements))  # type: ignore
+    else:
+        interpreter.interpret(statements)
@@ -0,0 +1,625 @@
+"""Running scripts on an asyncio event loop.
+
+The tree-walker makes Lox calls on the Python stack, so a native can only
+suspend a script if every frame between it and the event loop is a coroutine.
+AsyncEvaluator has coroutine versions of the visitors for the nodes that
+contain a call, and hands every other node to the synchronous visitors of the
+interpreter: code between calls runs at the usual speed, and only calls pay
+for being able to suspend.
+"""
+
+import asyncio
+import copy
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pylox.callable import LoxCallable
+from pylox.environment import Environment
+from pylox.error import LoxError, LoxRuntimeError, NativeError
+from pylox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Conditional,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from pylox.function import LoxFunction
+from pylox.interpreter import CALLABLE_TYPES, Interpreter, _declaresNames
+from pylox.interpreter import Break as BreakLoop
+from pylox.lox_class import LoxClass
+from pylox.lox_instance import LoxInstance
+from pylox.lox_return import Return as ReturnValue
+from pylox.native import NativeObject, checkFunction
+from pylox.stmt import (
+    Block,
+    Break,
+    Class,
+    Expression,
+    For,
+    Function,
+    If,
+    Import,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from pylox.token_type import TokenType
+
+
+class AsyncNative(LoxCallable, ABC):
+    """A native function that suspends the calling script until a coroutine
+    completes."""
+
+    name = "native"
+
+    @abstractmethod
+    def arity(self) -> int: ...
+
+    @abstractmethod
+    async def callAsync(
+        self, interpreter: "AsyncInterpreter", arguments: List[Any]
+    ): ...
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        # Native callbacks and module bodies run on the tree-walker.
+        raise NativeError(
+            f"Can't call '{self.name}' from a native callback or a module body."
+        )
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+class SleepNative(AsyncNative):
+    name = "sleep"
+
+    def arity(self) -> int:
+        return 1
+
+    async def callAsync(self, interpreter: "AsyncInterpreter", arguments: List[Any]):
+        seconds = arguments[0]
+        if not isinstance(seconds, float) or seconds < 0:
+            raise NativeError("Sleep duration must be a non-negative number.")
+
+        await asyncio.sleep(seconds)
+        return None
+
+
+class ReadFileNative(AsyncNative):
+    name = "readFile"
+
+    def arity(self) -> int:
+        return 1
+
+    async def callAsync(self, interpreter: "AsyncInterpreter", arguments: List[Any]):
+        if not isinstance(arguments[0], str):
+            raise NativeError("Path must be a string.")
+
+        # Files have no non-blocking interface: read on the default executor.
+        path = interpreter.directory / arguments[0]
+        try:
+            return await asyncio.to_thread(path.read_text)
+        except OSError as e:
+            raise NativeError(f"Can't read '{arguments[0]}': {e.strerror}.") from None
+
+
+class RunNative(AsyncNative):
+    name = "run"
+
+    def arity(self) -> int:
+        return 1
+
+    async def callAsync(self, interpreter: "AsyncInterpreter", arguments: List[Any]):
+        if not isinstance(arguments[0], str):
+            raise NativeError("Command must be a string.")
+
+        process = await asyncio.create_subprocess_shell(
+            arguments[0], stdout=asyncio.subprocess.PIPE, cwd=interpreter.directory
+        )
+        output, _ = await process.communicate()
+        if process.returncode != 0:
+            raise NativeError(f"Command exited with status {process.returncode}.")
+
+        return output.decode()
+
+
+class LoxTask(NativeObject):
+    """A function running concurrently with the script that spawned it."""
+
+    def __init__(self, task: "asyncio.Task[Any]") -> None:
+        self.task = task
+
+    def stringify(self, stringify: Callable[[Any], str]) -> str:
+        return "<task>"
+
+
+class SpawnNative(LoxCallable):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        if not isinstance(interpreter, AsyncInterpreter):
+            raise NativeError("Can't call 'spawn' outside an async script.")
+
+        function = checkFunction(arguments[0], 0)
+        return LoxTask(interpreter.spawn(function))
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+class WaitNative(AsyncNative):
+    name = "wait"
+
+    def arity(self) -> int:
+        return 1
+
+    async def callAsync(self, interpreter: "AsyncInterpreter", arguments: List[Any]):
+        if not isinstance(arguments[0], LoxTask):
+            raise NativeError("Can only wait for tasks.")
+
+        return await arguments[0].task
+
+
+class SuspensionAnalyzer(ExprVisitor[bool], StmtVisitor[bool]):
+    """Find the nodes whose evaluation may suspend: those containing a call.
+
+    Results are cached by node, for every interpreter sharing the analyzer.
+    """
+
+    def __init__(self) -> None:
+        # Keyed by id(), nodes not being hashable. The node is kept alive so
+        # that its id is not reused.
+        self.cache: Dict[int, Tuple[Expr | Stmt, bool]] = {}
+
+    def suspends(self, node: Expr | Stmt | None) -> bool:
+        if node is None:
+            return False
+
+        entry = self.cache.get(id(node))
+        if entry is None:
+            entry = (node, node.accept(self))
+            self.cache[id(node)] = entry
+
+        return entry[1]
+
+    def bodySuspends(self, declaration: Function) -> bool:
+        return any(self.suspends(statement) for statement in declaration.body)
+
+    def visitAssignExpr(self, expr: Assign) -> bool:
+        return self.suspends(expr.value)
+
+    def visitBinaryExpr(self, expr: Binary) -> bool:
+        return self.suspends(expr.left) or self.suspends(expr.right)
+
+    def visitCallExpr(self, expr: Call) -> bool:
+        return True
+
+    def visitConditionalExpr(self, expr: Conditional) -> bool:
+        return (
+            self.suspends(expr.condition)
+            or self.suspends(expr.left)
+            or self.suspends(expr.right)
+        )
+
+    def visitGetExpr(self, expr: Get) -> bool:
+        return self.suspends(expr.object)
+
+    def visitGroupingExpr(self, expr: Grouping) -> bool:
+        return self.suspends(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> bool:
+        return False
+
+    def visitLogicalExpr(self, expr: Logical) -> bool:
+        return self.suspends(expr.left) or self.suspends(expr.right)
+
+    def visitSetExpr(self, expr: Set) -> bool:
+        return self.suspends(expr.object) or self.suspends(expr.value)
+
+    def visitSuperExpr(self, expr: Super) -> bool:
+        return False
+
+    def visitThisExpr(self, expr: This) -> bool:
+        return False
+
+    def visitUnaryExpr(self, expr: Unary) -> bool:
+        return self.suspends(expr.right)
+
+    def visitVariableExpr(self, expr: Variable) -> bool:
+        return False
+
+    def visitBlockStmt(self, stmt: Block) -> bool:
+        return any(self.suspends(statement) for statement in stmt.statements)
+
+    def visitBreakStmt(self, stmt: Break) -> bool:
+        return False
+
+    # Declarations don't run any body.
+    def visitClassStmt(self, stmt: Class) -> bool:
+        return False
+
+    def visitExpressionStmt(self, stmt: Expression) -> bool:
+        return self.suspends(stmt.expression)
+
+    def visitForStmt(self, stmt: For) -> bool:
+        return (
+            self.suspends(stmt.initializer)
+            or self.suspends(stmt.condition)
+            or self.suspends(stmt.increment)
+            or self.suspends(stmt.body)
+        )
+
+    def visitFunctionStmt(self, stmt: Function) -> bool:
+        return False
+
+    def visitIfStmt(self, stmt: If) -> bool:
+        return (
+            self.suspends(stmt.condition)
+            or self.suspends(stmt.thenBranch)
+            or self.suspends(stmt.elseBranch)
+        )
+
+    def visitImportStmt(self, stmt: Import) -> bool:
+        return False
+
+    def visitPrintStmt(self, stmt: Print) -> bool:
+        return self.suspends(stmt.expression)
+
+    def visitReturnStmt(self, stmt: Return) -> bool:
+        return self.suspends(stmt.value)
+
+    def visitVarStmt(self, stmt: Var) -> bool:
+        return self.suspends(stmt.initializer)
+
+    def visitWhileStmt(self, stmt: While) -> bool:
+        return self.suspends(stmt.condition) or self.suspends(stmt.body)
+
+
+class AsyncInterpreter(Interpreter):
+    """An interpreter whose scripts run as asyncio tasks, and can call the
+    coroutine natives `sleep`, `readFile`, `run`, `spawn` and `wait`.
+
+    Each task needs its own interpreter, the current environment being
+    interpreter state. Tasks spawned by a script share its globals.
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+
+        self.analyzer = SuspensionAnalyzer()
+        self.evaluator = AsyncEvaluator(self)
+
+        # Spawned tasks not finished yet, shared with the spawned interpreters.
+        self.tasks: set[asyncio.Task[Any]] = set()
+
+        self.globals.define("sleep", SleepNative())
+        self.globals.define("readFile", ReadFileNative())
+        self.globals.define("run", RunNative())
+        self.globals.define("spawn", SpawnNative())
+        self.globals.define("wait", WaitNative())
+
+    async def interpretAsync(self, statements: List[Stmt]) -> None:
+        if self.budget is not None:
+            self.budget.start()
+
+        try:
+            for statement in statements:
+                await self.evaluator.execute(statement)
+        except LoxRuntimeError as e:
+            LoxError.runtimeError(e)
+
+        # The script is done once everything it spawned is.
+        while self.tasks:
+            await asyncio.wait(list(self.tasks))
+
+    def spawn(self, function: LoxCallable) -> "asyncio.Task[Any]":
+        child = copy.copy(self)
+        child.environment = self.globals
+        child.evaluator = AsyncEvaluator(child)
+
+        task = asyncio.get_running_loop().create_task(child._runTask(function))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _runTask(self, function: LoxCallable) -> Any:
+        try:
+            return await self.evaluator.callFunction(function, [])
+        except LoxRuntimeError as e:
+            LoxError.runtimeError(e)
+            return None
+
+
+class AsyncEvaluator(ExprVisitor[Awaitable[Any]], StmtVisitor[Awaitable[None]]):
+    """The visitors of the interpreter for nodes that may suspend."""
+
+    def __init__(self, interpreter: AsyncInterpreter) -> None:
+        self.interpreter = interpreter
+        self.analyzer = interpreter.analyzer
+
+    async def evaluate(self, expr: Expr) -> Any:
+        if self.analyzer.suspends(expr):
+            return await expr.accept(self)
+
+        return expr.accept(self.interpreter)
+
+    async def execute(self, stmt: Stmt) -> None:
+        if self.analyzer.suspends(stmt):
+            await stmt.accept(self)
+        else:
+            stmt.accept(self.interpreter)
+
+    async def executeBlock(
+        self, statements: List[Stmt], environment: Environment
+    ) -> None:
+        previous = self.interpreter.environment
+
+        try:
+            self.interpreter.environment = environment
+
+            for statement in statements:
+                await self.execute(statement)
+
+        finally:
+            self.interpreter.environment = previous
+
+    async def callFunction(self, callee: Any, arguments: List[Any]) -> Any:
+        """Call a callee whose arity has been checked."""
+        interpreter = self.interpreter
+
+        if isinstance(callee, AsyncNative):
+            return await callee.callAsync(interpreter, arguments)
+
+        # Bodies without calls can't suspend: they run on the tree-walker,
+        # memoization and all.
+        if type(callee) is LoxClass:
+            initializer = callee.methods.get("init")
+            if initializer is None or not self._suspends(initializer):
+                return callee.call(interpreter, arguments)
+
+            if interpreter.budget is not None:
+                interpreter.budget.values += 1
+
+            instance = LoxInstance(callee)
+            await self._invoke(initializer, instance, arguments)
+            return instance
+
+        if type(callee) is LoxFunction and self._suspends(callee):
+            return await self._invoke(callee, callee.instance, arguments)
+
+        return callee.call(interpreter, arguments)
+
+    def _suspends(self, function: LoxFunction) -> bool:
+        if function.declaration.lazy is not None:
+            function._parseBody()
+
+        return self.analyzer.bodySuspends(function.declaration)
+
+    async def _invoke(
+        self,
+        function: LoxFunction,
+        instance: Optional[LoxInstance],
+        arguments: List[Any],
+    ) -> Any:
+        environment = Environment(function.closure)
+        if instance is not None:
+            environment.define("this", instance)
+        for i, p in enumerate(function.declaration.params):
+            environment.define(p.lexeme, arguments[i])
+
+        budget = self.interpreter.budget
+        try:
+            if budget is not None:
+                budget.depth += 1
+                budget.step(function.declaration.name)
+                if budget.depth > budget.depth_limit:
+                    budget.check(function.declaration.name)
+
+            await self.executeBlock(function.declaration.body, environment)
+        except ReturnValue as r:
+            if not function.is_initializer:
+                return r.value
+        finally:
+            if budget is not None:
+                budget.depth -= 1
+
+        if function.is_initializer:
+            return environment.values["this"]
+
+        return None
+
+    async def visitAssignExpr(self, expr: Assign) -> Any:
+        value = await self.evaluate(expr.value)
+        self.interpreter.environment.assign(expr.name, value)
+
+        return value
+
+    async def visitBinaryExpr(self, expr: Binary) -> Any:
+        left = await self.evaluate(expr.left)  # type: ignore
+        right = await self.evaluate(expr.right)  # type: ignore
+
+        return self.interpreter._binaryOperation(expr, left, right)
+
+    async def visitCallExpr(self, expr: Call) -> Any:
+        callee = await self.evaluate(expr.callee)
+        arguments = [await self.evaluate(argument) for argument in expr.arguments]
+
+        kind = type(callee)
+        callable = CALLABLE_TYPES.get(kind)
+        if callable is None:
+            callable = CALLABLE_TYPES[kind] = isinstance(callee, LoxCallable)
+
+        if not callable:
+            raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
+
+        if len(arguments) != callee.arity():
+            raise LoxRuntimeError(
+                expr.paren,
+                f"Expected {callee.arity()} arguments but got {len(arguments)}.",
+            )
+
+        try:
+            return await self.callFunction(callee, arguments)
+        except NativeError as e:
+            raise LoxRuntimeError(expr.paren, *e.args) from None
+        except RecursionError:
+            raise LoxRuntimeError(expr.paren, "Stack overflow.") from None
+
+    async def visitConditionalExpr(self, expr: Conditional) -> Any:
+        if await self.evaluate(expr.condition):
+            return await self.evaluate(expr.left)  # type: ignore
+
+        return await self.evaluate(expr.right)  # type: ignore
+
+    async def visitGetExpr(self, expr: Get) -> Any:
+        object = await self.evaluate(expr.object)  # type: ignore
+        return self.interpreter._getProperty(expr, object)
+
+    async def visitGroupingExpr(self, expr: Grouping) -> Any:
+        return await self.evaluate(expr.expression)  # type: ignore
+
+    async def visitLiteralExpr(self, expr: Literal) -> Any:
+        return expr.value
+
+    async def visitLogicalExpr(self, expr: Logical) -> Any:
+        left = await self.evaluate(expr.left)
+
+        if expr.operator.type == TokenType.OR:
+            if self.interpreter._isTruthy(left):
+                return left
+        else:
+            if not self.interpreter._isTruthy(left):
+                return left
+
+        return await self.evaluate(expr.right)
+
+    async def visitSetExpr(self, expr: Set) -> Any:
+        object = await self.evaluate(expr.object)  # type: ignore
+
+        if not isinstance(object, LoxInstance):
+            raise LoxRuntimeError(expr.name, "Only instances have fields.")
+
+        value = await self.evaluate(expr.value)  # type: ignore
+        return self.interpreter._setField(expr, object, value)
+
+    async def visitSuperExpr(self, expr: Super) -> Any:
+        return self.interpreter.visitSuperExpr(expr)
+
+    async def visitThisExpr(self, expr: This) -> Any:
+        return self.interpreter.visitThisExpr(expr)
+
+    async def visitUnaryExpr(self, expr: Unary) -> Any:
+        right = await self.evaluate(expr.right)  # type: ignore
+
+        if expr.operator.type == TokenType.MINUS:
+            self.interpreter._checkNumberOperand(expr.operator, right)
+            return -right
+
+        return not self.interpreter._isTruthy(right)
+
+    async def visitVariableExpr(self, expr: Variable) -> Any:
+        return self.interpreter.visitVariableExpr(expr)
+
+    async def visitBlockStmt(self, stmt: Block) -> None:
+        await self.executeBlock(
+            stmt.statements, Environment(self.interpreter.environment)
+        )
+
+    async def visitBreakStmt(self, stmt: Break) -> None:
+        raise BreakLoop()
+
+    async def visitClassStmt(self, stmt: Class) -> None:
+        self.interpreter.visitClassStmt(stmt)
+
+    async def visitExpressionStmt(self, stmt: Expression) -> None:
+        await self.evaluate(stmt.expression)
+
+    async def visitForStmt(self, stmt: For) -> None:
+        interpreter = self.interpreter
+        previous = interpreter.environment
+        condition = stmt.condition
+        increment = stmt.increment
+
+        body: List[Stmt] = [stmt.body]
+        if isinstance(stmt.body, Block) and not _declaresNames(stmt.body.statements):
+            body = stmt.body.statements
+
+        try:
+            if isinstance(stmt.initializer, Var):
+                interpreter.environment = Environment(previous)
+            if stmt.initializer is not None:
+                await self.execute(stmt.initializer)
+
+            budget = interpreter.budget
+            while condition is None or interpreter._isTruthy(
+                await self.evaluate(condition)
+            ):
+                if budget is not None:
+                    budget.step(stmt.keyword)
+
+                for statement in body:
+                    await self.execute(statement)
+
+                if increment is not None:
+                    await self.evaluate(increment)
+        except BreakLoop:
+            pass
+        finally:
+            interpreter.environment = previous
+
+    async def visitFunctionStmt(self, stmt: Function) -> None:
+        self.interpreter.visitFunctionStmt(stmt)
+
+    async def visitIfStmt(self, stmt: If) -> None:
+        if self.interpreter._isTruthy(await self.evaluate(stmt.condition)):
+            await self.execute(stmt.thenBranch)
+        elif stmt.elseBranch:
+            await self.execute(stmt.elseBranch)
+
+    async def visitImportStmt(self, stmt: Import) -> None:
+        self.interpreter.visitImportStmt(stmt)
+
+    async def visitPrintStmt(self, stmt: Print) -> None:
+        value = await self.evaluate(stmt.expression)
+        print(self.interpreter._stringify(value))
+
+    async def visitReturnStmt(self, stmt: Return) -> None:
+        value: Any = None
+        if stmt.value is not None:
+            value = await self.evaluate(stmt.value)
+
+        raise ReturnValue(value)
+
+    async def visitVarStmt(self, stmt: Var) -> None:
+        value = None
+        if stmt.initializer:
+            value = await self.evaluate(stmt.initializer)
+
+        self.interpreter.environment.define(stmt.name.lexeme, value)
+
+    async def visitWhileStmt(self, stmt: While) -> None:
+        interpreter = self.interpreter
+
+        try:
+            budget = interpreter.budget
+            while interpreter._isTruthy(await self.evaluate(stmt.condition)):
+                if budget is not None:
+                    budget.step(stmt.keyword)
+
+                await self.execute(stmt.body)
+        except BreakLoop:
+            pass
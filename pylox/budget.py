@@ -0,0 +1,106 @@
+import sys
+import time
+from dataclasses import dataclass
+from typing import NoReturn, Optional
+
+from pylox.error import LoxRuntimeError, NativeError
+from pylox.token import Token
+
+# Steps between two checks of the limits on steps, wall time and values.
+CHECK_INTERVAL = 1024
+
+# Characters of a string counted as one value. Longer strings are checked
+# against the limit as soon as they are created.
+STRING_CHUNK = 64
+
+
+@dataclass
+class Budget:
+    """Limits on one run of the interpreter, for running untrusted scripts.
+
+    A step is a loop iteration or a function call: a script can't run for
+    long without taking steps. Taking a step decrements `countdown`, and the
+    limits are checked when it goes negative, every CHECK_INTERVAL steps, or
+    when `depth` goes over `depth_limit`. The interpreter does both inline,
+    so that a budget costs little more than an attribute update per step.
+
+    Values are counted as they are created: instances and their fields,
+    closures, strings (one per STRING_CHUNK characters) and the elements of
+    native collections. Small ones only increment `values` and are checked
+    with the steps; allocate() checks large ones at once. Values are not
+    freed from the budget when collected.
+
+    Exceeding a limit raises a LoxRuntimeError at the token given, or a
+    NativeError when called from a native, which has none.
+    """
+
+    max_steps: Optional[int] = None
+    max_depth: Optional[int] = None
+    max_time: Optional[float] = None
+    max_values: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        self.depth_limit = sys.maxsize if self.max_depth is None else self.max_depth
+        self.start()
+
+    def start(self) -> None:
+        """Start a new run."""
+        self.steps = 0
+        self.depth = 0
+        self.values = 0
+        self.deadline: Optional[float] = None
+        if self.max_time is not None:
+            self.deadline = time.monotonic() + self.max_time
+
+        self._refill()
+
+    def step(self, token: Token) -> None:
+        self.countdown -= 1
+        if self.countdown < 0:
+            self.check(token)
+
+    def check(self, token: Token) -> None:
+        if self.depth > self.depth_limit:
+            self._exceeded(token, f"call depth over {self.max_depth}")
+        if self.countdown >= 0:
+            return
+
+        # Every step since the last check, this one included.
+        self.steps += self.chunk + 1
+        if self.max_steps is not None and self.steps > self.max_steps:
+            self._exceeded(token, f"more than {self.max_steps} steps")
+
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self._exceeded(token, f"ran for more than {self.max_time:g} seconds")
+
+        self._checkValues(token)
+        self._refill()
+
+    def allocate(self, count: int, token: Optional[Token] = None) -> None:
+        self.values += count
+        self._checkValues(token)
+
+    def allocateString(self, string: str, token: Token) -> None:
+        if len(string) <= STRING_CHUNK:
+            self.values += 1
+        else:
+            self.allocate(len(string) // STRING_CHUNK + 1, token)
+
+    def _checkValues(self, token: Optional[Token]) -> None:
+        if self.max_values is not None and self.values > self.max_values:
+            self._exceeded(token, f"more than {self.max_values} values allocated")
+
+    def _refill(self) -> None:
+        chunk = CHECK_INTERVAL
+        if self.max_steps is not None:
+            chunk = max(0, min(chunk, self.max_steps - self.steps))
+
+        self.chunk = chunk
+        self.countdown = chunk
+
+    def _exceeded(self, token: Optional[Token], reason: str) -> NoReturn:
+        message = f"Execution budget exceeded: {reason}."
+        if token is None:
+            raise NativeError(message)
+
+        raise LoxRuntimeError(token, message)
@@ -0,0 +1,198 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from pylox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Conditional,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from pylox.stmt import (
+    Block,
+    Break,
+    Class,
+    Expression,
+    For,
+    Function,
+    If,
+    Import,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+
+
+@dataclass
+class Captures:
+    """The free variables of a function: the names its body (nested functions
+    included) uses without declaring them.
+
+    `flat` is False when they can't all be known statically, because the body
+    declares classes, imports modules, uses `this` or `super` or has a nested
+    function that was not parsed yet. Such a function keeps its whole enclosing
+    environment as closure.
+    """
+
+    flat: bool
+    names: List[str] = field(default_factory=list)
+
+
+class CaptureAnalyzer(ExprVisitor[None], StmtVisitor[None]):
+    """Find the free variables of a function body, see Captures."""
+
+    def __init__(self) -> None:
+        self.scopes: List[set[str]] = []
+        # Used as an ordered set.
+        self.free: Dict[str, None] = {}
+        self.flat: bool = True
+
+    def analyze(self, function: Function) -> Captures:
+        """Analyse a function whose body has been parsed."""
+        self.scopes = []
+        self.free = {}
+        self.flat = True
+
+        self._analyzeFunction(function)
+
+        return Captures(self.flat, list(self.free) if self.flat else [])
+
+    def visitBlockStmt(self, stmt: Block) -> None:
+        self.scopes.append(set())
+        try:
+            self._analyzeStatements(stmt.statements)
+        finally:
+            self.scopes.pop()
+
+    def visitBreakStmt(self, stmt: Break) -> None:
+        pass
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        self.flat = False
+
+    def visitExpressionStmt(self, stmt: Expression) -> None:
+        self._analyzeExpr(stmt.expression)
+
+    def visitForStmt(self, stmt: For) -> None:
+        self.scopes.append(set())
+        try:
+            if stmt.initializer is not None:
+                stmt.initializer.accept(self)
+            self._analyzeExpr(stmt.condition)
+            self._analyzeExpr(stmt.increment)
+            stmt.body.accept(self)
+        finally:
+            self.scopes.pop()
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        # Declared first, so that the function can refer to itself.
+        self.scopes[-1].add(stmt.name.lexeme)
+        self._analyzeFunction(stmt)
+
+    def visitIfStmt(self, stmt: If) -> None:
+        self._analyzeExpr(stmt.condition)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch.accept(self)
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        self.flat = False
+
+    def visitPrintStmt(self, stmt: Print) -> None:
+        self._analyzeExpr(stmt.expression)
+
+    def visitReturnStmt(self, stmt: Return) -> None:
+        self._analyzeExpr(stmt.value)
+
+    def visitVarStmt(self, stmt: Var) -> None:
+        self._analyzeExpr(stmt.initializer)
+        self.scopes[-1].add(stmt.name.lexeme)
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        self._analyzeExpr(stmt.condition)
+        stmt.body.accept(self)
+
+    def visitAssignExpr(self, expr: Assign) -> None:
+        self._analyzeExpr(expr.value)
+        self._use(expr.name.lexeme)
+
+    def visitBinaryExpr(self, expr: Binary) -> None:
+        self._analyzeExpr(expr.left)
+        self._analyzeExpr(expr.right)
+
+    def visitCallExpr(self, expr: Call) -> None:
+        self._analyzeExpr(expr.callee)
+        for argument in expr.arguments:
+            self._analyzeExpr(argument)
+
+    def visitConditionalExpr(self, expr: Conditional) -> None:
+        self._analyzeExpr(expr.condition)
+        self._analyzeExpr(expr.left)
+        self._analyzeExpr(expr.right)
+
+    def visitGetExpr(self, expr: Get) -> None:
+        self._analyzeExpr(expr.object)
+
+    def visitGroupingExpr(self, expr: Grouping) -> None:
+        self._analyzeExpr(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> None:
+        pass
+
+    def visitLogicalExpr(self, expr: Logical) -> None:
+        self._analyzeExpr(expr.left)
+        self._analyzeExpr(expr.right)
+
+    def visitSetExpr(self, expr: Set) -> None:
+        self._analyzeExpr(expr.object)
+        self._analyzeExpr(expr.value)
+
+    def visitSuperExpr(self, expr: Super) -> None:
+        self.flat = False
+
+    def visitThisExpr(self, expr: This) -> None:
+        self.flat = False
+
+    def visitUnaryExpr(self, expr: Unary) -> None:
+        self._analyzeExpr(expr.right)
+
+    def visitVariableExpr(self, expr: Variable) -> None:
+        self._use(expr.name.lexeme)
+
+    def _analyzeFunction(self, function: Function) -> None:
+        if function.lazy is not None:
+            self.flat = False
+            return
+
+        self.scopes.append({p.lexeme for p in function.params})
+        try:
+            self._analyzeStatements(function.body)
+        finally:
+            self.scopes.pop()
+
+    def _analyzeStatements(self, statements: List[Stmt]) -> None:
+        for statement in statements:
+            if not self.flat:
+                return
+            statement.accept(self)
+
+    def _analyzeExpr(self, expr: Optional[Expr]) -> None:
+        if expr is not None and self.flat:
+            expr.accept(self)
+
+    def _use(self, name: str) -> None:
+        if not any(name in scope for scope in self.scopes):
+            self.free[name] = None
@@ -0,0 +1,443 @@
+"""Interactive debugger, `pylox --debug`.
+
+The debugger stops a program by hooking statements: it replaces the `accept`
+method of a statement node with a function that checks whether to stop and
+then runs the statement. While the program runs freely only the statements of
+the lines with a breakpoint are hooked, and while stepping every statement is.
+With no breakpoints, nothing is hooked and the program runs as fast as without
+the debugger.
+"""
+
+import sys
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional
+
+from pylox.environment import Cell, Environment
+from pylox.error import LoxError, LoxRuntimeError
+from pylox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Conditional,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from pylox.function import LoxFunction
+from pylox.interpreter import Interpreter
+from pylox.stmt import (
+    Block,
+    Break,
+    Class,
+    Expression,
+    For,
+    Function,
+    If,
+    Import,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+
+# The frames of Lox calls on the Python stack run one of these, once they
+# have created the environment of the call: a call of a bound method or a
+# memoized call runs callBound from a frame of call.
+INVOKE_CODES = (LoxFunction.call.__code__, LoxFunction.callBound.__code__)
+
+# Lines shown around the current one by `list`.
+LIST_CONTEXT = 5
+
+HELP = """\
+break LINE (b)     stop at LINE; without LINE, list breakpoints
+clear LINE         remove the breakpoint at LINE
+continue (c)       run until a breakpoint
+step (s)           run until the next statement
+next (n)           run until the next statement in this function
+finish (f)         run until this function returns
+print EXPR (p)     evaluate an expression in the current scope
+env (e)            show the variables of every enclosing scope
+where (w)          show the calls being run
+list (l)           show the source around the current line
+quit (q)           stop the program"""
+
+
+class StepMode(IntEnum):
+    CONTINUE = 0
+    STEP = 1
+    NEXT = 2
+    FINISH = 3
+
+
+class LineIndex(ExprVisitor[Optional[int]], StmtVisitor[None]):
+    """Find the statements of a program the debugger can stop at, nested ones
+    and those of function and method bodies included, and their lines.
+
+    A statement is on the line of its first token. Only the outermost
+    statement of a line is stopped at, so that a line stops once. Statements
+    without a token, like blocks and expression statements that are only a
+    literal, are not.
+    """
+
+    def __init__(self) -> None:
+        self.statements: List[Stmt] = []
+        # Their lines, by id: statements compare equal when they look the same.
+        self.lines: Dict[int, int] = {}
+        self.by_line: Dict[int, List[Stmt]] = {}
+
+        self._enclosing: Optional[int] = None
+
+    def index(self, statements: List[Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def _add(self, stmt: Stmt, line: Optional[int], *children: Optional[Stmt]):
+        if line is not None and line != self._enclosing:
+            self.statements.append(stmt)
+            self.lines[id(stmt)] = line
+            self.by_line.setdefault(line, []).append(stmt)
+
+        enclosing = self._enclosing
+        if line is not None:
+            self._enclosing = line
+        try:
+            for child in children:
+                if child is not None:
+                    child.accept(self)
+        finally:
+            self._enclosing = enclosing
+
+    def _line(self, *exprs: Optional[Expr]) -> Optional[int]:
+        for expr in exprs:
+            if expr is not None:
+                line = expr.accept(self)
+                if line is not None:
+                    return line
+
+        return None
+
+    def visitAssignExpr(self, expr: Assign) -> Optional[int]:
+        return expr.name.line
+
+    def visitBinaryExpr(self, expr: Binary) -> Optional[int]:
+        return self._line(expr.left) or expr.operator.line
+
+    def visitCallExpr(self, expr: Call) -> Optional[int]:
+        return self._line(expr.callee) or expr.paren.line
+
+    def visitConditionalExpr(self, expr: Conditional) -> Optional[int]:
+        return self._line(expr.condition, expr.left, expr.right)
+
+    def visitGetExpr(self, expr: Get) -> Optional[int]:
+        return self._line(expr.object) or expr.name.line
+
+    def visitGroupingExpr(self, expr: Grouping) -> Optional[int]:
+        return self._line(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> Optional[int]:
+        return None
+
+    def visitLogicalExpr(self, expr: Logical) -> Optional[int]:
+        return self._line(expr.left) or expr.operator.line
+
+    def visitSetExpr(self, expr: Set) -> Optional[int]:
+        return self._line(expr.object) or expr.name.line
+
+    def visitSuperExpr(self, expr: Super) -> Optional[int]:
+        return expr.keyword.line
+
+    def visitThisExpr(self, expr: This) -> Optional[int]:
+        return expr.keyword.line
+
+    def visitUnaryExpr(self, expr: Unary) -> Optional[int]:
+        return expr.operator.line
+
+    def visitVariableExpr(self, expr: Variable) -> Optional[int]:
+        return expr.name.line
+
+    def visitBlockStmt(self, stmt: Block) -> None:
+        self._add(stmt, None, *stmt.statements)
+
+    def visitBreakStmt(self, stmt: Break) -> None:
+        self._add(stmt, stmt.keyword.line)
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        self._add(stmt, stmt.name.line)
+
+        # Methods are not statements the interpreter runs, only their bodies.
+        for method in stmt.methods:
+            self._add(method, None, *method.body)
+
+    def visitExpressionStmt(self, stmt: Expression) -> None:
+        self._add(stmt, self._line(stmt.expression))
+
+    def visitForStmt(self, stmt: For) -> None:
+        self._add(stmt, stmt.keyword.line, stmt.initializer, stmt.body)
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        self._add(stmt, stmt.name.line, *stmt.body)
+
+    def visitIfStmt(self, stmt: If) -> None:
+        self._add(stmt, stmt.keyword.line, stmt.thenBranch, stmt.elseBranch)
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        self._add(stmt, stmt.keyword.line)
+
+    def visitPrintStmt(self, stmt: Print) -> None:
+        self._add(stmt, stmt.keyword.line)
+
+    def visitReturnStmt(self, stmt: Return) -> None:
+        self._add(stmt, stmt.keyword.line)
+
+    def visitVarStmt(self, stmt: Var) -> None:
+        self._add(stmt, stmt.name.line)
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        self._add(stmt, stmt.keyword.line, stmt.body)
+
+
+class Debugger:
+    """Run a program, stopping before its first statement and at breakpoints
+    to read commands, see HELP.
+
+    Call depth and the call stack are read from the Python stack, from the
+    frames of LoxFunction.call and callBound: nothing is tracked while the program runs.
+    """
+
+    def __init__(
+        self,
+        interpreter: Interpreter,
+        source: str,
+        input: Callable[[str], str] = input,
+    ) -> None:
+        self.interpreter = interpreter
+        self.source_lines = source.splitlines()
+        self.input = input
+
+        self.index = LineIndex()
+        self.breakpoints: set[int] = set()
+        self.hooked: List[Stmt] = []
+
+        self.mode = StepMode.STEP
+        # Call depth `next` and `finish` were given at.
+        self.depth = 0
+        # Set while reading commands, so that evaluating calls doesn't stop.
+        self.paused = False
+
+        # What the interpreter defines, not shown with the globals.
+        self.builtins = dict(interpreter.globals.values)
+
+        # Compiled loops don't run their statements.
+        interpreter.tracer = None
+
+    def run(self, statements: List[Stmt]) -> None:
+        self.index.index(statements)
+        self._install()
+        try:
+            self.interpreter.interpret(statements)
+        finally:
+            self._uninstall()
+
+    def _install(self) -> None:
+        """Hook the statements the current mode may stop at."""
+        self._uninstall()
+
+        if self.mode is StepMode.CONTINUE:
+            for line in sorted(self.breakpoints):
+                self.hooked.extend(self.index.by_line[line])
+        else:
+            self.hooked.extend(self.index.statements)
+
+        for stmt in self.hooked:
+            stmt.accept = self._hook(stmt)  # type: ignore
+
+    def _uninstall(self) -> None:
+        for stmt in self.hooked:
+            del stmt.accept  # type: ignore
+        self.hooked = []
+
+    def _hook(self, stmt: Stmt) -> Callable[[Any], Any]:
+        run = type(stmt).accept
+        interpreter = self.interpreter
+
+        def accept(visitor: Any) -> Any:
+            # Analyzers visit statements too.
+            if visitor is interpreter and not self.paused:
+                self._reached(stmt)
+
+            return run(stmt, visitor)
+
+        return accept
+
+    def _reached(self, stmt: Stmt) -> None:
+        line = self.index.lines[id(stmt)]
+        if line in self.breakpoints:
+            self._pause(line)
+        elif self.mode is StepMode.STEP:
+            self._pause(line)
+        elif self.mode is StepMode.NEXT:
+            if len(self._frames()) <= self.depth:
+                self._pause(line)
+        elif self.mode is StepMode.FINISH:
+            if len(self._frames()) < self.depth:
+                self._pause(line)
+
+    def _pause(self, line: int) -> None:
+        self.paused = True
+        try:
+            self._show(line, line, line)
+            self._readCommands(line)
+        finally:
+            self.paused = False
+
+    def _readCommands(self, line: int) -> None:
+        while True:
+            try:
+                text = self.input("(lox) ").strip()
+            except EOFError:
+                # Nobody to read commands from: run the program to its end.
+                self.breakpoints.clear()
+                self._resume(StepMode.CONTINUE)
+                return
+
+            command, _, argument = text.partition(" ")
+            argument = argument.strip()
+
+            if command in ("c", "continue"):
+                self._resume(StepMode.CONTINUE)
+                return
+            if command in ("s", "step"):
+                self._resume(StepMode.STEP)
+                return
+            if command in ("n", "next"):
+                self._resume(StepMode.NEXT)
+                return
+            if command in ("f", "finish"):
+                self._resume(StepMode.FINISH)
+                return
+
+            if command in ("b", "break"):
+                self._break(argument)
+            elif command == "clear":
+                self._clear(argument)
+            elif command in ("p", "print"):
+                self._evaluate(argument)
+            elif command in ("e", "env"):
+                self._showEnvironment()
+            elif command in ("w", "where"):
+                self._showFrames(line)
+            elif command in ("l", "list"):
+                self._show(line - LIST_CONTEXT, line + LIST_CONTEXT, line)
+            elif command in ("q", "quit"):
+                sys.exit(0)
+            elif command in ("h", "help"):
+                print(HELP)
+            elif command:
+                print(f"Unknown command '{command}', try 'help'.")
+
+    def _resume(self, mode: StepMode) -> None:
+        self.mode = mode
+        self.depth = len(self._frames())
+        self._install()
+
+    def _break(self, argument: str) -> None:
+        if not argument:
+            for line in sorted(self.breakpoints):
+                print(f"Breakpoint at line {line}.")
+            return
+
+        line = self._parseLine(argument)
+        if line is None:
+            return
+        if line not in self.index.by_line:
+            print(f"No statement on line {line}.")
+            return
+
+        self.breakpoints.add(line)
+        print(f"Breakpoint at line {line}.")
+
+    def _clear(self, argument: str) -> None:
+        line = self._parseLine(argument)
+        if line is None:
+            return
+        if line not in self.breakpoints:
+            print(f"No breakpoint at line {line}.")
+            return
+
+        self.breakpoints.remove(line)
+
+    def _parseLine(self, argument: str) -> Optional[int]:
+        if not argument.isdigit():
+            print("Expect a line number.")
+            return None
+
+        return int(argument)
+
+    def _evaluate(self, text: str) -> None:
+        from pylox.parser import Parser
+        from pylox.scanner import Scanner
+
+        statements = Parser(Scanner(f"print {text};").scan_tokens()).parse()
+        if LoxError.had_error():
+            LoxError.reset_error()
+            return
+
+        try:
+            for statement in statements:
+                statement.accept(self.interpreter)
+        except LoxRuntimeError as e:
+            print(e.args[0])
+
+    def _showEnvironment(self) -> None:
+        environment: Optional[Environment] = self.interpreter.environment
+        while environment is not None:
+            values = environment.values
+            if environment is self.interpreter.globals:
+                print("globals:")
+                values = {
+                    name: value
+                    for name, value in values.items()
+                    if self.builtins.get(name) is not value
+                }
+            else:
+                print("scope:")
+
+            for name, value in values.items():
+                if type(value) is Cell:
+                    value = value.value
+                print(f"  {name} = {self.interpreter._stringify(value)}")
+
+            environment = environment.enclosing
+
+    def _showFrames(self, line: int) -> None:
+        print(f"  line {line}")
+        for function in self._frames():
+            declaration = function.declaration
+            print(f"  in {declaration.name.lexeme}, line {declaration.name.line}")
+
+    def _show(self, first: int, last: int, current: int) -> None:
+        for line in range(max(first, 1), min(last, len(self.source_lines)) + 1):
+            marker = "->" if line == current else "  "
+            print(f"{marker} {line:4d} {self.source_lines[line - 1]}")
+
+    def _frames(self) -> List[LoxFunction]:
+        """The Lox functions being run, innermost first."""
+        functions = []
+        frame = sys._getframe()
+        while frame is not None:
+            code = frame.f_code
+            if code in INVOKE_CODES and "environment" in frame.f_locals:
+                functions.append(frame.f_locals["self"])
+            frame = frame.f_back
+
+        return functions
@@ -4,17 +4,36 @@ from pylox.error import LoxRuntimeError
 from pylox.token import Token
 
 
+class Cell:
+    """Box holding a variable captured by a closure, shared by the environment
+    declaring it and the closures capturing it."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value: Any = value
+
+
 class Environment:
     def __init__(self, enclosing: Optional["Environment"] = None) -> None:
         self.enclosing: Optional[Environment] = enclosing
         self.values: Dict[str, Any] = dict()
 
     def define(self, name: str, value: Any) -> None:
-        self.values[name] = value
+        # Declared again: closures that captured the variable see the new one.
+        existing = self.values.get(name)
+        if type(existing) is Cell:
+            existing.value = value
+        else:
+            self.values[name] = value
 
     def get(self, name: Token) -> Any:
         if name.lexeme in self.values:
-            return self.values[name.lexeme]
+            value = self.values[name.lexeme]
+            if type(value) is Cell:
+                return value.value
+
+            return value
 
         if self.enclosing:
             return self.enclosing.get(name)
@@ -23,7 +42,11 @@ class Environment:
 
     def assign(self, name: Token, value: Any) -> None:
         if name.lexeme in self.values:
-            self.values[name.lexeme] = value
+            cell = self.values[name.lexeme]
+            if type(cell) is Cell:
+                cell.value = value
+            else:
+                self.values[name.lexeme] = value
             return
 
         if self.enclosing:
@@ -1,3 +1,5 @@
+from typing import Callable
+
 from pylox.token import Token
 from pylox.token_type import TokenType
 
@@ -8,13 +10,26 @@ class LoxRuntimeError(RuntimeError):
         self.token: Token = token
 
 
+class NativeError(Exception):
+    """Raised by native functions, which have no token to report the error at:
+    the interpreter turns it into a LoxRuntimeError at the call."""
+
+
+def printReport(line: int, where: str, message: str) -> None:
+    print(f"[line {line}] Error {where}: {message}")
+
+
 class LoxError:
     _had_error: bool = False
     _had_runtime_error: bool = False
 
+    # Receives every scan and parse error. Tools that collect diagnostics
+    # instead of printing them (e.g. the language server) replace it.
+    reporter: Callable[[int, str, str], None] = staticmethod(printReport)
+
     @classmethod
     def report(cls, line: int, where: str, message: str) -> None:
-        print(f"[line {line}] Error {where}: {message}")
+        cls.reporter(line, where, message)
         cls._had_error = True
 
     @classmethod
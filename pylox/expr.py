@@ -1,9 +1,22 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Any, Optional, Protocol, TypeVar
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    TypeVar,
+)
 
 from pylox.token import Token
 
+if TYPE_CHECKING:
+    from pylox.optimizer import Slot
+    from pylox.shape import Shape
+
 T = TypeVar("T", covariant=True)
 
 
@@ -37,6 +50,19 @@ class Binary(Expr):
     operator: Token
     right: Optional[Expr]
 
+    # Runtime type feedback: the specialised float operation the interpreter
+    # rewrote this node into, and whether it has seen anything but two floats.
+    quickened: Optional[Callable[[Any, Any], Any]] = field(
+        default=None, compare=False, repr=False
+    )
+    deoptimized: bool = field(default=False, compare=False, repr=False)
+
+    # Set by pylox.type_inference when both operands are proven to be numbers:
+    # the operation to apply without checking them.
+    typed: Optional[Callable[[Any, Any], Any]] = field(
+        default=None, compare=False, repr=False
+    )
+
     def accept(self, visitor: "ExprVisitor[T]") -> T:
         return visitor.visitBinaryExpr(self)
 
@@ -51,10 +77,31 @@ class Call(Expr):
         return visitor.visitCallExpr(self)
 
 
+@dataclass
+class Get(Expr):
+    object: Optional[Expr]
+    name: Token
+
+    # Inline cache: for each instance shape seen here, the slot of the field
+    # (-1 if there is none) or else the method the name resolves to.
+    cache: List[Tuple["Shape", int, Any]] = field(
+        default_factory=list, compare=False, repr=False
+    )
+
+    def accept(self, visitor: "ExprVisitor[T]") -> T:
+        return visitor.visitGetExpr(self)
+
+
 @dataclass
 class Grouping(Expr):
     expression: Optional[Expr]
 
+    # Set by pylox.optimizer on expressions whose value is reused: it is kept
+    # in `slot`, and taken from there instead of evaluating the expression
+    # when `load` is set, or once it holds one for a loop invariant.
+    slot: Optional["Slot"] = field(default=None, compare=False, repr=False)
+    load: bool = field(default=False, compare=False, repr=False)
+
     def accept(self, visitor: "ExprVisitor[T]") -> T:
         return visitor.visitGroupingExpr(self)
 
@@ -77,11 +124,48 @@ class Logical(Expr):
         return visitor.visitLogicalExpr(self)
 
 
+@dataclass
+class Set(Expr):
+    object: Optional[Expr]
+    name: Token
+    value: Optional[Expr]
+
+    # Inline cache: for each instance shape seen here, the slot written and
+    # the shape the instance has afterwards (a new one if the field is added).
+    cache: List[Tuple["Shape", int, "Shape"]] = field(
+        default_factory=list, compare=False, repr=False
+    )
+
+    def accept(self, visitor: "ExprVisitor[T]") -> T:
+        return visitor.visitSetExpr(self)
+
+
+@dataclass
+class Super(Expr):
+    keyword: Token
+    method: Token
+
+    def accept(self, visitor: "ExprVisitor[T]") -> T:
+        return visitor.visitSuperExpr(self)
+
+
+@dataclass
+class This(Expr):
+    keyword: Token
+
+    def accept(self, visitor: "ExprVisitor[T]") -> T:
+        return visitor.visitThisExpr(self)
+
+
 @dataclass
 class Unary(Expr):
     operator: Token
     right: Optional[Expr]
 
+    # Set by pylox.type_inference when the operand of `-` is proven to be a
+    # number.
+    typed: bool = field(default=False, compare=False, repr=False)
+
     def accept(self, visitor: "ExprVisitor[T]") -> T:
         return visitor.visitUnaryExpr(self)
 
@@ -103,12 +187,20 @@ class ExprVisitor(Protocol[T]):
 
     def visitCallExpr(self, expr: Call) -> T: ...
 
+    def visitGetExpr(self, expr: Get) -> T: ...
+
     def visitGroupingExpr(self, expr: Grouping) -> T: ...
 
     def visitLiteralExpr(self, expr: Literal) -> T: ...
 
     def visitLogicalExpr(self, expr: Logical) -> T: ...
 
+    def visitSetExpr(self, expr: Set) -> T: ...
+
+    def visitSuperExpr(self, expr: Super) -> T: ...
+
+    def visitThisExpr(self, expr: This) -> T: ...
+
     def visitUnaryExpr(self, expr: Unary) -> T: ...
 
     def visitVariableExpr(self, expr: Variable) -> T: ...
@@ -0,0 +1,151 @@
+"""Fork server: a resident process that has imported the interpreter and built
+its globals, forking a child to run each script it is sent.
+
+A client passes its standard input, output and error over the Unix socket
+along with its command line and working directory, so the child writes to
+them directly. The child then sends back the script's exit code.
+
+This module only imports what the client needs: the interpreter is imported
+by serve().
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+from pathlib import Path
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:
+    from pylox.interpreter import Interpreter
+
+# Largest request a client sends: its command line and working directory.
+MAX_REQUEST = 1 << 16
+
+
+def serve(path: Path) -> None:
+    import gc
+
+    # Import everything a script may need.
+    import pylox.async_interpreter  # noqa: F401
+    import pylox.function  # noqa: F401
+    import pylox.inliner  # noqa: F401
+    import pylox.lox_array  # noqa: F401
+    import pylox.lox_class  # noqa: F401
+    import pylox.lox_file  # noqa: F401
+    import pylox.lox_list  # noqa: F401
+    import pylox.lox_map  # noqa: F401
+    import pylox.parallel_map  # noqa: F401
+    import pylox.parallel_parser  # noqa: F401
+    import pylox.type_inference  # noqa: F401
+    from pylox.interpreter import Interpreter
+
+    interpreter = Interpreter()
+
+    # Everything allocated so far is shared with the children, copy-on-write:
+    # keep the garbage collector from touching it.
+    gc.freeze()
+
+    # Children report their exit code themselves and need not be waited for.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    if path.is_socket():
+        path.unlink()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(path))
+        server.listen()
+        print(f"pylox fork server listening on {path}", file=sys.stderr)
+
+        while True:
+            connection, _ = server.accept()
+            if os.fork() == 0:
+                server.close()
+                _runChild(connection, interpreter)
+
+            connection.close()
+
+
+def _runChild(connection: socket.socket, interpreter: "Interpreter") -> None:
+    """Run one script in a forked child, and exit."""
+    import pylox
+
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    code = 1
+    try:
+        message, fds, _, _ = socket.recv_fds(connection, MAX_REQUEST, 3)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+
+        request = json.loads(message)
+        os.chdir(request["cwd"])
+        args = pylox.parse_args(request["argv"])
+
+        if args.use_async:
+            from pylox.async_interpreter import AsyncInterpreter
+
+            interpreter = AsyncInterpreter()
+
+        interpreter.memoize = args.memoize
+        interpreter.memo_size = args.memo_size
+        interpreter.budget = pylox.make_budget(args)
+        if args.map_jobs is not None:
+            interpreter.map_jobs = args.map_jobs
+        if args.snapshot is not None:
+            from pylox.snapshot import Snapshot
+
+            interpreter.snapshot = Snapshot(args.snapshot)
+        if args.trace and interpreter.budget is None:
+            from pylox.tracing import Tracer
+
+            interpreter.tracer = Tracer()
+
+        try:
+            pylox.run_file(interpreter, args.script, args)
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        finally:
+            if args.memo_stats:
+                for cache in interpreter.memo_caches:
+                    print(cache, file=sys.stderr)
+            if args.trace_stats and interpreter.tracer is not None:
+                print(interpreter.tracer.stats, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            connection.sendall(str(code).encode())
+        finally:
+            os._exit(code)
+
+
+def request(path: Path, argv: List[str]) -> int:
+    """Have the fork server at `path` run a script with the command line
+    `argv`, and return its exit code."""
+    message = json.dumps({"argv": argv, "cwd": os.getcwd()}).encode()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(str(path))
+        except OSError as e:
+            print(f"Could not connect to fork server at {path}: {e}", file=sys.stderr)
+            return 1
+
+        socket.send_fds(connection, [message], [0, 1, 2])
+
+        reply = b""
+        while chunk := connection.recv(16):
+            reply += chunk
+
+    if not reply:
+        print("Fork server closed the connection.", file=sys.stderr)
+        return 1
+
+    return int(reply)
@@ -1,33 +1,200 @@
-from dataclasses import dataclass
-from typing import Any, List
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, List, Optional, Set, Tuple
 
 from pylox.callable import LoxCallable
 from pylox.environment import Environment
+from pylox.error import LoxRuntimeError
 from pylox.interpreter import Interpreter
 from pylox.lox_return import Return
+from pylox.memo import MISSING, MemoCache
+from pylox.parser import ParseError, parseBody
+from pylox.purity import PurityAnalyzer
 from pylox.stmt import Function
+from pylox.token import Token
+
+if TYPE_CHECKING:
+    from pylox.lox_instance import LoxInstance
+
+# A callee binding a memoized result depends on: where it was resolved from,
+# its name and the value it had.
+Dependency = Tuple[Environment, Token, Any]
 
 
 @dataclass
 class LoxFunction(LoxCallable):
     declaration: Function
     closure: Environment
+    is_initializer: bool = False
+
+    # The instance a method was accessed on, which `this` refers to.
+    instance: Optional["LoxInstance"] = None
+
+    memo: Optional[MemoCache] = field(default=None, compare=False, repr=False)
+    dependencies: Optional[List[Dependency]] = field(
+        default=None, compare=False, repr=False
+    )
 
     def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
-        environment = Environment(self.closure)
+        if self.instance is not None:
+            return self.callBound(interpreter, self.instance, arguments)
+
+        if self.declaration.lazy is not None:
+            self._parseBody()
 
+        if interpreter.memoize and not self.is_initializer:
+            return self._memoizedCall(interpreter, arguments)
+
+        # Calls run in this frame rather than a shared helper: each Python frame
+        # a call takes lowers how deep Lox code can recurse.
+        environment = Environment(self.closure)
         for i, p in enumerate(self.declaration.params):
             environment.define(p.lexeme, arguments[i])
 
+        budget = interpreter.budget
         try:
+            if budget is not None:
+                budget.depth += 1
+                budget.countdown -= 1
+                if budget.countdown < 0 or budget.depth > budget.depth_limit:
+                    budget.check(self.declaration.name)
+
             interpreter._executeBlock(self.declaration.body, environment)
         except Return as r:
             return r.value
+        finally:
+            if budget is not None:
+                budget.depth -= 1
 
         return None
 
+    def bind(self, instance: "LoxInstance") -> "LoxFunction":
+        # No environment yet: `this` is defined when the method is called.
+        return LoxFunction(
+            self.declaration, self.closure, self.is_initializer, instance
+        )
+
+    def callBound(
+        self,
+        interpreter: Interpreter,
+        instance: Optional["LoxInstance"],
+        arguments: List[Any],
+    ) -> Any:
+        """Call the method with `this` bound to `instance`, defined in the same
+        environment as the parameters, or the function without `this` if
+        `instance` is None."""
+        if self.declaration.lazy is not None:
+            self._parseBody()
+
+        environment = Environment(self.closure)
+        if instance is not None:
+            environment.define("this", instance)
+        for i, p in enumerate(self.declaration.params):
+            environment.define(p.lexeme, arguments[i])
+
+        budget = interpreter.budget
+        try:
+            if budget is not None:
+                budget.depth += 1
+                budget.countdown -= 1
+                if budget.countdown < 0 or budget.depth > budget.depth_limit:
+                    budget.check(self.declaration.name)
+
+            interpreter._executeBlock(self.declaration.body, environment)
+        except Return as r:
+            if not self.is_initializer:
+                return r.value
+        finally:
+            if budget is not None:
+                budget.depth -= 1
+
+        if self.is_initializer:
+            return environment.values["this"]
+
+        return None
+
+    def _parseBody(self) -> None:
+        try:
+            parseBody(self.declaration)
+        except ParseError:
+            raise LoxRuntimeError(
+                self.declaration.name,
+                f"Syntax error in body of '{self.declaration.name.lexeme}'.",
+            ) from None
+
+    def _memoizedCall(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        key = MemoCache.key(arguments)
+        if key is None or not self._isMemoizable(interpreter):
+            return self.callBound(interpreter, None, arguments)
+
+        value = self.memo.get(key)  # type: ignore
+        if value is MISSING:
+            value = self.callBound(interpreter, None, arguments)
+            self.memo.put(key, value)  # type: ignore
+
+        return value
+
+    def _isMemoizable(self, interpreter: Interpreter) -> bool:
+        if self.dependencies is not None:
+            # Rebinding any function we (transitively) call invalidates results.
+            if all(
+                environment.get(name) is value
+                for environment, name, value in self.dependencies
+            ):
+                return True
+
+            self.dependencies = None
+            self.memo.clear()  # type: ignore
+
+        dependencies: List[Dependency] = []
+        if not self._collectDependencies(dependencies, set()):
+            return False
+
+        if self.memo is None:
+            self.memo = MemoCache(self.declaration.name.lexeme, interpreter.memo_size)
+            interpreter.memo_caches.append(self.memo)
+
+        self.dependencies = dependencies
+        return True
+
+    def _collectDependencies(
+        self, dependencies: List[Dependency], visiting: Set[int]
+    ) -> bool:
+        if self.declaration.lazy is not None:
+            # Never called, so not parsed yet: check again on a later call.
+            return False
+
+        purity = self.declaration.purity
+        if purity is None:
+            purity = PurityAnalyzer().analyze(self.declaration)
+            self.declaration.purity = purity
+
+        if not purity.pure:
+            return False
+
+        visiting.add(id(self))
+        for name in purity.callees:
+            try:
+                callee = self.closure.get(name)
+            except LoxRuntimeError:
+                return False
+
+            dependencies.append((self.closure, name, callee))
+
+            if isinstance(callee, LoxFunction):
+                if id(callee) in visiting:
+                    continue
+                if not callee._collectDependencies(dependencies, visiting):
+                    return False
+            elif not getattr(callee, "pure", False):
+                return False
+
+        return True
+
     def arity(self) -> int:
         return len(self.declaration.params)
 
     def toString(self) -> str:
         return f"<fn {self.declaration.name.lexeme}>"
+
+    def __str__(self) -> str:
+        return self.toString()
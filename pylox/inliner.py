@@ -0,0 +1,531 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from pylox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Conditional,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from pylox.stmt import (
+    Block,
+    Break,
+    Class,
+    Expression,
+    For,
+    Function,
+    If,
+    Import,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from pylox.token_type import TokenType
+
+# Largest body, in expression nodes, of a function that is inlined.
+MAX_INLINE_SIZE = 24
+
+# Operators that can't fail, whatever their operands.
+SAFE_OPERATORS = (TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL, TokenType.BANG)
+
+
+@dataclass
+class Inlinable:
+    """A function whose calls can be replaced by its body.
+
+    `value` is the expression the body returns, which only uses the
+    parameters. `uses` counts the reads of each parameter, and `leading` lists
+    the parameters the expression always reads before anything can fail, in
+    the order it first reads them.
+    """
+
+    function: Function
+    value: Expr
+    uses: List[int]
+    leading: List[int]
+
+
+class Bindings(ExprVisitor[None], StmtVisitor[None]):
+    """Find what some code may change: the names it assigns to and declares,
+    the fields it sets and whether it calls anything. Nested function bodies
+    count as part of the code.
+
+    `complete` is False when some of the code can't be seen: modules it
+    imports and function bodies that were not parsed yet may declare or
+    assign any name.
+    """
+
+    def __init__(self) -> None:
+        self.assigned: set[str] = set()
+        self.declared: set[str] = set()
+        self.fields: set[str] = set()
+        self.calls: bool = False
+        self.complete: bool = True
+
+    def analyze(self, statements: List[Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def visitBlockStmt(self, stmt: Block) -> None:
+        self.analyze(stmt.statements)
+
+    def visitBreakStmt(self, stmt: Break) -> None:
+        pass
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        self.declared.add(stmt.name.lexeme)
+        for method in stmt.methods:
+            method.accept(self)
+
+    def visitExpressionStmt(self, stmt: Expression) -> None:
+        stmt.expression.accept(self)
+
+    def visitForStmt(self, stmt: For) -> None:
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        self._analyzeExpr(stmt.condition)
+        self._analyzeExpr(stmt.increment)
+        stmt.body.accept(self)
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        self.declared.add(stmt.name.lexeme)
+        if stmt.lazy is not None:
+            self.complete = False
+        self.analyze(stmt.body)
+
+    def visitIfStmt(self, stmt: If) -> None:
+        stmt.condition.accept(self)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch.accept(self)
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        self.complete = False
+
+    def visitPrintStmt(self, stmt: Print) -> None:
+        stmt.expression.accept(self)
+
+    def visitReturnStmt(self, stmt: Return) -> None:
+        self._analyzeExpr(stmt.value)
+
+    def visitVarStmt(self, stmt: Var) -> None:
+        self._analyzeExpr(stmt.initializer)
+        self.declared.add(stmt.name.lexeme)
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def visitAssignExpr(self, expr: Assign) -> None:
+        self.assigned.add(expr.name.lexeme)
+        expr.value.accept(self)
+
+    def visitBinaryExpr(self, expr: Binary) -> None:
+        self._analyzeExpr(expr.left)
+        self._analyzeExpr(expr.right)
+
+    def visitCallExpr(self, expr: Call) -> None:
+        self.calls = True
+        self._analyzeExpr(expr.callee)
+        for argument in expr.arguments:
+            argument.accept(self)
+
+    def visitConditionalExpr(self, expr: Conditional) -> None:
+        self._analyzeExpr(expr.condition)
+        self._analyzeExpr(expr.left)
+        self._analyzeExpr(expr.right)
+
+    def visitGetExpr(self, expr: Get) -> None:
+        self._analyzeExpr(expr.object)
+
+    def visitGroupingExpr(self, expr: Grouping) -> None:
+        self._analyzeExpr(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> None:
+        pass
+
+    def visitLogicalExpr(self, expr: Logical) -> None:
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitSetExpr(self, expr: Set) -> None:
+        self.fields.add(expr.name.lexeme)
+        self._analyzeExpr(expr.object)
+        self._analyzeExpr(expr.value)
+
+    def visitSuperExpr(self, expr: Super) -> None:
+        pass
+
+    def visitThisExpr(self, expr: This) -> None:
+        pass
+
+    def visitUnaryExpr(self, expr: Unary) -> None:
+        self._analyzeExpr(expr.right)
+
+    def visitVariableExpr(self, expr: Variable) -> None:
+        pass
+
+    def _analyzeExpr(self, expr: Optional[Expr]) -> None:
+        if expr is not None:
+            expr.accept(self)
+
+
+class Inliner(ExprVisitor[Expr], StmtVisitor[None]):
+    """Replace calls to small functions by the expression they return.
+
+    A function is inlined if it is declared once at the top level, never
+    assigned to, and its body is a single `return` of an expression of at
+    most MAX_INLINE_SIZE nodes that only reads its parameters, with no calls
+    left once the functions it calls have been inlined in turn. Such a
+    function can't be recursive. Only calls after its declaration, where no
+    local variable shadows it, are inlined. Programs with code the pass can't
+    see, imported modules or bodies parsed lazily, are left alone.
+
+    A call is inlined when the arguments still run exactly as they would
+    have: each one that isn't a literal must be read before anything can
+    fail, in the order of the arguments, and only once if it is not a
+    variable. The program is rewritten in place.
+    """
+
+    def __init__(self) -> None:
+        self.scopes: List[set[str]] = []
+        self.functions: Dict[str, Inlinable] = {}
+        self.candidates: set[str] = set()
+        self.inlined: int = 0
+
+    def inline(self, statements: List[Stmt]) -> None:
+        bindings = Bindings()
+        bindings.analyze(statements)
+        if not bindings.complete:
+            return
+
+        declared: Dict[str, int] = {}
+        for statement in statements:
+            if isinstance(statement, (Var, Function, Class)):
+                name = statement.name.lexeme
+                declared[name] = declared.get(name, 0) + 1
+
+        self.candidates = {
+            name
+            for name, count in declared.items()
+            if count == 1 and name not in bindings.assigned
+        }
+
+        for statement in statements:
+            statement.accept(self)
+            if isinstance(statement, Function):
+                self._declare(statement)
+
+    def _declare(self, function: Function) -> None:
+        name = function.name.lexeme
+        if name not in self.candidates:
+            return
+        if len(function.body) != 1 or not isinstance(function.body[0], Return):
+            return
+
+        value = function.body[0].value
+        if value is None or _size(value) > MAX_INLINE_SIZE:
+            return
+
+        params = {param.lexeme: i for i, param in enumerate(function.params)}
+        if not _readsOnly(value, params):
+            return
+
+        order = ReadOrder(params)
+        order.scan(value)
+
+        self.functions[name] = Inlinable(function, value, order.uses, order.leading)
+
+    def visitBlockStmt(self, stmt: Block) -> None:
+        self._rewriteScope(stmt.statements, set())
+
+    def visitBreakStmt(self, stmt: Break) -> None:
+        pass
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        for method in stmt.methods:
+            method.accept(self)
+
+    def visitExpressionStmt(self, stmt: Expression) -> None:
+        stmt.expression = stmt.expression.accept(self)
+
+    def visitForStmt(self, stmt: For) -> None:
+        names = set()
+        if isinstance(stmt.initializer, Var):
+            names.add(stmt.initializer.name.lexeme)
+
+        self.scopes.append(names)
+        try:
+            if stmt.initializer is not None:
+                stmt.initializer.accept(self)
+            stmt.condition = self._rewrite(stmt.condition)
+            stmt.increment = self._rewrite(stmt.increment)
+            stmt.body.accept(self)
+        finally:
+            self.scopes.pop()
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        self._rewriteScope(stmt.body, {param.lexeme for param in stmt.params})
+
+    def visitIfStmt(self, stmt: If) -> None:
+        stmt.condition = stmt.condition.accept(self)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch.accept(self)
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        pass
+
+    def visitPrintStmt(self, stmt: Print) -> None:
+        stmt.expression = stmt.expression.accept(self)
+
+    def visitReturnStmt(self, stmt: Return) -> None:
+        stmt.value = self._rewrite(stmt.value)  # type: ignore
+
+    def visitVarStmt(self, stmt: Var) -> None:
+        stmt.initializer = self._rewrite(stmt.initializer)
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        stmt.condition = stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def visitAssignExpr(self, expr: Assign) -> Expr:
+        expr.value = expr.value.accept(self)
+        return expr
+
+    def visitBinaryExpr(self, expr: Binary) -> Expr:
+        expr.left = self._rewrite(expr.left)
+        expr.right = self._rewrite(expr.right)
+        return expr
+
+    def visitCallExpr(self, expr: Call) -> Expr:
+        expr.callee = self._rewrite(expr.callee)
+        expr.arguments = [argument.accept(self) for argument in expr.arguments]
+
+        callee = expr.callee
+        if type(callee) is not Variable or self._isLocal(callee.name.lexeme):
+            return expr
+
+        inlinable = self.functions.get(callee.name.lexeme)
+        if inlinable is None or not _canInline(inlinable, expr.arguments):
+            return expr
+
+        self.inlined += 1
+        params = {p.lexeme: i for i, p in enumerate(inlinable.function.params)}
+        return _substitute(inlinable.value, params, expr.arguments)  # type: ignore
+
+    def visitConditionalExpr(self, expr: Conditional) -> Expr:
+        expr.condition = self._rewrite(expr.condition)
+        expr.left = self._rewrite(expr.left)
+        expr.right = self._rewrite(expr.right)
+        return expr
+
+    def visitGetExpr(self, expr: Get) -> Expr:
+        expr.object = self._rewrite(expr.object)
+        return expr
+
+    def visitGroupingExpr(self, expr: Grouping) -> Expr:
+        expr.expression = self._rewrite(expr.expression)
+        return expr
+
+    def visitLiteralExpr(self, expr: Literal) -> Expr:
+        return expr
+
+    def visitLogicalExpr(self, expr: Logical) -> Expr:
+        expr.left = expr.left.accept(self)
+        expr.right = expr.right.accept(self)
+        return expr
+
+    def visitSetExpr(self, expr: Set) -> Expr:
+        expr.object = self._rewrite(expr.object)
+        expr.value = self._rewrite(expr.value)
+        return expr
+
+    def visitSuperExpr(self, expr: Super) -> Expr:
+        return expr
+
+    def visitThisExpr(self, expr: This) -> Expr:
+        return expr
+
+    def visitUnaryExpr(self, expr: Unary) -> Expr:
+        expr.right = self._rewrite(expr.right)
+        return expr
+
+    def visitVariableExpr(self, expr: Variable) -> Expr:
+        return expr
+
+    def _rewriteScope(self, statements: List[Stmt], names: set[str]) -> None:
+        # A closure declared in the scope may run after any of its names is
+        # declared, so they all shadow the globals from the start.
+        for statement in statements:
+            if isinstance(statement, (Var, Function, Class)):
+                names.add(statement.name.lexeme)
+
+        self.scopes.append(names)
+        try:
+            for statement in statements:
+                statement.accept(self)
+        finally:
+            self.scopes.pop()
+
+    def _rewrite(self, expr: Optional[Expr]) -> Optional[Expr]:
+        return expr.accept(self) if expr is not None else None
+
+    def _isLocal(self, name: str) -> bool:
+        return any(name in scope for scope in self.scopes)
+
+
+def _size(expr: Optional[Expr]) -> int:
+    match expr:
+        case None:
+            return 0
+        case Binary() | Logical():
+            return 1 + _size(expr.left) + _size(expr.right)
+        case Conditional():
+            return 1 + _size(expr.condition) + _size(expr.left) + _size(expr.right)
+        case Unary():
+            return 1 + _size(expr.right)
+        case Grouping():
+            return 1 + _size(expr.expression)
+        case Get():
+            return 1 + _size(expr.object)
+
+    return 1
+
+
+def _readsOnly(expr: Optional[Expr], params: Dict[str, int]) -> bool:
+    """Whether `expr` is made of operators, literals and reads of `params`."""
+    match expr:
+        case Literal():
+            return True
+        case Variable():
+            return expr.name.lexeme in params
+        case Binary() | Logical():
+            return _readsOnly(expr.left, params) and _readsOnly(expr.right, params)
+        case Conditional():
+            return (
+                _readsOnly(expr.condition, params)
+                and _readsOnly(expr.left, params)
+                and _readsOnly(expr.right, params)
+            )
+        case Unary():
+            return _readsOnly(expr.right, params)
+        case Grouping():
+            return _readsOnly(expr.expression, params)
+        case Get():
+            return _readsOnly(expr.object, params)
+
+    return False
+
+
+class ReadOrder:
+    """Count the reads of each parameter in a returned expression, and list
+    those it always reads before an operation that can fail, see Inlinable."""
+
+    def __init__(self, params: Dict[str, int]) -> None:
+        self.params = params
+        self.uses: List[int] = [0] * len(params)
+        self.leading: List[int] = []
+        self.fallible: bool = False
+
+    def scan(self, expr: Optional[Expr], conditional: bool = False) -> None:
+        match expr:
+            case Variable():
+                i = self.params[expr.name.lexeme]
+                self.uses[i] += 1
+                if not (conditional or self.fallible or i in self.leading):
+                    self.leading.append(i)
+            case Binary():
+                self.scan(expr.left, conditional)
+                self.scan(expr.right, conditional)
+                self.fallible |= expr.operator.type not in SAFE_OPERATORS
+            case Logical():
+                self.scan(expr.left, conditional)
+                self.scan(expr.right, True)
+            case Conditional():
+                self.scan(expr.condition, conditional)
+                self.scan(expr.left, True)
+                self.scan(expr.right, True)
+            case Unary():
+                self.scan(expr.right, conditional)
+                self.fallible |= expr.operator.type not in SAFE_OPERATORS
+            case Grouping():
+                self.scan(expr.expression, conditional)
+            case Get():
+                self.scan(expr.object, conditional)
+                self.fallible = True
+
+
+def _canInline(inlinable: Inlinable, arguments: List[Expr]) -> bool:
+    if len(arguments) != len(inlinable.uses):
+        return False
+
+    # Arguments that run code or can fail, in the order they are evaluated.
+    ordered = [i for i, argument in enumerate(arguments) if not _isConstant(argument)]
+    if [i for i in inlinable.leading if i in ordered] != ordered:
+        return False
+
+    return all(
+        inlinable.uses[i] == 1 or type(arguments[i]) is Variable for i in ordered
+    )
+
+
+def _isConstant(expr: Expr) -> bool:
+    if type(expr) is Literal:
+        return True
+
+    return (
+        type(expr) is Unary
+        and expr.operator.type == TokenType.MINUS
+        and type(expr.right) is Literal
+        and type(expr.right.value) is float
+    )
+
+
+def _substitute(
+    expr: Optional[Expr], params: Dict[str, int], arguments: List[Expr]
+) -> Optional[Expr]:
+    """A copy of `expr` reading `arguments` in place of the parameters."""
+    match expr:
+        case Variable():
+            return arguments[params[expr.name.lexeme]]
+        case Binary():
+            return Binary(
+                _substitute(expr.left, params, arguments),
+                expr.operator,
+                _substitute(expr.right, params, arguments),
+            )
+        case Logical():
+            return Logical(
+                _substitute(expr.left, params, arguments),
+                expr.operator,
+                _substitute(expr.right, params, arguments),
+            )
+        case Conditional():
+            return Conditional(
+                _substitute(expr.condition, params, arguments),
+                _substitute(expr.left, params, arguments),
+                _substitute(expr.right, params, arguments),
+            )
+        case Unary():
+            return Unary(expr.operator, _substitute(expr.right, params, arguments))
+        case Grouping():
+            return Grouping(_substitute(expr.expression, params, arguments))
+        case Get():
+            return Get(_substitute(expr.object, params, arguments), expr.name)
+
+    return expr
@@ -1,9 +1,14 @@
+import operator
+import os
 import time
-from typing import Any, List
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
 import pylox.lox_return as lox_return
-from pylox.environment import Environment
-from pylox.error import LoxError, LoxRuntimeError
+from pylox.budget import Budget
+from pylox.capture import CaptureAnalyzer
+from pylox.environment import Cell, Environment
+from pylox.error import LoxError, LoxRuntimeError, NativeError
 from pylox.expr import (
     Assign,
     Binary,
@@ -11,18 +16,30 @@ from pylox.expr import (
     Conditional,
     Expr,
     ExprVisitor,
+    Get,
     Grouping,
     Literal,
     Logical,
+    Set,
+    Super,
+    This,
     Unary,
     Variable,
 )
+from pylox.lox_instance import LoxInstance
+from pylox.memo import MemoCache
+from pylox.module import Module, ModuleExport, parseModule
+from pylox.optimizer import EMPTY, clearSlots, restoreSlots
+from pylox.shape import Shape
 from pylox.stmt import (
     Block,
     Break,
+    Class,
     Expression,
+    For,
     Function,
     If,
+    Import,
     Print,
     Return,
     Stmt,
@@ -32,11 +49,49 @@ from pylox.stmt import (
 )
 from pylox.token import Token
 from pylox.token_type import TokenType
+from pylox.tracing import Tracer
+
+if TYPE_CHECKING:
+    from pylox.snapshot import Snapshot
+
+# Specialised forms a Binary node is quickened into once it has only ever seen
+# two float operands.
+FLOAT_OPERATIONS: Dict[TokenType, Callable[[float, float], Any]] = {
+    TokenType.BANG_EQUAL: operator.ne,
+    TokenType.EQUAL_EQUAL: operator.eq,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.MINUS: operator.sub,
+    TokenType.PLUS: operator.add,
+    TokenType.SLASH: operator.truediv,
+    TokenType.STAR: operator.mul,
+}
+
+# How many instance shapes a Get or Set node caches before it goes megamorphic
+# and looks names up on every evaluation.
+INLINE_CACHE_SIZE = 4
+
+# Whether values of a type are LoxCallable, by type.
+CALLABLE_TYPES: Dict[type, bool] = {}
 
 
 class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        memoize: bool = False,
+        memo_size: int = 256,
+        trace: bool = False,
+        budget: Optional[Budget] = None,
+    ) -> None:
         from pylox.callable import LoxCallable
+        from pylox.lox_array import ArangeNative, ArrayNative
+        from pylox.lox_file import OpenNative, ReadFileNative
+        from pylox.lox_list import ListNative
+        from pylox.lox_map import MapNative
+        from pylox.parallel_map import ParallelMapNative
+        from pylox.snapshot import SnapshotNative
 
         class Clock(LoxCallable):
             def arity(self) -> int:
@@ -51,11 +106,50 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
         self.globals = Environment()
         self.environment = self.globals
 
+        # Imported modules, and the directory relative imports are resolved
+        # from: the one of the script or module being executed.
+        self.modules: Dict[Path, Module] = {}
+        self.directory: Path = Path.cwd()
+
+        # Cache results of pure Lox functions, see LoxFunction.call.
+        self.memoize: bool = memoize
+        self.memo_size: int = memo_size
+        self.memo_caches: List[MemoCache] = []
+
+        # Processes parallelMap runs functions on.
+        self.map_jobs: int = os.cpu_count() or 1
+
+        # Where snapshot() saves the globals, see pylox.snapshot, and the index
+        # of the top-level statement being run.
+        self.snapshot: Optional[Snapshot] = None
+        self.position: int = 0
+
+        # Limits on each run, see pylox.budget.
+        self.budget: Optional[Budget] = budget
+
+        # Compiles hot loops, see pylox.tracing. Compiled loops don't take
+        # steps, so they are not used with a budget.
+        self.tracer: Optional[Tracer] = None
+        if trace and budget is None:
+            self.tracer = Tracer()
+
         self.globals.define("clock", Clock())
+        self.globals.define("open", OpenNative())
+        self.globals.define("readFile", ReadFileNative())
+        self.globals.define("array", ArrayNative())
+        self.globals.define("arange", ArangeNative())
+        self.globals.define("list", ListNative())
+        self.globals.define("map", MapNative())
+        self.globals.define("parallelMap", ParallelMapNative())
+        self.globals.define("snapshot", SnapshotNative())
 
     def interpret(self, statements: List[Stmt]) -> None:
+        if self.budget is not None:
+            self.budget.start()
+
         try:
-            for statement in statements:
+            for index, statement in enumerate(statements):
+                self.position = index
                 self._execute(statement)
         except LoxRuntimeError as e:
             LoxError.runtimeError(e)
@@ -64,6 +158,35 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
         left = self._evaluate(expr.left)  # type: ignore
         right = self._evaluate(expr.right)  # type: ignore
 
+        typed = expr.typed
+        if typed is not None:
+            try:
+                return typed(left, right)
+            except ZeroDivisionError:
+                raise LoxRuntimeError(expr.operator, "division by zero") from None
+
+        quickened = expr.quickened
+        if quickened is not None:
+            # Guard: the specialised form is only valid for two floats.
+            if type(left) is float and type(right) is float:
+                try:
+                    return quickened(left, right)
+                except ZeroDivisionError:
+                    raise LoxRuntimeError(expr.operator, "division by zero") from None
+
+            expr.quickened = None
+            expr.deoptimized = True
+
+        result = self._binaryOperation(expr, left, right)
+
+        if not expr.deoptimized:
+            if type(left) is float and type(right) is float:
+                expr.quickened = FLOAT_OPERATIONS.get(expr.operator.type)
+            expr.deoptimized = expr.quickened is None
+
+        return result
+
+    def _binaryOperation(self, expr: Binary, left: Any, right: Any) -> Any:
         match expr.operator.type:
             case TokenType.BANG_EQUAL:
                 return not left == right
@@ -88,13 +211,18 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
                 if isinstance(left, float) and isinstance(right, float):
                     return left + right
                 if isinstance(left, str) and isinstance(right, str):
-                    return left + right
-                if isinstance(left, str) or isinstance(right, str):
-                    return self._stringify(left) + self._stringify(right)
-
-                raise LoxRuntimeError(
-                    expr.operator, "Operands must be two numbers or two strings."
-                )
+                    result = left + right
+                elif isinstance(left, str) or isinstance(right, str):
+                    result = self._stringify(left) + self._stringify(right)
+                else:
+                    raise LoxRuntimeError(
+                        expr.operator, "Operands must be two numbers or two strings."
+                    )
+
+                if self.budget is not None:
+                    self.budget.allocateString(result, expr.operator)
+
+                return result
             case TokenType.SLASH:
                 self._checkNumberOperands(expr.operator, left, right)
 
@@ -112,10 +240,49 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
     def visitCallExpr(self, expr: Call) -> Any:
         from pylox.callable import LoxCallable
 
-        callee = self._evaluate(expr.callee)
+        # Everything runs in this frame: each Python frame a call takes lowers
+        # how deep Lox code can recurse.
+        get = expr.callee
+        if type(get) is Get:
+            object = self._evaluate(get.object)
+            if type(object) is not LoxInstance:
+                callee = self._getProperty(get, object)
+            else:
+                # `object.name(...)` calls a method of an instance without
+                # creating a bound method.
+                _, slot, method = self._lookupProperty(get, object)
+                if slot >= 0:
+                    callee = object.values[slot]
+                elif method is None:
+                    raise LoxRuntimeError(
+                        get.name, f"Undefined property '{get.name.lexeme}'."
+                    )
+                else:
+                    arguments = [self._evaluate(a) for a in expr.arguments]
+                    if len(arguments) != method.arity():
+                        raise LoxRuntimeError(
+                            expr.paren,
+                            f"Expected {method.arity()} arguments "
+                            f"but got {len(arguments)}.",
+                        )
+
+                    try:
+                        return method.callBound(self, object, arguments)
+                    except RecursionError:
+                        raise LoxRuntimeError(expr.paren, "Stack overflow.") from None
+        else:
+            callee = self._evaluate(get)
+
         arguments = [self._evaluate(argument) for argument in expr.arguments]
 
-        if not isinstance(callee, LoxCallable):
+        # isinstance() against a runtime-checkable Protocol inspects every
+        # attribute of the class, and its answer only depends on the class.
+        kind = type(callee)
+        callable = CALLABLE_TYPES.get(kind)
+        if callable is None:
+            callable = CALLABLE_TYPES[kind] = isinstance(callee, LoxCallable)
+
+        if not callable:
             raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
 
         if len(arguments) != callee.arity():
@@ -124,7 +291,12 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
                 f"Expected {callee.arity()} arguments but got {len(arguments)}.",
             )
 
-        return callee.call(self, arguments)
+        try:
+            return callee.call(self, arguments)
+        except NativeError as e:
+            raise LoxRuntimeError(expr.paren, *e.args) from None
+        except RecursionError:
+            raise LoxRuntimeError(expr.paren, "Stack overflow.") from None
 
     def visitConditionalExpr(self, expr: Conditional) -> Any:
         return (
@@ -133,8 +305,68 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
             else self._evaluate(expr.right)
         )  # type: ignore
 
+    def visitGetExpr(self, expr: Get) -> Any:
+        object = self._evaluate(expr.object)  # type: ignore
+
+        # Inline cache hit on a field.
+        if type(object) is LoxInstance:
+            shape = object.shape
+            for cached, slot, _ in expr.cache:
+                if cached is shape:
+                    if slot >= 0:
+                        return object.values[slot]
+                    break
+
+        return self._getProperty(expr, object)
+
+    def _getProperty(self, expr: Get, object: Any) -> Any:
+        from pylox.native import NativeObject
+
+        if isinstance(object, NativeObject):
+            return object.get(expr.name)
+        if type(object) is not LoxInstance:
+            raise LoxRuntimeError(expr.name, "Only instances have properties.")
+
+        _, slot, method = self._lookupProperty(expr, object)
+        if slot >= 0:
+            return object.values[slot]
+        if method is None:
+            raise LoxRuntimeError(
+                expr.name, f"Undefined property '{expr.name.lexeme}'."
+            )
+
+        return method.bind(object)
+
+    def _lookupProperty(
+        self, expr: Get, instance: LoxInstance
+    ) -> Tuple[Shape, int, Any]:
+        shape = instance.shape
+        for entry in expr.cache:
+            if entry[0] is shape:
+                return entry
+
+        # Fields shadow methods. Both only depend on the shape, since it is
+        # specific to the class.
+        name = expr.name.lexeme
+        slot = shape.slots.get(name, -1)
+        method = instance.klass.methods.get(name) if slot < 0 else None
+
+        entry = (shape, slot, method)
+        if len(expr.cache) < INLINE_CACHE_SIZE:
+            expr.cache.append(entry)
+
+        return entry
+
     def visitGroupingExpr(self, expr: Grouping) -> Any:
-        return self._evaluate(expr.expression)  # type: ignore
+        slot = expr.slot
+        if slot is None:
+            return self._evaluate(expr.expression)  # type: ignore
+
+        if expr.load or (slot.invariant and slot.value is not EMPTY):
+            return slot.value
+
+        slot.value = self._evaluate(expr.expression)  # type: ignore
+        return slot.value
 
     def visitLiteralExpr(self, expr: Literal) -> Any:
         return expr.value
@@ -151,8 +383,64 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
 
         return self._evaluate(expr.right)
 
+    def visitSetExpr(self, expr: Set) -> Any:
+        object = self._evaluate(expr.object)  # type: ignore
+
+        if not isinstance(object, LoxInstance):
+            raise LoxRuntimeError(expr.name, "Only instances have fields.")
+
+        value = self._evaluate(expr.value)  # type: ignore
+        return self._setField(expr, object, value)
+
+    def _setField(self, expr: Set, object: LoxInstance, value: Any) -> Any:
+        # Looked up after evaluating the value, which may add fields.
+        shape = object.shape
+        for cached, slot, next in expr.cache:
+            if cached is shape:
+                break
+        else:
+            name = expr.name.lexeme
+            slot = shape.slots.get(name, -1)
+            next = shape
+            if slot < 0:
+                slot = len(shape.slots)
+                next = shape.withField(name)
+
+            if len(expr.cache) < INLINE_CACHE_SIZE:
+                expr.cache.append((shape, slot, next))
+
+        if next is shape:
+            object.values[slot] = value
+        else:
+            if self.budget is not None:
+                self.budget.values += 1
+            object.values.append(value)
+            object.shape = next
+
+        return value
+
+    def visitSuperExpr(self, expr: Super) -> Any:
+        superclass = self.environment.get(expr.keyword)
+        instance = self.environment.get(
+            Token(TokenType.THIS, "this", None, expr.keyword.line)
+        )
+
+        # Flattened when the superclass was created: no chain to walk.
+        method = superclass.methods.get(expr.method.lexeme)
+        if method is None:
+            raise LoxRuntimeError(
+                expr.method, f"Undefined property '{expr.method.lexeme}'."
+            )
+
+        return method.bind(instance)
+
+    def visitThisExpr(self, expr: This) -> Any:
+        return self.environment.get(expr.keyword)
+
     def visitUnaryExpr(self, expr: Unary) -> Any:
         right = self._evaluate(expr.right)  # type: ignore
+        if expr.typed:
+            return -right
 
         match expr.operator.type:
             case TokenType.BANG:
@@ -165,19 +453,140 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
         return None
 
     def visitVariableExpr(self, expr: Variable) -> Any:
-        return self.environment.get(expr.name)
+        value = self.environment.get(expr.name)
+
+        if type(value) is ModuleExport:
+            value = value.resolve(self, expr.name)
+            self.environment.assign(expr.name, value)
+
+        return value
 
     def visitBreakStmt(self, stmt: Break) -> None:
         raise Break()
 
+    def visitClassStmt(self, stmt: Class) -> None:
+        from pylox.function import LoxFunction
+        from pylox.lox_class import LoxClass
+
+        superclass = None
+        if stmt.superclass is not None:
+            superclass = self._evaluate(stmt.superclass)
+            if not isinstance(superclass, LoxClass):
+                raise LoxRuntimeError(
+                    stmt.superclass.name, "Superclass must be a class."
+                )
+
+        environment = self.environment
+        if superclass is not None:
+            environment = Environment(environment)
+            environment.define("super", superclass)
+
+        # Inherited methods are copied into the table, overridden ones replaced.
+        methods = dict(superclass.methods) if superclass is not None else {}
+        for method in stmt.methods:
+            methods[method.name.lexeme] = LoxFunction(
+                method, environment, method.name.lexeme == "init"
+            )
+
+        klass = LoxClass(stmt.name.lexeme, superclass, methods)
+        self.environment.define(stmt.name.lexeme, klass)
+
     def visitExpressionStmt(self, stmt: Expression) -> None:
         self._evaluate(stmt.expression)
 
+    def visitForStmt(self, stmt: For) -> None:
+        previous = self.environment
+        condition = stmt.condition
+        increment = stmt.increment
+
+        # A body block that declares nothing would only ever hold an empty
+        # scope, so its statements run directly in the loop's environment and
+        # no Environment is allocated per iteration.
+        body: List[Stmt] = [stmt.body]
+        if isinstance(stmt.body, Block) and not _declaresNames(stmt.body.statements):
+            body = stmt.body.statements
+
+        invariants = stmt.invariants
+        saved = clearSlots(invariants) if invariants else None
+
+        try:
+            if isinstance(stmt.initializer, Var):
+                self.environment = Environment(previous)
+            if stmt.initializer is not None:
+                self._execute(stmt.initializer)
+
+            if self.tracer is not None:
+                self.tracer.runLoop(self, stmt, condition, body, increment)
+                return
+
+            budget = self.budget
+            while condition is None or self._isTruthy(self._evaluate(condition)):
+                if budget is not None:
+                    budget.countdown -= 1
+                    if budget.countdown < 0:
+                        budget.check(stmt.keyword)
+
+                for statement in body:
+                    statement.accept(self)
+
+                if increment is not None:
+                    self._evaluate(increment)
+        except Break:
+            pass
+        finally:
+            self.environment = previous
+            if saved is not None:
+                restoreSlots(invariants, saved)
+
     def visitFunctionStmt(self, stmt: Function) -> None:
         from pylox.function import LoxFunction
 
-        function = LoxFunction(stmt, self.environment)
-        self.environment.define(stmt.name.lexeme, function)
+        if self.budget is not None:
+            self.budget.values += 1
+
+        # Declared first, so that the closure can capture the function itself.
+        self.environment.define(stmt.name.lexeme, None)
+        function = LoxFunction(stmt, self._closure(stmt))
+        self.environment.assign(stmt.name, function)
+
+    def _closure(self, stmt: Function) -> Environment:
+        """A flat closure for a function declared in the current environment.
+
+        Rather than the whole environment chain, it only holds the local
+        variables the function uses, moved into Cells shared with the
+        environments declaring them. Globals are still looked up by name.
+        """
+        environment = self.environment
+        if environment is self.globals or stmt.lazy is not None:
+            return environment
+
+        captures = stmt.captures
+        if captures is None:
+            captures = CaptureAnalyzer().analyze(stmt)
+            stmt.captures = captures
+        if not captures.flat:
+            return environment
+
+        closure = Environment(self.globals)
+        for name in captures.names:
+            scope: Optional[Environment] = environment
+            while scope is not None and name not in scope.values:
+                scope = scope.enclosing
+
+            if scope is None:
+                # Not declared yet: it may still be, in any enclosing scope.
+                return environment
+            if scope is self.globals:
+                continue
+
+            cell = scope.values[name]
+            if type(cell) is not Cell:
+                cell = Cell(cell)
+                scope.values[name] = cell
+
+            closure.values[name] = cell
+
+        return closure
 
     def visitIfStmt(self, stmt: If) -> None:
         if self._isTruthy(self._evaluate(stmt.condition)):
@@ -185,6 +594,19 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
         elif stmt.elseBranch:
             self._execute(stmt.elseBranch)
 
+    def visitImportStmt(self, stmt: Import) -> None:
+        path = (self.directory / stmt.path.literal).resolve()
+
+        module = self.modules.get(path)
+        if module is None:
+            parsed = parseModule(path, stmt.path)
+            module = Module(parsed, Environment(self.globals))
+            self.modules[path] = module
+
+        export = ModuleExport(module)
+        for name in module.parsed.exports:
+            self.environment.define(name, export)
+
     def visitPrintStmt(self, stmt: Print) -> None:
         value = self._evaluate(stmt.expression)
         print(self._stringify(value))
@@ -204,11 +626,27 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
         self.environment.define(stmt.name.lexeme, value)
 
     def visitWhileStmt(self, stmt: While) -> None:
+        invariants = stmt.invariants
+        saved = clearSlots(invariants) if invariants else None
+
         try:
+            if self.tracer is not None:
+                self.tracer.runLoop(self, stmt, stmt.condition, [stmt.body], None)
+                return
+
+            budget = self.budget
             while self._isTruthy(self._evaluate(stmt.condition)):
+                if budget is not None:
+                    budget.countdown -= 1
+                    if budget.countdown < 0:
+                        budget.check(stmt.keyword)
+
                 self._execute(stmt.body)
         except Break:
             pass
+        finally:
+            if saved is not None:
+                restoreSlots(invariants, saved)
 
     def visitBlockStmt(self, stmt: Block) -> None:
         self._executeBlock(stmt.statements, Environment(self.environment))
@@ -272,8 +710,19 @@ class Interpreter(ExprVisitor[Any], StmtVisitor[None]):
         if isinstance(object, bool):
             return "true" if object else "false"
 
+        from pylox.native import NativeObject
+
+        if isinstance(object, NativeObject):
+            return object.stringify(self._stringify)
+
         return str(object)
 
 
 class Break(Exception):
     pass
+
+
+def _declaresNames(statements: List[Stmt]) -> bool:
+    return any(
+        isinstance(statement, (Var, Function, Class)) for statement in statements
+    )
@@ -0,0 +1,235 @@
+import operator
+from array import array
+from itertools import repeat
+from typing import Any, Callable, List
+
+from pylox.callable import LoxCallable
+from pylox.error import NativeError
+from pylox.interpreter import Interpreter
+from pylox.native import NativeObject, allocate, checkIndex
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore
+
+# How many elements printing an array shows.
+PRINT_LIMIT = 10
+
+
+class LoxArray(NativeObject):
+    """A fixed-size array of numbers, operated on in bulk by native methods.
+
+    The elements are a NumPy float64 array when NumPy is installed, or else a
+    memoryview of an array('d'). Either way, slices are views that share the
+    elements of the array they were taken from.
+    """
+
+    def __init__(self, data: Any) -> None:
+        self.data: Any = data
+
+    @staticmethod
+    def zeros(size: int) -> "LoxArray":
+        if numpy is not None:
+            return LoxArray(numpy.zeros(size))
+
+        return LoxArray(memoryview(array("d", bytes(8 * size))))
+
+    @staticmethod
+    def fromIterable(values: Any) -> "LoxArray":
+        if numpy is not None:
+            return LoxArray(numpy.fromiter(values, dtype=float))
+
+        return LoxArray(memoryview(array("d", values)))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def stringify(self, stringify: Callable[[Any], str]) -> str:
+        elements = [stringify(float(x)) for x in self.data[:PRINT_LIMIT]]
+        if len(self.data) > PRINT_LIMIT:
+            elements.append("...")
+
+        return "[" + ", ".join(elements) + "]"
+
+
+class ArrayNative(LoxCallable):
+    """`array(size)`: a new array of `size` zeros."""
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        size = _count(arguments[0], "Array size")
+        allocate(interpreter, size)
+        return LoxArray.zeros(size)
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+class ArangeNative(LoxCallable):
+    """`arange(start, stop, step)`: the numbers from `start` up to, but not
+    including, `stop`."""
+
+    def arity(self) -> int:
+        return 3
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        start, stop, step = arguments
+        for value in arguments:
+            _checkNumber(value)
+        if step == 0:
+            raise NativeError("Range step can't be zero.")
+
+        size = max(0, -int((start - stop) // step))
+        allocate(interpreter, size)
+        if numpy is not None:
+            return LoxArray(start + step * numpy.arange(size, dtype=float))
+
+        return LoxArray.fromIterable(
+            map(
+                operator.add,
+                repeat(start),
+                map(operator.mul, repeat(step), range(size)),
+            )
+        )
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+def _checkNumber(value: Any) -> None:
+    if not isinstance(value, float):
+        raise NativeError("Operand must be a number.")
+
+
+def _count(value: Any, what: str) -> int:
+    if not isinstance(value, float) or not value.is_integer() or value < 0:
+        raise NativeError(f"{what} must be a non-negative integer.")
+
+    return int(value)
+
+
+def _length(interpreter: Interpreter, target: LoxArray) -> float:
+    return float(len(target))
+
+
+def _get(interpreter: Interpreter, target: LoxArray, index: Any) -> float:
+    return float(target.data[checkIndex(index, len(target), "Array")])
+
+
+def _set(interpreter: Interpreter, target: LoxArray, index: Any, value: Any) -> Any:
+    _checkNumber(value)
+    target.data[checkIndex(index, len(target), "Array")] = value
+    return value
+
+
+def _fill(interpreter: Interpreter, target: LoxArray, value: Any) -> LoxArray:
+    _checkNumber(value)
+    if numpy is not None:
+        target.data.fill(value)
+    else:
+        target.data[:] = array("d", repeat(value, len(target)))
+
+    return target
+
+
+def _slice(
+    interpreter: Interpreter, target: LoxArray, start: Any, stop: Any
+) -> LoxArray:
+    first = _count(start, "Slice start")
+    last = _count(stop, "Slice end")
+    if not first <= last <= len(target):
+        raise NativeError("Slice out of range.")
+
+    return LoxArray(target.data[first:last])
+
+
+def _copy(interpreter: Interpreter, target: LoxArray) -> LoxArray:
+    allocate(interpreter, len(target))
+    if numpy is not None:
+        return LoxArray(target.data.copy())
+
+    return LoxArray(memoryview(array("d", target.data)))
+
+
+def _sum(interpreter: Interpreter, target: LoxArray) -> float:
+    return float(target.data.sum()) if numpy is not None else float(sum(target.data))
+
+
+def _min(interpreter: Interpreter, target: LoxArray) -> float:
+    if len(target) == 0:
+        raise NativeError("Can't take the minimum of an empty array.")
+
+    return float(target.data.min()) if numpy is not None else min(target.data)
+
+
+def _max(interpreter: Interpreter, target: LoxArray) -> float:
+    if len(target) == 0:
+        raise NativeError("Can't take the maximum of an empty array.")
+
+    return float(target.data.max()) if numpy is not None else max(target.data)
+
+
+def _sort(interpreter: Interpreter, target: LoxArray) -> LoxArray:
+    if numpy is not None:
+        target.data.sort()
+    else:
+        target.data[:] = array("d", sorted(target.data))
+
+    return target
+
+
+def _elementwise(
+    operation: Callable[[Any, Any], Any],
+) -> Callable[[Interpreter, LoxArray, Any], LoxArray]:
+    def apply(interpreter: Interpreter, target: LoxArray, other: Any) -> LoxArray:
+        if isinstance(other, LoxArray):
+            if len(other) != len(target):
+                raise NativeError("Arrays must have the same length.")
+            operand = other.data
+        elif isinstance(other, float):
+            operand = other
+        else:
+            raise NativeError("Operand must be a number or an array.")
+
+        if operation is operator.truediv and _hasZero(operand):
+            raise NativeError("division by zero")
+
+        allocate(interpreter, len(target))
+
+        if numpy is not None:
+            return LoxArray(operation(target.data, operand))
+
+        operands = operand if isinstance(other, LoxArray) else repeat(operand)
+        return LoxArray.fromIterable(map(operation, target.data, operands))
+
+    return apply
+
+
+def _hasZero(operand: Any) -> bool:
+    if isinstance(operand, float):
+        return operand == 0
+    if numpy is not None:
+        return bool((operand == 0).any())
+
+    return 0.0 in operand
+
+
+LoxArray.methods = {
+    "add": (1, _elementwise(operator.add)),
+    "copy": (0, _copy),
+    "div": (1, _elementwise(operator.truediv)),
+    "fill": (1, _fill),
+    "get": (1, _get),
+    "length": (0, _length),
+    "max": (0, _max),
+    "min": (0, _min),
+    "mul": (1, _elementwise(operator.mul)),
+    "set": (2, _set),
+    "slice": (2, _slice),
+    "sort": (0, _sort),
+    "sub": (1, _elementwise(operator.sub)),
+    "sum": (0, _sum),
+}
@@ -0,0 +1,46 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from pylox.callable import LoxCallable
+from pylox.interpreter import Interpreter
+from pylox.lox_instance import LoxInstance
+from pylox.shape import Shape
+
+if TYPE_CHECKING:
+    from pylox.function import LoxFunction
+
+
+@dataclass(eq=False)
+class LoxClass(LoxCallable):
+    name: str
+    superclass: Optional["LoxClass"]
+
+    # Every method an instance responds to, inherited ones included: the
+    # superclass table is copied in when the class is created, so lookups
+    # never walk the inheritance chain.
+    methods: Dict[str, "LoxFunction"]
+
+    # The shape of new instances, before any field is set.
+    shape: Shape = field(default_factory=Shape, repr=False)
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        if interpreter.budget is not None:
+            interpreter.budget.values += 1
+
+        instance = LoxInstance(self)
+
+        initializer = self.methods.get("init")
+        if initializer is not None:
+            initializer.callBound(interpreter, instance, arguments)
+
+        return instance
+
+    def arity(self) -> int:
+        initializer = self.methods.get("init")
+        if initializer is None:
+            return 0
+
+        return initializer.arity()
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,125 @@
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, List, Optional
+
+from pylox.budget import STRING_CHUNK
+from pylox.callable import LoxCallable
+from pylox.error import NativeError
+from pylox.interpreter import Interpreter
+from pylox.native import NativeObject, allocate, checkFunction
+
+# Bytes read from a file at a time.
+BUFFER_SIZE = 1 << 16
+
+
+class LoxFile(NativeObject):
+    """A file open for reading, line by line or in one go.
+
+    Reads go through a buffer of BUFFER_SIZE bytes, so reading a file line by
+    line holds one line and one buffer in memory however large the file is.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.file: BinaryIO = open(path, "rb", buffering=BUFFER_SIZE)
+
+    def readLine(self) -> Optional[bytes]:
+        """The next line, with its line ending, or None at the end."""
+        line = self._reader().readline()
+        return line if line else None
+
+    def read(self) -> bytes:
+        return self._reader().read()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def _reader(self) -> BinaryIO:
+        if self.file.closed:
+            raise NativeError("File is closed.")
+
+        return self.file
+
+    def stringify(self, stringify: Callable[[Any], str]) -> str:
+        return f"<file {self.path}>"
+
+
+class OpenNative(LoxCallable):
+    """`open(path)`: a file to read, relative to the script."""
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        return _open(interpreter, arguments[0])
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+class ReadFileNative(LoxCallable):
+    """`readFile(path)`: the contents of a file, relative to the script."""
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        file = _open(interpreter, arguments[0])
+        try:
+            return _string(interpreter, file.read())
+        finally:
+            file.close()
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+def _open(interpreter: Interpreter, path: Any) -> LoxFile:
+    if not isinstance(path, str):
+        raise NativeError("Path must be a string.")
+
+    try:
+        return LoxFile(interpreter.directory / path)
+    except OSError as e:
+        raise NativeError(f"Can't open '{path}': {e.strerror}.") from None
+
+
+def _string(interpreter: Interpreter, data: bytes) -> str:
+    allocate(interpreter, len(data) // STRING_CHUNK + 1)
+    return data.decode(errors="replace")
+
+
+def _line(interpreter: Interpreter, line: bytes) -> str:
+    if line.endswith(b"\n"):
+        line = line[:-2] if line.endswith(b"\r\n") else line[:-1]
+
+    return _string(interpreter, line)
+
+
+def _readLine(interpreter: Interpreter, target: LoxFile) -> Optional[str]:
+    line = target.readLine()
+    return _line(interpreter, line) if line is not None else None
+
+
+def _read(interpreter: Interpreter, target: LoxFile) -> str:
+    return _string(interpreter, target.read())
+
+
+def _forEachLine(interpreter: Interpreter, target: LoxFile, function: Any) -> None:
+    callee = checkFunction(function, 1)
+
+    line = target.readLine()
+    while line is not None:
+        callee.call(interpreter, [_line(interpreter, line)])
+        line = target.readLine()
+
+
+def _close(interpreter: Interpreter, target: LoxFile) -> None:
+    target.close()
+
+
+LoxFile.methods = {
+    "close": (0, _close),
+    "forEachLine": (1, _forEachLine),
+    "read": (0, _read),
+    "readLine": (0, _readLine),
+}
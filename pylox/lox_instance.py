@@ -0,0 +1,20 @@
+from typing import TYPE_CHECKING, Any, List
+
+from pylox.shape import Shape
+
+if TYPE_CHECKING:
+    from pylox.lox_class import LoxClass
+
+
+class LoxInstance:
+    # Fields are stored in `values` at the slot `shape` gives them, instead of
+    # a dict per instance.
+    __slots__ = ("klass", "shape", "values")
+
+    def __init__(self, klass: "LoxClass") -> None:
+        self.klass: LoxClass = klass
+        self.shape: Shape = klass.shape
+        self.values: List[Any] = []
+
+    def __str__(self) -> str:
+        return f"{self.klass.name} instance"
@@ -0,0 +1,83 @@
+from typing import Any, Callable, List
+
+from pylox.callable import LoxCallable
+from pylox.error import NativeError
+from pylox.interpreter import Interpreter
+from pylox.native import NativeObject, allocate, checkFunction, checkIndex
+
+
+class LoxList(NativeObject):
+    """A growable list of values."""
+
+    def __init__(self) -> None:
+        self.values: List[Any] = []
+
+        # Set while the list is being printed, to show cycles as "[...]".
+        self.printing: bool = False
+
+    def stringify(self, stringify: Callable[[Any], str]) -> str:
+        if self.printing:
+            return "[...]"
+
+        self.printing = True
+        try:
+            return "[" + ", ".join(map(stringify, self.values)) + "]"
+        finally:
+            self.printing = False
+
+
+class ListNative(LoxCallable):
+    """`list()`: a new empty list."""
+
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        allocate(interpreter, 1)
+        return LoxList()
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+def _append(interpreter: Interpreter, target: LoxList, value: Any) -> None:
+    allocate(interpreter, 1)
+    target.values.append(value)
+
+
+def _get(interpreter: Interpreter, target: LoxList, index: Any) -> Any:
+    return target.values[checkIndex(index, len(target.values), "List")]
+
+
+def _set(interpreter: Interpreter, target: LoxList, index: Any, value: Any) -> Any:
+    target.values[checkIndex(index, len(target.values), "List")] = value
+    return value
+
+
+def _length(interpreter: Interpreter, target: LoxList) -> float:
+    return float(len(target.values))
+
+
+def _pop(interpreter: Interpreter, target: LoxList) -> Any:
+    if not target.values:
+        raise NativeError("Can't pop from an empty list.")
+
+    return target.values.pop()
+
+
+def _forEach(interpreter: Interpreter, target: LoxList, function: Any) -> None:
+    callee = checkFunction(function, 1)
+
+    # Walks the list itself, so elements appended meanwhile are visited too.
+    for value in target.values:
+        callee.call(interpreter, [value])
+
+
+LoxList.methods = {
+    "append": (1, _append),
+    "forEach": (1, _forEach),
+    "get": (1, _get),
+    "length": (0, _length),
+    "pop": (0, _pop),
+    "set": (2, _set),
+}
@@ -0,0 +1,108 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+from pylox.callable import LoxCallable
+from pylox.error import NativeError
+from pylox.interpreter import Interpreter
+from pylox.native import NativeObject, allocate, checkFunction
+
+# A key of the dict of a map: the type of the Lox value and the value, so that
+# `true` and `1` stay distinct.
+MapKey = Tuple[type, Any]
+
+
+class LoxMap(NativeObject):
+    """A hash map from values to values."""
+
+    def __init__(self) -> None:
+        self.entries: Dict[MapKey, Any] = {}
+
+        # Set while the map is being printed, to show cycles as "{...}".
+        self.printing: bool = False
+
+    def stringify(self, stringify: Callable[[Any], str]) -> str:
+        if self.printing:
+            return "{...}"
+
+        self.printing = True
+        try:
+            entries = (
+                f"{stringify(key)}: {stringify(value)}"
+                for (_, key), value in self.entries.items()
+            )
+            return "{" + ", ".join(entries) + "}"
+        finally:
+            self.printing = False
+
+
+class MapNative(LoxCallable):
+    """`map()`: a new empty map."""
+
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        allocate(interpreter, 1)
+        return LoxMap()
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+def _key(key: Any) -> MapKey:
+    try:
+        hash(key)
+    except TypeError:
+        raise NativeError("Functions and methods can't be map keys.") from None
+
+    return type(key), key
+
+
+def _get(interpreter: Interpreter, target: LoxMap, key: Any) -> Any:
+    return target.entries.get(_key(key))
+
+
+def _has(interpreter: Interpreter, target: LoxMap, key: Any) -> bool:
+    return _key(key) in target.entries
+
+
+def _set(interpreter: Interpreter, target: LoxMap, key: Any, value: Any) -> Any:
+    entry = _key(key)
+    if entry not in target.entries:
+        allocate(interpreter, 1)
+
+    target.entries[entry] = value
+    return value
+
+
+def _remove(interpreter: Interpreter, target: LoxMap, key: Any) -> Any:
+    return target.entries.pop(_key(key), None)
+
+
+def _length(interpreter: Interpreter, target: LoxMap) -> float:
+    return float(len(target.entries))
+
+
+def _forEach(interpreter: Interpreter, target: LoxMap, function: Any) -> None:
+    callee = checkFunction(function, 2)
+
+    # Walks the map itself, which must not grow or shrink meanwhile.
+    entries = iter(target.entries.items())
+    while True:
+        try:
+            (_, key), value = next(entries)
+        except StopIteration:
+            return
+        except RuntimeError:
+            raise NativeError("Map changed size during iteration.") from None
+
+        callee.call(interpreter, [key, value])
+
+
+LoxMap.methods = {
+    "forEach": (1, _forEach),
+    "get": (1, _get),
+    "has": (1, _has),
+    "length": (0, _length),
+    "remove": (1, _remove),
+    "set": (2, _set),
+}
@@ -0,0 +1,432 @@
+"""Language server for Lox over stdio JSON-RPC.
+
+Each open document is kept as a list of contiguous regions, one per top-level
+declaration, caching that declaration's tokens, syntax tree and diagnostics.
+An edit only re-scans and re-parses the regions it touches: the span grows
+into the following regions only while the re-parsed text does not end on a
+clean declaration boundary (an unterminated string or comment, an error that
+ran into the end of the span, a token that could merge with the next one, or
+an `if` whose `else` follows).
+
+Positions are counted in code points rather than UTF-16 code units.
+"""
+
+import json
+import sys
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from pylox.error import LoxError
+from pylox.parser import Parser
+from pylox.scanner import Scanner
+from pylox.stmt import Class, Function, If, Stmt, Var
+from pylox.token import Token
+from pylox.token_type import TokenType
+
+# LSP constants.
+SYNC_INCREMENTAL = 2
+SEVERITY_ERROR = 1
+SYMBOL_CLASS = 5
+SYMBOL_FUNCTION = 12
+SYMBOL_VARIABLE = 13
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+
+
+@dataclass
+class Diagnostic:
+    line: int
+    message: str
+
+
+@dataclass
+class Region:
+    """A top-level declaration and the text up to the next one.
+
+    Token and diagnostic lines are relative to `line`, the line the region
+    starts on, so regions after an edit only need their start shifted.
+    """
+
+    start: int
+    line: int
+    tokens: List[Token] = field(default_factory=list)
+    statement: Optional[Stmt] = None
+    diagnostics: List[Diagnostic] = field(default_factory=list)
+
+
+class RegionScanner(Scanner):
+    """Scanner that also records where each token starts in the source.
+
+    Token lines are where a token ends, which differs for multi-line strings.
+    """
+
+    def __init__(self, source: str, diagnostics: List[Diagnostic]) -> None:
+        super().__init__(source)
+        self.offsets: List[int] = []
+        self.lines: List[int] = []
+        self.diagnostics: List[Diagnostic] = diagnostics
+        self.unterminated: bool = False
+        self.start_line: int = 1
+
+    def _scan_token(self) -> None:
+        self.start_line = self.line
+        super()._scan_token()
+
+        # A line comment running into the end of the span would swallow
+        # whatever follows it.
+        if self._is_at_end() and self.source.startswith("//", self.start):
+            self.unterminated = True
+
+    def _add_token(self, type: TokenType, literal: Any = None):
+        self.offsets.append(self.start)
+        self.lines.append(self.start_line)
+        super()._add_token(type, literal)
+
+    def _string(self) -> None:
+        reported = len(self.diagnostics)
+        super()._string()
+        self.unterminated |= len(self.diagnostics) > reported
+
+    def _multiline_comment(self) -> None:
+        reported = len(self.diagnostics)
+        super()._multiline_comment()
+        self.unterminated |= len(self.diagnostics) > reported
+
+
+class Document:
+    def __init__(self, text: str) -> None:
+        self.text: str = text
+        self.regions: List[Region] = []
+        self.reparse()
+
+    def reparse(self) -> None:
+        self.regions, _ = self._parseSpan(0, len(self.text), 1, None)
+
+    def change(self, start: int, end: int, text: str) -> None:
+        """Replace text[start:end] with `text`, re-parsing only what changed."""
+        removed = self.text[start:end]
+        self.text = self.text[:start] + text + self.text[end:]
+        delta = len(text) - len(removed)
+        lineDelta = text.count("\n") - removed.count("\n")
+
+        starts = [region.start for region in self.regions]
+        # The region before the edit is included as well: the edit may be at
+        # its end, or turn the text after an `if` into its `else`.
+        lo = max(bisect_right(starts, start) - 2, 0)
+        hi = bisect_right(starts, end)
+
+        extra = 1
+        while True:
+            spanEnd = starts[hi] + delta if hi < len(starts) else len(self.text)
+            following = self.regions[hi] if hi < len(starts) else None
+            regions, complete = self._parseSpan(
+                starts[lo], spanEnd, self.regions[lo].line, following
+            )
+            if complete or following is None:
+                break
+
+            hi = min(hi + extra, len(starts))
+            extra *= 2
+
+        for region in self.regions[hi:]:
+            region.start += delta
+            region.line += lineDelta
+        self.regions[lo:hi] = regions
+
+    def offset(self, line: int, character: int) -> int:
+        """Convert a 0-based LSP position into an offset in the text."""
+        line += 1
+        index = max(bisect_right([r.line for r in self.regions], line) - 1, 0)
+        offset = self.regions[index].start
+        current = self.regions[index].line
+
+        while current < line:
+            newline = self.text.find("\n", offset)
+            if newline < 0:
+                return len(self.text)
+            offset = newline + 1
+            current += 1
+
+        lineEnd = self.text.find("\n", offset)
+        if lineEnd < 0:
+            lineEnd = len(self.text)
+
+        return min(offset + character, lineEnd)
+
+    def diagnostics(self) -> List[Diagnostic]:
+        return [
+            Diagnostic(region.line + diagnostic.line - 1, diagnostic.message)
+            for region in self.regions
+            for diagnostic in region.diagnostics
+        ]
+
+    def symbols(self) -> List[Tuple[str, int, int]]:
+        """Name, kind and line of each top-level class, function and variable."""
+        symbols = []
+        for region in self.regions:
+            statement = region.statement
+            if isinstance(statement, Class):
+                kind = SYMBOL_CLASS
+            elif isinstance(statement, Function):
+                kind = SYMBOL_FUNCTION
+            elif isinstance(statement, Var):
+                kind = SYMBOL_VARIABLE
+            else:
+                continue
+
+            name = statement.name
+            symbols.append((name.lexeme, kind, region.line + name.line - 1))
+
+        return symbols
+
+    def _parseSpan(
+        self, start: int, end: int, line: int, following: Optional[Region]
+    ) -> Tuple[List[Region], bool]:
+        """Parse text[start:end] into regions.
+
+        Also tells whether the span ended on a declaration boundary, that is
+        whether the following region is unaffected by it.
+        """
+        diagnostics: List[Diagnostic] = []
+
+        def collect(line: int, where: str, message: str) -> None:
+            diagnostics.append(Diagnostic(line, f"Error {where}: {message}"))
+
+        reporter = LoxError.reporter
+        LoxError.reporter = collect
+        try:
+            scanner = RegionScanner(self.text[start:end], diagnostics)
+            tokens = scanner.scan_tokens()
+            scanned = len(diagnostics)
+
+            parser = Parser(tokens)
+            declarations: List[Tuple[int, Optional[Stmt], List[Diagnostic]]] = []
+            while not parser._isAtEnd():
+                first = parser.current
+                reported = len(diagnostics)
+                statement = parser._declaration()
+                declarations.append((first, statement, diagnostics[reported:]))
+        finally:
+            LoxError.reporter = reporter
+            LoxError.reset_error()
+
+        if not declarations:
+            declarations.append((0, None, []))
+
+        regions: List[Region] = []
+        for index, (first, statement, errors) in enumerate(declarations):
+            last = declarations[index + 1][0] if index + 1 < len(declarations) else -1
+            # Lines inside the span are 1-based; rebase them onto the region.
+            # The statement shares these tokens, so it is rebased as well.
+            base = 1 if index == 0 else scanner.lines[first]
+            for token in tokens[first:last]:
+                token.line -= base - 1
+
+            regions.append(
+                Region(
+                    start if index == 0 else start + scanner.offsets[first],
+                    line + base - 1,
+                    tokens[first:last],
+                    statement,
+                    [Diagnostic(e.line - base + 1, e.message) for e in errors],
+                )
+            )
+
+        # Scan errors belong to the region containing their line.
+        for error in diagnostics[:scanned]:
+            lines = [region.line - line + 1 for region in regions]
+            region = regions[max(bisect_right(lines, error.line) - 1, 0)]
+            region.diagnostics.append(
+                Diagnostic(error.line - (region.line - line), error.message)
+            )
+
+        # The last token could also merge with the first one that follows.
+        complete = (
+            not scanner.unterminated
+            and not declarations[-1][2]
+            and self.text[end - 1 : end] in (" ", "\t", "\r", "\n")
+        )
+        if following is not None and following.tokens:
+            last_statement = declarations[-1][1]
+            if isinstance(last_statement, If) and last_statement.elseBranch is None:
+                complete &= following.tokens[0].type != TokenType.ELSE
+
+        return regions, complete
+
+
+class LanguageServer:
+    def __init__(self, input: BinaryIO, output: BinaryIO) -> None:
+        self.input: BinaryIO = input
+        self.output: BinaryIO = output
+        self.documents: Dict[str, Document] = {}
+        self.running: bool = True
+
+    def serve(self) -> None:
+        while self.running:
+            message = self._read()
+            if message is None:
+                return
+
+            self._dispatch(message)
+
+    def _dispatch(self, message: Dict[str, Any]) -> None:
+        method = message.get("method")
+        params = message.get("params") or {}
+        handler = getattr(self, "_on_" + str(method).replace("/", "_"), None)
+
+        if "id" not in message:
+            if handler is None:
+                return
+
+            # Nobody waits for an answer to a notification: report what went
+            # wrong and keep serving.
+            try:
+                handler(params)
+            except Exception as e:
+                print(f"pylox: {method} failed: {e!r}", file=sys.stderr)
+            return
+
+        if handler is None:
+            self._send(
+                {
+                    "id": message["id"],
+                    "error": {
+                        "code": METHOD_NOT_FOUND,
+                        "message": f"Unhandled method {method}",
+                    },
+                }
+            )
+            return
+
+        try:
+            result = handler(params)
+        except Exception as e:
+            self._send(
+                {
+                    "id": message["id"],
+                    "error": {
+                        "code": INTERNAL_ERROR,
+                        "message": f"{method} failed: {e!r}",
+                    },
+                }
+            )
+            return
+
+        self._send({"id": message["id"], "result": result})
+
+    def _on_initialize(self, params: Dict[str, Any]) -> Any:
+        return {
+            "capabilities": {
+                "textDocumentSync": {"openClose": True, "change": SYNC_INCREMENTAL},
+                "documentSymbolProvider": True,
+            },
+            "serverInfo": {"name": "pylox"},
+        }
+
+    def _on_shutdown(self, params: Dict[str, Any]) -> Any:
+        return None
+
+    def _on_exit(self, params: Dict[str, Any]) -> None:
+        self.running = False
+
+    def _on_textDocument_didOpen(self, params: Dict[str, Any]) -> None:
+        document = params["textDocument"]
+        self.documents[document["uri"]] = Document(document["text"])
+        self._publishDiagnostics(document["uri"])
+
+    def _on_textDocument_didChange(self, params: Dict[str, Any]) -> None:
+        uri = params["textDocument"]["uri"]
+        document = self.documents.get(uri)
+        if document is None:
+            # Never opened, or closed already: nothing to update.
+            return
+
+        for change in params["contentChanges"]:
+            if "range" not in change:
+                document.text = change["text"]
+                document.reparse()
+                continue
+
+            start = change["range"]["start"]
+            end = change["range"]["end"]
+            document.change(
+                document.offset(start["line"], start["character"]),
+                document.offset(end["line"], end["character"]),
+                change["text"],
+            )
+
+        self._publishDiagnostics(uri)
+
+    def _on_textDocument_didClose(self, params: Dict[str, Any]) -> None:
+        uri = params["textDocument"]["uri"]
+        self.documents.pop(uri, None)
+        self._notify("textDocument/publishDiagnostics", {"uri": uri, "diagnostics": []})
+
+    def _on_textDocument_documentSymbol(self, params: Dict[str, Any]) -> Any:
+        document = self.documents[params["textDocument"]["uri"]]
+
+        return [
+            {
+                "name": name,
+                "kind": kind,
+                "range": _lineRange(line),
+                "selectionRange": _lineRange(line),
+            }
+            for name, kind, line in document.symbols()
+        ]
+
+    def _publishDiagnostics(self, uri: str) -> None:
+        diagnostics = [
+            {
+                "range": _lineRange(diagnostic.line),
+                "severity": SEVERITY_ERROR,
+                "source": "pylox",
+                "message": diagnostic.message,
+            }
+            for diagnostic in self.documents[uri].diagnostics()
+        ]
+
+        self._notify(
+            "textDocument/publishDiagnostics", {"uri": uri, "diagnostics": diagnostics}
+        )
+
+    # Transport
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        length = 0
+        while True:
+            header = self.input.readline()
+            if not header:
+                return None
+
+            header = header.strip()
+            if not header:
+                break
+
+            name, _, value = header.decode("ascii").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+
+        return json.loads(self.input.read(length))
+
+    def _notify(self, method: str, params: Any) -> None:
+        self._send({"method": method, "params": params})
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode("utf-8")
+        self.output.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii"))
+        self.output.write(body)
+        self.output.flush()
+
+
+def _lineRange(line: int) -> Dict[str, Any]:
+    """The whole of a 1-based Lox line, as an LSP range."""
+    return {
+        "start": {"line": line - 1, "character": 0},
+        "end": {"line": line, "character": 0},
+    }
+
+
+def serve() -> None:
+    LanguageServer(sys.stdin.buffer, sys.stdout.buffer).serve()
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+# Sentinel for a cache miss, since nil (None) is a valid cached result.
+MISSING = object()
+
+
+class MemoCache:
+    """Bounded LRU cache of a pure function's results, keyed by arguments."""
+
+    def __init__(self, name: str, maxsize: int) -> None:
+        self.name: str = name
+        self.maxsize: int = maxsize
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def key(arguments: List[Any]) -> Optional[Tuple[Any, ...]]:
+        """Build a cache key, or return None if an argument can't be keyed.
+
+        Types are part of the key so that `true` and `1` stay distinct.
+        """
+        key = []
+        for argument in arguments:
+            if argument is not None and type(argument) not in (float, str, bool):
+                return None
+            key.append((type(argument), argument))
+
+        return tuple(key)
+
+    def get(self, key: Hashable) -> Any:
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.hits} hits, {self.misses} misses, "
+            f"{len(self.entries)}/{self.maxsize} entries"
+        )
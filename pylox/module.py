@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from pylox.environment import Environment
+from pylox.error import LoxError, LoxRuntimeError
+from pylox.parser import Parser
+from pylox.scanner import Scanner
+from pylox.stmt import Class, Function, Stmt, Var
+from pylox.token import Token
+
+if TYPE_CHECKING:
+    from pylox.interpreter import Interpreter
+
+
+@dataclass
+class ParsedModule:
+    path: Path
+    statements: List[Stmt]
+    # Names declared at the top level of the module.
+    exports: List[str]
+
+
+# Parsed modules, shared by every interpreter in the process and keyed by
+# resolved path and modification time.
+_parsedModules: Dict[Tuple[Path, int], ParsedModule] = {}
+
+
+def parseModule(path: Path, importToken: Token) -> ParsedModule:
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        raise LoxRuntimeError(
+            importToken, f"Could not open module '{importToken.literal}'."
+        ) from None
+
+    parsed = _parsedModules.get((path, mtime))
+    if parsed is not None:
+        return parsed
+
+    try:
+        source = path.read_text()
+    except (OSError, UnicodeDecodeError):
+        raise LoxRuntimeError(
+            importToken, f"Could not open module '{importToken.literal}'."
+        ) from None
+
+    had_error = LoxError.had_error()
+    statements = Parser(Scanner(source).scan_tokens()).parse()
+    if LoxError.had_error() and not had_error:
+        raise LoxRuntimeError(
+            importToken, f"Could not parse module '{importToken.literal}'."
+        )
+
+    exports = [
+        statement.name.lexeme
+        for statement in statements
+        if isinstance(statement, (Class, Function, Var))
+    ]
+
+    parsed = ParsedModule(path, statements, exports)
+    _parsedModules[(path, mtime)] = parsed
+    return parsed
+
+
+@dataclass
+class Module:
+    """A module imported by an interpreter, executed on first use."""
+
+    parsed: ParsedModule
+    environment: Environment
+    executed: bool = False
+
+    def execute(self, interpreter: "Interpreter") -> None:
+        if self.executed:
+            return
+
+        # Set first, so that import cycles see a partially executed module
+        # instead of running it again.
+        self.executed = True
+
+        directory = interpreter.directory
+        try:
+            interpreter.directory = self.parsed.path.parent
+            interpreter._executeBlock(self.parsed.statements, self.environment)
+        finally:
+            interpreter.directory = directory
+
+
+@dataclass
+class ModuleExport:
+    """Placeholder bound by `import` for a name the module declares.
+
+    Reading it executes the module and yields the name's actual value.
+    """
+
+    module: Module
+
+    def resolve(self, interpreter: "Interpreter", name: Token) -> Any:
+        self.module.execute(interpreter)
+        return self.module.environment.get(name)
@@ -0,0 +1,90 @@
+from abc import ABC, abstractmethod
+from functools import cache
+from typing import Any, Callable, ClassVar, Dict, List, Tuple
+
+from pylox.callable import LoxCallable
+from pylox.error import LoxRuntimeError, NativeError
+from pylox.interpreter import Interpreter
+from pylox.token import Token
+
+# Arity and implementation of a native method. The implementation receives the
+# interpreter, the object and the arguments.
+NativeMethodSpec = Tuple[int, Callable[..., Any]]
+
+
+class NativeObject(ABC):
+    """A value whose properties are the native methods in `methods`."""
+
+    methods: ClassVar[Dict[str, NativeMethodSpec]] = {}
+
+    def get(self, name: Token) -> "NativeMethod":
+        method = self.methods.get(name.lexeme)
+        if method is None:
+            raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
+
+        arity, function = method
+        return NativeMethod(self, arity, function)
+
+    @abstractmethod
+    def stringify(self, stringify: Callable[[Any], str]) -> str:
+        """How `print` shows the object, given how it shows any other value."""
+
+
+class NativeMethod(LoxCallable):
+    def __init__(
+        self, target: NativeObject, arity: int, function: Callable[..., Any]
+    ) -> None:
+        self.target = target
+        self._arity = arity
+        self.function = function
+
+    def arity(self) -> int:
+        return self._arity
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        return self.function(interpreter, self.target, *arguments)
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+def checkFunction(function: Any, arity: int) -> LoxCallable:
+    """Check that a value passed to a native can be called with `arity`
+    arguments."""
+    if not isinstance(function, LoxCallable):
+        raise NativeError("Can only call functions and classes.")
+    if function.arity() != arity:
+        plural = "" if arity == 1 else "s"
+        raise NativeError(f"Expected a function of {arity} argument{plural}.")
+
+    return function
+
+
+def allocate(interpreter: Interpreter, count: int) -> None:
+    """Count values created by a native against the budget of the run."""
+    if interpreter.budget is not None:
+        interpreter.budget.allocate(count)
+
+
+def checkIndex(index: Any, length: int, what: str) -> int:
+    if not isinstance(index, float) or not index.is_integer():
+        raise NativeError(f"{what} index must be an integer.")
+    if not 0 <= index < length:
+        raise NativeError(f"{what} index out of range.")
+
+    return int(index)
+
+
+def nativeKey(value: Any) -> Tuple[str, str]:
+    """What identifies a native function across interpreters and processes:
+    its type, by name."""
+    return type(value).__module__, type(value).__qualname__
+
+
+@cache
+def builtinNatives() -> Dict[Tuple[str, str], str]:
+    """The global names of the natives every interpreter starts with, by
+    nativeKey."""
+    return {
+        nativeKey(value): name for name, value in Interpreter().globals.values.items()
+    }
@@ -0,0 +1,626 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from pylox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Conditional,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from pylox.inliner import Bindings
+from pylox.stmt import (
+    Block,
+    Break,
+    Class,
+    Expression,
+    For,
+    Function,
+    If,
+    Import,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from pylox.token_type import TokenType
+
+# Held by a slot until the expression it is for has been evaluated.
+EMPTY: Any = object()
+
+# Smallest expression, in nodes, worth keeping the value of. Property reads
+# are always kept, since looking up a field costs more than a slot.
+MIN_REUSE_SIZE = 3
+
+
+class Slot:
+    """Where the value of an expression is kept to be reused, see Grouping.
+
+    The slot of a loop invariant is emptied on each run of its loop, and
+    filled the first time the expression is evaluated in that run. Any other
+    slot is filled by one evaluation and read by the ones that follow it.
+    """
+
+    __slots__ = ("value", "invariant")
+
+    def __init__(self, invariant: bool) -> None:
+        self.value: Any = EMPTY
+        self.invariant: bool = invariant
+
+
+def clearSlots(slots: List[Slot]) -> List[Any]:
+    """Empty the slots of a loop about to run, and return what they held: the
+    same loop may be running in a recursive call."""
+    saved = [slot.value for slot in slots]
+    for slot in slots:
+        slot.value = EMPTY
+
+    return saved
+
+
+def restoreSlots(slots: List[Slot], saved: List[Any]) -> None:
+    for slot, value in zip(slots, saved):
+        slot.value = value
+
+
+def optimize(statements: List[Stmt]) -> None:
+    """Reuse the values of loop invariants and common subexpressions in a
+    program, in place."""
+    program = Bindings()
+    program.analyze(statements)
+    LoopInvariants(program).rewriteStatements(statements)
+
+    plan = CommonSubexpressions()
+    plan.plan(statements)
+    Reuse(plan).rewriteStatements(statements)
+
+
+@dataclass
+class Pure:
+    """An expression without side effects: only operators, literals, `this`
+    and reads of variables and fields.
+
+    Expressions with the same `key` compute the same value as long as none of
+    the variables in `names` is assigned to or declared again, and none of
+    the fields in `fields` set.
+    """
+
+    key: Tuple[Any, ...]
+    names: set[str]
+    fields: set[str]
+    size: int
+
+
+def pure(expr: Optional[Expr]) -> Optional[Pure]:
+    match expr:
+        case Literal():
+            return Pure(("literal", type(expr.value), expr.value), set(), set(), 1)
+        case Variable():
+            name = expr.name.lexeme
+            return Pure(("variable", name), {name}, set(), 1)
+        case This():
+            return Pure(("this",), set(), set(), 1)
+        case Grouping() if expr.slot is None:
+            return pure(expr.expression)
+        case Unary():
+            return _compose(("unary", expr.operator.type), [expr.right])
+        case Binary():
+            return _compose(("binary", expr.operator.type), [expr.left, expr.right])
+        case Logical():
+            return _compose(("logical", expr.operator.type), [expr.left, expr.right])
+        case Conditional():
+            return _compose(("conditional",), [expr.condition, expr.left, expr.right])
+        case Get():
+            result = _compose(("get", expr.name.lexeme), [expr.object])
+            if result is not None:
+                result.fields.add(expr.name.lexeme)
+            return result
+
+    return None
+
+
+def _compose(key: Tuple[Any, ...], operands: List[Optional[Expr]]) -> Optional[Pure]:
+    result = Pure(key, set(), set(), 1)
+    for operand in operands:
+        part = pure(operand)
+        if part is None:
+            return None
+
+        result.key += (part.key,)
+        result.names |= part.names
+        result.fields |= part.fields
+        result.size += part.size
+
+    return result
+
+
+def _reusable(expr: Expr, value: Pure, operand: bool) -> bool:
+    """Whether reusing the value of `expr` is worth it and can't be noticed."""
+    if type(expr) is Get:
+        # A method is bound again on each read: only where the result is
+        # used as a number, string or condition is a bound method as good as
+        # another.
+        return operand
+
+    return type(expr) in (Binary, Unary) and value.size >= MIN_REUSE_SIZE
+
+
+class Rewriter(ExprVisitor[Expr], StmtVisitor[None]):
+    """Rewrite a program in place: each expression is replaced by what
+    `rewrite` returns for it, by default itself with its operands rewritten.
+
+    `operand` tells `rewrite` whether the value of the expression is only used
+    as a number, string or condition, so that two equal values can't be told
+    apart, as they can by `==`.
+    """
+
+    def rewrite(self, expr: Expr, operand: bool) -> Expr:
+        return expr.accept(self)
+
+    def rewriteStatements(self, statements: List[Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def visitBlockStmt(self, stmt: Block) -> None:
+        self.rewriteStatements(stmt.statements)
+
+    def visitBreakStmt(self, stmt: Break) -> None:
+        pass
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        for method in stmt.methods:
+            method.accept(self)
+
+    def visitExpressionStmt(self, stmt: Expression) -> None:
+        stmt.expression = self.rewrite(stmt.expression, False)
+
+    def visitForStmt(self, stmt: For) -> None:
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        stmt.condition = self._rewrite(stmt.condition, True)
+        stmt.increment = self._rewrite(stmt.increment)
+        stmt.body.accept(self)
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        self.rewriteStatements(stmt.body)
+
+    def visitIfStmt(self, stmt: If) -> None:
+        stmt.condition = self.rewrite(stmt.condition, True)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch.accept(self)
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        pass
+
+    def visitPrintStmt(self, stmt: Print) -> None:
+        stmt.expression = self.rewrite(stmt.expression, False)
+
+    def visitReturnStmt(self, stmt: Return) -> None:
+        stmt.value = self._rewrite(stmt.value)  # type: ignore
+
+    def visitVarStmt(self, stmt: Var) -> None:
+        stmt.initializer = self._rewrite(stmt.initializer)
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        stmt.condition = self.rewrite(stmt.condition, True)
+        stmt.body.accept(self)
+
+    def visitAssignExpr(self, expr: Assign) -> Expr:
+        expr.value = self.rewrite(expr.value, False)
+        return expr
+
+    def visitBinaryExpr(self, expr: Binary) -> Expr:
+        operand = expr.operator.type not in (
+            TokenType.BANG_EQUAL,
+            TokenType.EQUAL_EQUAL,
+        )
+        expr.left = self._rewrite(expr.left, operand)
+        expr.right = self._rewrite(expr.right, operand)
+        return expr
+
+    def visitCallExpr(self, expr: Call) -> Expr:
+        expr.callee = self._rewrite(expr.callee)
+        expr.arguments = [self.rewrite(argument, False) for argument in expr.arguments]
+        return expr
+
+    def visitConditionalExpr(self, expr: Conditional) -> Expr:
+        expr.condition = self._rewrite(expr.condition, True)
+        expr.left = self._rewrite(expr.left)
+        expr.right = self._rewrite(expr.right)
+        return expr
+
+    def visitGetExpr(self, expr: Get) -> Expr:
+        expr.object = self._rewrite(expr.object, True)
+        return expr
+
+    def visitGroupingExpr(self, expr: Grouping) -> Expr:
+        expr.expression = self._rewrite(expr.expression)
+        return expr
+
+    def visitLiteralExpr(self, expr: Literal) -> Expr:
+        return expr
+
+    def visitLogicalExpr(self, expr: Logical) -> Expr:
+        expr.left = self.rewrite(expr.left, False)
+        expr.right = self.rewrite(expr.right, False)
+        return expr
+
+    def visitSetExpr(self, expr: Set) -> Expr:
+        expr.object = self._rewrite(expr.object, True)
+        expr.value = self._rewrite(expr.value)
+        return expr
+
+    def visitSuperExpr(self, expr: Super) -> Expr:
+        return expr
+
+    def visitThisExpr(self, expr: This) -> Expr:
+        return expr
+
+    def visitUnaryExpr(self, expr: Unary) -> Expr:
+        expr.right = self._rewrite(expr.right, True)
+        return expr
+
+    def visitVariableExpr(self, expr: Variable) -> Expr:
+        return expr
+
+    def _rewrite(self, expr: Optional[Expr], operand: bool = False) -> Optional[Expr]:
+        return self.rewrite(expr, operand) if expr is not None else None
+
+
+@dataclass
+class Loop:
+    effects: Bindings
+    slots: List[Slot]
+
+
+class LoopInvariants(Rewriter):
+    """Keep the value of pure expressions a loop evaluates again on each
+    iteration although it can't change while the loop runs.
+
+    An expression is invariant if the loop neither assigns to nor declares
+    the variables it reads, nor sets the fields it reads. If the loop calls
+    anything, the variables must also never be assigned to anywhere in the
+    program, and the expression can't read fields. Each invariant is
+    evaluated where it is the first time in a run of the loop, so errors are
+    reported at the same place, and its slot is reused afterwards. Only the
+    innermost loop around an expression is considered.
+    """
+
+    def __init__(self, program: Bindings) -> None:
+        self.program = program
+        self.loop: Optional[Loop] = None
+
+    def rewrite(self, expr: Expr, operand: bool) -> Expr:
+        loop = self.loop
+        if loop is not None:
+            value = pure(expr)
+            if (
+                value is not None
+                and _reusable(expr, value, operand)
+                and self._isInvariant(value, loop.effects)
+            ):
+                slot = Slot(invariant=True)
+                loop.slots.append(slot)
+                return Grouping(expr, slot)
+
+        return expr.accept(self)
+
+    def visitForStmt(self, stmt: For) -> None:
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        enclosing = self._enterLoop(stmt, stmt.invariants)
+        try:
+            stmt.condition = self._rewrite(stmt.condition, True)
+            stmt.increment = self._rewrite(stmt.increment)
+            stmt.body.accept(self)
+        finally:
+            self.loop = enclosing
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        # The body runs when the function is called, not as part of the loop.
+        enclosing = self.loop
+        self.loop = None
+        try:
+            self.rewriteStatements(stmt.body)
+        finally:
+            self.loop = enclosing
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        enclosing = self._enterLoop(stmt, stmt.invariants)
+        try:
+            stmt.condition = self.rewrite(stmt.condition, True)
+            stmt.body.accept(self)
+        finally:
+            self.loop = enclosing
+
+    def _enterLoop(self, stmt: Stmt, slots: List[Slot]) -> Optional[Loop]:
+        """Make `stmt` the innermost loop, and return the enclosing one."""
+        effects = Bindings()
+        stmt.accept(effects)
+
+        enclosing = self.loop
+        self.loop = Loop(effects, slots)
+        return enclosing
+
+    def _isInvariant(self, value: Pure, effects: Bindings) -> bool:
+        if not effects.complete:
+            return False
+        if value.names & (effects.assigned | effects.declared):
+            return False
+        if value.fields & effects.fields:
+            return False
+
+        if effects.calls:
+            # The functions called may assign to any variable they see and
+            # set any field.
+            if not self.program.complete or value.fields:
+                return False
+            if value.names & self.program.assigned:
+                return False
+
+        return True
+
+
+@dataclass(eq=False)
+class Available:
+    """A value computed earlier in a block, and kept in `slot` by `store`
+    if `used` by a later evaluation."""
+
+    value: Pure
+    store: Expr
+    slot: Slot
+    used: bool = False
+
+
+class CommonSubexpressions(ExprVisitor[None], StmtVisitor[None]):
+    """Find pure expressions evaluated again while the value of an earlier
+    evaluation is still valid.
+
+    Statements are followed in the order they run, with the values computed
+    so far available to the rest of the block, including nested blocks and
+    loops that don't invalidate them. A value is only available after an
+    evaluation that always happens: not one in a branch of `and`, `or` or
+    `?:`. Assigning to or declaring a variable invalidates the values that
+    read it, and setting a field those that read a field of that name. Any
+    call invalidates everything, since it may change anything and run the
+    same code again. Function bodies start with nothing available.
+    """
+
+    def __init__(self) -> None:
+        self.available: Dict[Tuple[Any, ...], Available] = {}
+        self.conditional: bool = False
+        self.entries: List[Available] = []
+
+        # Slots to store into and load from, by id of the expression.
+        self.stores: Dict[int, Slot] = {}
+        self.loads: Dict[int, Slot] = {}
+
+    def plan(self, statements: List[Stmt]) -> None:
+        self._planBlock(statements, {})
+        self.stores = {
+            id(entry.store): entry.slot for entry in self.entries if entry.used
+        }
+
+    def visitBlockStmt(self, stmt: Block) -> None:
+        self._planBlock(stmt.statements, dict(self.available))
+        self._invalidate(stmt)
+
+    def visitBreakStmt(self, stmt: Break) -> None:
+        pass
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        self._assign(stmt.name.lexeme)
+        for method in stmt.methods:
+            self._planBlock(method.body, {})
+
+    def visitExpressionStmt(self, stmt: Expression) -> None:
+        self._plan(stmt.expression)
+
+    def visitForStmt(self, stmt: For) -> None:
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        # What is available on entry is left by the previous iteration too.
+        self._invalidate(stmt)
+        enclosing = self.available
+        self.available = dict(enclosing)
+        try:
+            self._plan(stmt.condition, True)
+            stmt.body.accept(self)
+            self._plan(stmt.increment)
+        finally:
+            self.available = enclosing
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        self._assign(stmt.name.lexeme)
+        self._planBlock(stmt.body, {})
+
+    def visitIfStmt(self, stmt: If) -> None:
+        self._plan(stmt.condition, True)
+
+        enclosing = self.available
+        try:
+            self.available = dict(enclosing)
+            stmt.thenBranch.accept(self)
+            if stmt.elseBranch is not None:
+                self.available = dict(enclosing)
+                stmt.elseBranch.accept(self)
+        finally:
+            self.available = enclosing
+
+        self._invalidate(stmt)
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        self.available.clear()
+
+    def visitPrintStmt(self, stmt: Print) -> None:
+        self._plan(stmt.expression)
+
+    def visitReturnStmt(self, stmt: Return) -> None:
+        self._plan(stmt.value)
+
+    def visitVarStmt(self, stmt: Var) -> None:
+        self._plan(stmt.initializer)
+        self._assign(stmt.name.lexeme)
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        self._invalidate(stmt)
+        enclosing = self.available
+        self.available = dict(enclosing)
+        try:
+            self._plan(stmt.condition, True)
+            stmt.body.accept(self)
+        finally:
+            self.available = enclosing
+
+    def visitAssignExpr(self, expr: Assign) -> None:
+        self._plan(expr.value)
+        self._assign(expr.name.lexeme)
+
+    def visitBinaryExpr(self, expr: Binary) -> None:
+        operand = expr.operator.type not in (
+            TokenType.BANG_EQUAL,
+            TokenType.EQUAL_EQUAL,
+        )
+        self._plan(expr.left, operand)
+        self._plan(expr.right, operand)
+
+    def visitCallExpr(self, expr: Call) -> None:
+        self._plan(expr.callee)
+        for argument in expr.arguments:
+            self._plan(argument)
+
+        self.available.clear()
+
+    def visitConditionalExpr(self, expr: Conditional) -> None:
+        self._plan(expr.condition, True)
+        self._planBranch(expr.left)
+        self._planBranch(expr.right)
+
+    def visitGetExpr(self, expr: Get) -> None:
+        self._plan(expr.object, True)
+
+    def visitGroupingExpr(self, expr: Grouping) -> None:
+        # The value of a loop invariant may come from an earlier iteration:
+        # nothing in it is evaluated every time.
+        if expr.slot is None:
+            self._plan(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> None:
+        pass
+
+    def visitLogicalExpr(self, expr: Logical) -> None:
+        self._plan(expr.left)
+        self._planBranch(expr.right)
+
+    def visitSetExpr(self, expr: Set) -> None:
+        self._plan(expr.object, True)
+        self._plan(expr.value)
+
+        name = expr.name.lexeme
+        self._forget(lambda value: name in value.fields)
+
+    def visitSuperExpr(self, expr: Super) -> None:
+        pass
+
+    def visitThisExpr(self, expr: This) -> None:
+        pass
+
+    def visitUnaryExpr(self, expr: Unary) -> None:
+        self._plan(expr.right, True)
+
+    def visitVariableExpr(self, expr: Variable) -> None:
+        pass
+
+    def _planBlock(
+        self, statements: List[Stmt], available: Dict[Tuple[Any, ...], Available]
+    ) -> None:
+        enclosing = self.available
+        self.available = available
+        try:
+            for statement in statements:
+                statement.accept(self)
+        finally:
+            self.available = enclosing
+
+    def _plan(self, expr: Optional[Expr], operand: bool = False) -> None:
+        if expr is None:
+            return
+
+        value = pure(expr)
+        if value is not None and _reusable(expr, value, operand):
+            entry = self.available.get(value.key)
+            if entry is not None:
+                entry.used = True
+                self.loads[id(expr)] = entry.slot
+                return
+
+        expr.accept(self)
+
+        if value is not None and not self.conditional and _reusable(expr, value, True):
+            entry = Available(value, expr, Slot(invariant=False))
+            self.available[value.key] = entry
+            self.entries.append(entry)
+
+    def _planBranch(self, expr: Optional[Expr]) -> None:
+        conditional = self.conditional
+        self.conditional = True
+        try:
+            self._plan(expr)
+        finally:
+            self.conditional = conditional
+
+    def _assign(self, name: str) -> None:
+        self._forget(lambda value: name in value.names)
+
+    def _invalidate(self, stmt: Stmt) -> None:
+        """Forget the values `stmt` may change."""
+        effects = Bindings()
+        stmt.accept(effects)
+        if effects.calls or not effects.complete:
+            self.available.clear()
+            return
+
+        names = effects.assigned | effects.declared
+        self._forget(
+            lambda value: bool(value.names & names or value.fields & effects.fields)
+        )
+
+    def _forget(self, changed: Any) -> None:
+        for key, entry in list(self.available.items()):
+            if changed(entry.value):
+                del self.available[key]
+
+
+class Reuse(Rewriter):
+    """Have the expressions found by CommonSubexpressions keep their value or
+    take it from an earlier evaluation."""
+
+    def __init__(self, plan: CommonSubexpressions) -> None:
+        self.plan = plan
+
+    def rewrite(self, expr: Expr, operand: bool) -> Expr:
+        slot = self.plan.loads.get(id(expr))
+        if slot is not None:
+            return Grouping(expr, slot, load=True)
+
+        slot = self.plan.stores.get(id(expr))
+        expr = expr.accept(self)
+        if slot is not None:
+            return Grouping(expr, slot)
+
+        return expr
@@ -0,0 +1,337 @@
+import contextlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pylox.callable import LoxCallable
+from pylox.capture import CaptureAnalyzer
+from pylox.environment import Cell, Environment
+from pylox.error import LoxRuntimeError, NativeError
+from pylox.expr import Assign, Expr
+from pylox.function import LoxFunction
+from pylox.interpreter import Interpreter
+from pylox.lox_list import LoxList
+from pylox.native import allocate, builtinNatives, checkFunction, nativeKey
+from pylox.parser import ParseError, parseBody
+from pylox.stmt import Function, Stmt
+from pylox.token import Token
+
+# Values that are copied to and from worker processes as they are.
+PLAIN_TYPES = (float, str, bool, type(None))
+
+
+@dataclass(frozen=True)
+class FunctionRef:
+    """A captured Lox function, by index in the shipment."""
+
+    index: int
+
+
+@dataclass(frozen=True)
+class NativeRef:
+    """A captured native function, by its name in the globals."""
+
+    name: str
+
+
+@dataclass
+class ShippedFunction:
+    """A Lox function as sent to a worker process: a copy of its declaration
+    without the annotations left by running it, and the values of its free
+    variables at the time of the call."""
+
+    declaration: Function
+    captures: Dict[str, float | str | bool | None | FunctionRef | NativeRef]
+
+
+# What a worker returns for a chunk: the results, the output printed, and the
+# runtime error that stopped it, if any, as a token and a message, or just a
+# message to report at the call of parallelMap.
+ChunkResult = Tuple[List[Any], str, Optional[Tuple[Optional[Token], str]]]
+
+
+class ParallelMapNative(LoxCallable):
+    """`parallelMap(function, list)`: a list of the results of calling the
+    function with each element, computed on `interpreter.map_jobs` processes."""
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        function, values = arguments
+        checkFunction(function, 1)
+        if not isinstance(values, LoxList):
+            raise NativeError("Expected a list.")
+        for value in values.values:
+            _checkPlain(value, "Can only pass numbers, strings, booleans and nil.")
+
+        # Checked even when running in this process, so that a script that
+        # works with one job works with any number.
+        shipment = Shipment(interpreter)
+        shipment.pack(function)
+
+        jobs = interpreter.map_jobs
+        if interpreter.budget is not None or jobs <= 1 or len(values.values) < 2:
+            results = []
+            for value in values.values:
+                result = function.call(interpreter, [value])
+                _checkResult(result)
+                results.append(result)
+        else:
+            results = _mapParallel(
+                shipment.functions, list(values.values), jobs, interpreter.directory
+            )
+
+        allocate(interpreter, len(results) + 1)
+        mapped = LoxList()
+        mapped.values = results
+        return mapped
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+class Shipment:
+    """The Lox functions to send to a worker to call one function there.
+
+    A function can be shipped if it doesn't declare classes, import modules or
+    use `this`, and doesn't assign to its free variables, whose new values
+    would stay in the worker. The values of its free variables must be plain
+    values, native functions or Lox functions that can be shipped in turn:
+    lists, maps, arrays, instances and files are shared with the script, and
+    a worker could only change a copy.
+    """
+
+    def __init__(self, interpreter: Interpreter) -> None:
+        self.interpreter = interpreter
+        self.functions: List[ShippedFunction] = []
+        self.indices: Dict[int, int] = {}
+
+    def pack(self, function: Any) -> FunctionRef:
+        """Add a Lox function and the functions it captures, and return its
+        reference; the first function packed is the one workers call."""
+        if not isinstance(function, LoxFunction):
+            raise NativeError("Can only run Lox functions in parallel.")
+        if function.instance is not None or function.is_initializer:
+            raise NativeError(f"Can't run {function} in parallel: it is a method.")
+
+        index = self.indices.get(id(function))
+        if index is not None:
+            return FunctionRef(index)
+
+        _parseBodies(function.declaration)
+
+        captures = AssignedCaptures()
+        names = captures.analyze(function.declaration)
+        if not names.flat:
+            raise NativeError(
+                f"Can't run {function} in parallel: it uses classes, modules or 'this'."
+            )
+        if captures.assigned:
+            name = next(iter(captures.assigned))
+            raise NativeError(
+                f"Can't run {function} in parallel: it assigns to '{name}', "
+                "which it doesn't declare."
+            )
+
+        # Registered before its captures, which may refer back to it.
+        index = len(self.functions)
+        self.indices[id(function)] = index
+        shipped = ShippedFunction(_strip(function.declaration), {})
+        self.functions.append(shipped)
+
+        for name in names.names:
+            found, value = _lookup(function.closure, name)
+            if found:
+                shipped.captures[name] = self._value(function, name, value)
+
+        return FunctionRef(index)
+
+    def _value(self, function: LoxFunction, name: str, value: Any) -> Any:
+        if isinstance(value, PLAIN_TYPES):
+            return value
+        if isinstance(value, LoxFunction):
+            return self.pack(value)
+
+        native = builtinNatives().get(nativeKey(value))
+        if native is not None and self.interpreter.globals.values.get(native) is value:
+            return NativeRef(native)
+
+        raise NativeError(
+            f"Can't run {function} in parallel: '{name}' holds state shared with "
+            "the script."
+        )
+
+
+class AssignedCaptures(CaptureAnalyzer):
+    """Also find the free variables a function body assigns to."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.assigned: set[str] = set()
+
+    def visitAssignExpr(self, expr: Assign) -> None:
+        super().visitAssignExpr(expr)
+        name = expr.name.lexeme
+        if not any(name in scope for scope in self.scopes):
+            self.assigned.add(name)
+
+
+def _mapParallel(
+    functions: List[ShippedFunction], values: List[Any], jobs: int, directory: Path
+) -> List[Any]:
+    # A few chunks per worker, so that uneven chunks still balance out.
+    size = -(-len(values) // (jobs * 4))
+    chunks = [values[i : i + size] for i in range(0, len(values), size)]
+
+    try:
+        futures = [
+            _executor(jobs).submit(_mapChunk, functions, chunk, directory)
+            for chunk in chunks
+        ]
+        done = [future.result() for future in futures]
+    except BrokenProcessPool:
+        raise NativeError("A parallelMap worker process died.") from None
+
+    # Output and errors as if the chunks had run one after the other here.
+    results: List[Any] = []
+    for chunkResults, output, error in done:
+        print(output, end="")
+        results.extend(chunkResults)
+        if error is not None:
+            token, message = error
+            if token is None:
+                raise NativeError(message)
+            raise LoxRuntimeError(token, message)
+
+    return results
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_jobs: int = 0
+
+
+def _executor(jobs: int) -> ProcessPoolExecutor:
+    """A pool of `jobs` processes, kept for later calls."""
+    global _pool, _pool_jobs
+
+    if _pool is None or _pool_jobs != jobs:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(max_workers=jobs)
+        _pool_jobs = jobs
+
+    return _pool
+
+
+# The interpreter of a worker process, which runs every chunk sent to it.
+_worker: Optional[Interpreter] = None
+
+
+def _mapChunk(
+    functions: List[ShippedFunction], values: List[Any], directory: Path
+) -> ChunkResult:
+    """Call the first function with each value, in a worker process."""
+    global _worker
+
+    if _worker is None:
+        _worker = Interpreter()
+        # No processes of its own.
+        _worker.map_jobs = 1
+    _worker.directory = directory
+
+    function = _unpack(_worker, functions)
+    results: List[Any] = []
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            for value in values:
+                result = function.call(_worker, [value])
+                _checkResult(result)
+                results.append(result)
+        except LoxRuntimeError as e:
+            return results, output.getvalue(), (e.token, str(e.args[0]))
+        except NativeError as e:
+            return results, output.getvalue(), (None, str(e.args[0]))
+        except RecursionError:
+            return results, output.getvalue(), (None, "Stack overflow.")
+
+    return results, output.getvalue(), None
+
+
+def _unpack(interpreter: Interpreter, functions: List[ShippedFunction]) -> LoxFunction:
+    unpacked = [
+        LoxFunction(shipped.declaration, Environment(interpreter.globals))
+        for shipped in functions
+    ]
+
+    for shipped, function in zip(functions, unpacked):
+        for name, value in shipped.captures.items():
+            if isinstance(value, FunctionRef):
+                value = unpacked[value.index]
+            elif isinstance(value, NativeRef):
+                value = interpreter.globals.values[value.name]
+            function.closure.define(name, value)
+
+    return unpacked[0]
+
+
+def _checkPlain(value: Any, message: str) -> None:
+    if not isinstance(value, PLAIN_TYPES):
+        raise NativeError(message)
+
+
+def _checkResult(value: Any) -> None:
+    _checkPlain(
+        value,
+        "Functions run in parallel can only return numbers, strings, booleans and nil.",
+    )
+
+
+def _lookup(environment: Optional[Environment], name: str) -> Tuple[bool, Any]:
+    while environment is not None:
+        if name in environment.values:
+            value = environment.values[name]
+            return True, value.value if type(value) is Cell else value
+        environment = environment.enclosing
+
+    return False, None
+
+
+def _parseBodies(node: Any) -> None:
+    """Parse the bodies of the functions in a syntax tree that were not parsed
+    yet, since the copy sent to a worker is made of parsed nodes only."""
+    if isinstance(node, list):
+        for item in node:
+            _parseBodies(item)
+        return
+    if not isinstance(node, (Expr, Stmt)):
+        return
+
+    if isinstance(node, Function) and node.lazy is not None:
+        try:
+            parseBody(node)
+        except ParseError:
+            raise LoxRuntimeError(
+                node.name, f"Syntax error in body of '{node.name.lexeme}'."
+            ) from None
+
+    for f in fields(node):
+        if f.compare:
+            _parseBodies(getattr(node, f.name))
+
+
+def _strip(node: Any) -> Any:
+    """A copy of a syntax tree without its annotations, which may hold values
+    of this process."""
+    if isinstance(node, list):
+        return [_strip(item) for item in node]
+    if isinstance(node, (Expr, Stmt)):
+        return type(node)(
+            **{f.name: _strip(getattr(node, f.name)) for f in fields(node) if f.compare}
+        )
+
+    return node
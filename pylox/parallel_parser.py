@@ -0,0 +1,132 @@
+import gc
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from pylox.error import LoxError
+from pylox.parser import Parser
+from pylox.scanner import Scanner
+from pylox.stmt import Stmt
+
+# Below this many characters, starting worker processes costs more than it
+# saves.
+PARALLEL_MIN_SOURCE = 200_000
+
+# The lexemes that matter to find top-level declarations: strings and comments
+# (to skip them), brackets, semicolons and words, which may be keywords.
+BOUNDARY_LEXEMES = re.compile(
+    r'"[^"]*"|//[^\n]*|/\*.*?\*/|[{}();]|[^\W\d_][^\W\d]*', re.DOTALL
+)
+
+# Keywords that start a declaration, as in Parser._synchronise.
+DECLARATION_STARTS = {
+    "class",
+    "fun",
+    "import",
+    "var",
+    "for",
+    "if",
+    "while",
+    "print",
+    "return",
+}
+
+
+def parseParallel(
+    source: str, jobs: int, lazy: bool = False, strict: bool = False
+) -> List[Stmt]:
+    """Scan and parse a program in chunks of top-level declarations on `jobs`
+    processes.
+
+    If any chunk has an error, the whole program is scanned and parsed again
+    serially, so that errors are reported exactly as Scanner and Parser do.
+    """
+    boundaries = _declarationBoundaries(source) if jobs > 1 else []
+    if len(source) < PARALLEL_MIN_SOURCE or not boundaries:
+        return _parseSerially(source, lazy, strict)
+
+    # Cut the program into roughly equal chunks, a few per worker so that
+    # uneven chunks still balance out.
+    size = len(source) // (jobs * 4) + 1
+    chunks: List[str] = []
+    lines: List[int] = []
+    start = 0
+    line = 1
+    for boundary in boundaries + [len(source)]:
+        if boundary - start >= size or boundary == len(source):
+            chunks.append(source[start:boundary])
+            lines.append(line)
+            line += chunks[-1].count("\n")
+            start = boundary
+
+    # Unpickling the trees allocates a lot of objects that will all stay
+    # alive: don't let the garbage collector walk them over and over.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            count = len(chunks)
+            results = list(
+                executor.map(
+                    _parseChunk, chunks, lines, [lazy] * count, [strict] * count
+                )
+            )
+    finally:
+        if enabled:
+            gc.enable()
+
+    statements: List[Stmt] = []
+    for chunkStatements, failed in results:
+        if failed:
+            return _parseSerially(source, lazy, strict)
+        statements.extend(chunkStatements)
+
+    return statements
+
+
+def _parseSerially(source: str, lazy: bool, strict: bool) -> List[Stmt]:
+    tokens = Scanner(source).scan_tokens()
+    return Parser(tokens, lazy=lazy, strict=strict).parse()
+
+
+def _declarationBoundaries(source: str) -> List[int]:
+    """Offsets of the keywords starting a top-level declaration.
+
+    Only declarations that follow a completed one (ending with ';' or '}')
+    outside any braces or parentheses count.
+    """
+    boundaries: List[int] = []
+    depth = 0
+    previous = ""
+
+    for match in BOUNDARY_LEXEMES.finditer(source):
+        lexeme = match.group()
+        if lexeme in "{(":
+            depth += 1
+        elif lexeme in "})":
+            depth = max(depth - 1, 0)
+        elif lexeme[0] in '"/':
+            continue
+        elif depth == 0 and lexeme in DECLARATION_STARTS and previous in (";", "}"):
+            boundaries.append(match.start())
+
+        previous = lexeme
+
+    return boundaries
+
+
+def _ignoreError(line: int, where: str, message: str) -> None:
+    pass
+
+
+def _parseChunk(
+    source: str, line: int, lazy: bool, strict: bool
+) -> Tuple[List[Stmt], bool]:
+    """Scan and parse one chunk in a worker, telling whether it had an error."""
+    gc.disable()
+    LoxError.reporter = _ignoreError
+    LoxError.reset_error()
+
+    tokens = Scanner(source, line).scan_tokens()
+    statements = Parser(tokens, lazy=lazy, strict=strict).parse()
+    return statements, LoxError.had_error()
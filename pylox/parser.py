@@ -1,4 +1,6 @@
-from typing import List, Optional
+from dataclasses import dataclass
+from enum import IntEnum, auto
+from typing import Callable, Dict, List, Optional, Tuple
 
 from pylox.error import LoxError
 from pylox.expr import (
@@ -7,18 +9,25 @@ from pylox.expr import (
     Call,
     Conditional,
     Expr,
+    Get,
     Grouping,
     Literal,
     Logical,
+    Set,
+    Super,
+    This,
     Unary,
     Variable,
 )
 from pylox.stmt import (
     Block,
     Break,
+    Class,
     Expression,
+    For,
     Function,
     If,
+    Import,
     Print,
     Return,
     Stmt,
@@ -33,11 +42,56 @@ class ParseError(RuntimeError):
     pass
 
 
+class Precedence(IntEnum):
+    """Binding power of expression operators, from loosest to tightest."""
+
+    NONE = 0
+    COMMA = auto()
+    CONDITIONAL = auto()
+    ASSIGNMENT = auto()
+    OR = auto()
+    AND = auto()
+    EQUALITY = auto()
+    COMPARISON = auto()
+    TERM = auto()
+    FACTOR = auto()
+    UNARY = auto()
+    CALL = auto()
+
+
+class ClassKind(IntEnum):
+    NONE = auto()
+    CLASS = auto()
+    SUBCLASS = auto()
+
+
+@dataclass
+class LazyBody:
+    """Where to find a function body that has not been parsed yet."""
+
+    tokens: List[Token]
+    # Index of the first token after the body's opening brace.
+    start: int
+    loop_depth: int
+    class_kind: ClassKind
+    in_initializer: bool
+
+
 class Parser:
-    def __init__(self, tokens: List[Token]) -> None:
+    def __init__(
+        self, tokens: List[Token], lazy: bool = False, strict: bool = False
+    ) -> None:
         self.tokens: List[Token] = tokens
         self.current: int = 0
         self.loop_depth: int = 0
+        self.class_kind: ClassKind = ClassKind.NONE
+        self.in_initializer: bool = False
+
+        # Lazy mode only records the token range of function bodies, which
+        # are parsed on their first call. In strict mode bodies are still
+        # parsed upfront to report syntax errors, but their trees are dropped.
+        self.lazy: bool = lazy
+        self.strict: bool = strict
 
     def parse(self) -> List[Stmt]:
         statements: List[Stmt] = []
@@ -48,8 +102,12 @@ class Parser:
 
     def _declaration(self) -> Optional[Stmt]:
         try:
+            if self._match(TokenType.CLASS):
+                return self._classDeclaration()
             if self._match(TokenType.FUN):
                 return self._function("function")
+            if self._match(TokenType.IMPORT):
+                return self._importDeclaration()
             if self._match(TokenType.VAR):
                 return self._varDeclaration()
 
@@ -58,6 +116,37 @@ class Parser:
             self._synchronise()
             return None
 
+    def _classDeclaration(self) -> Stmt:
+        name = self._consume(TokenType.IDENTIFIER, "Expect class name.")
+
+        superclass: Optional[Variable] = None
+        if self._match(TokenType.LESS):
+            self._consume(TokenType.IDENTIFIER, "Expect superclass name.")
+            superclass = Variable(self._previous())
+
+            if superclass.name.lexeme == name.lexeme:
+                self._error(superclass.name, "A class can't inherit from itself.")
+
+        self._consume(TokenType.LEFT_BRACE, "Expect '{' before class body.")
+
+        enclosing = self.class_kind
+        self.class_kind = ClassKind.CLASS if superclass is None else ClassKind.SUBCLASS
+        try:
+            methods: List[Function] = []
+            while not self._check(TokenType.RIGHT_BRACE) and not self._isAtEnd():
+                methods.append(self._function("method"))
+        finally:
+            self.class_kind = enclosing
+
+        self._consume(TokenType.RIGHT_BRACE, "Expect '}' after class body.")
+        return Class(name, superclass, methods)
+
+    def _importDeclaration(self) -> Stmt:
+        keyword = self._previous()
+        path = self._consume(TokenType.STRING, "Expect module path after 'import'.")
+        self._consume(TokenType.SEMICOLON, "Expect ';' after module path.")
+        return Import(keyword, path)
+
     def _varDeclaration(self) -> Stmt:
         name: Token = self._consume(TokenType.IDENTIFIER, "Expect variable name.")
 
@@ -93,13 +182,15 @@ class Parser:
         return self._expressionStatement()
 
     def _breakStatement(self) -> Stmt:
+        keyword = self._previous()
         if self.loop_depth == 0:
-            self._error(self._previous(), "Must be inside a loop to use 'break'.")
+            self._error(keyword, "Must be inside a loop to use 'break'.")
 
         self._consume(TokenType.SEMICOLON, "Expect ';' after 'break'.")
-        return Break()
+        return Break(keyword)
 
     def _forStatement(self) -> Stmt:
+        keyword = self._previous()
         self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
 
         initializer: Optional[Stmt] = None
@@ -123,22 +214,13 @@ class Parser:
         try:
             self.loop_depth += 1
             body: Stmt = self._statement()
-
-            if increment is not None:
-                body = Block([body, Expression(increment)])
-
-            if condition is None:
-                condition = Literal(True)
-            body = While(condition, body)
-
-            if initializer is not None:
-                body = Block([initializer, body])
-
-            return body
         finally:
             self.loop_depth -= 1
 
+        return For(keyword, initializer, condition, increment, body)
+
     def _whileStatement(self) -> Stmt:
+        keyword = self._previous()
         self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
         condition: Expr = self._expression()
         self._consume(TokenType.RIGHT_PAREN, "Expect ')' after condition.")
@@ -149,9 +231,10 @@ class Parser:
         finally:
             self.loop_depth -= 1
 
-        return While(condition, body)
+        return While(keyword, condition, body)
 
     def _ifStatement(self):
+        keyword = self._previous()
         self._consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
         condition = self._expression()
         self._consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
@@ -161,18 +244,21 @@ class Parser:
         if self._match(TokenType.ELSE):
             elseBranch = self._statement()
 
-        return If(condition, thenBranch, elseBranch)
+        return If(keyword, condition, thenBranch, elseBranch)
 
     def _printStatement(self) -> Stmt:
+        keyword = self._previous()
         value = self._expression()
         self._consume(TokenType.SEMICOLON, "Expect ';' after value.")
-        return Print(value)  # type:ignore
+        return Print(keyword, value)  # type:ignore
 
     def _returnStatement(self) -> Stmt:
         keyword = self._previous()
         value: Expr = None
 
         if not self._check(TokenType.SEMICOLON):
+            if self.in_initializer:
+                self._error(keyword, "Can't return a value from an initializer.")
             value = self._expression()  # type:ignore
 
         self._consume(TokenType.SEMICOLON, "Expect ';' after return value.")
@@ -203,10 +289,44 @@ class Parser:
         self._consume(TokenType.RIGHT_PAREN, "Expect ')' after parameters.")
 
         self._consume(TokenType.LEFT_BRACE, f"Expect '{{' before {kind} body.")
-        body = self._block()
+
+        enclosing = self.in_initializer
+        self.in_initializer = kind == "method" and name.lexeme == "init"
+        try:
+            if self.lazy:
+                lazyBody = LazyBody(
+                    self.tokens,
+                    self.current,
+                    self.loop_depth,
+                    self.class_kind,
+                    self.in_initializer,
+                )
+                if self.strict or not self._skipBlock():
+                    self._block()
+
+                return Function(name, parameters, [], lazyBody)
+
+            body = self._block()
+        finally:
+            self.in_initializer = enclosing
 
         return Function(name, parameters, body)
 
+    def _skipBlock(self) -> bool:
+        """Move past the brace closing the current block, if there is one."""
+        depth = 1
+        for index in range(self.current, len(self.tokens)):
+            match self.tokens[index].type:
+                case TokenType.LEFT_BRACE:
+                    depth += 1
+                case TokenType.RIGHT_BRACE:
+                    depth -= 1
+                    if depth == 0:
+                        self.current = index + 1
+                        return True
+
+        return False
+
     def _block(self) -> List[Stmt]:
         statements: List[Stmt] = []
 
@@ -217,127 +337,128 @@ class Parser:
         return statements
 
     def _expression(self) -> Optional[Expr]:
-        return self._comma()
+        return self._parsePrecedence(Precedence.COMMA)
 
-    def _comma(self) -> Optional[Expr]:
-        expr = self._conditional()
-        while self._match(TokenType.COMMA):
-            operator = self._previous()
-            right = self._conditional()
-            expr = Binary(expr, operator, right)
+    def _parsePrecedence(self, precedence: int) -> Optional[Expr]:
+        token = self._peek()
+        rule = RULES.get(token.type)
+        if rule is None or rule.prefix is None:
+            raise self._error(token, "Expect expression.")
 
-        return expr
+        self._advance()
+        expr = rule.prefix(self)
 
-    def _conditional(self) -> Optional[Expr]:
-        expr = self._assignment()
-        if self._match(TokenType.QUESTION):
-            left = self._expression()
-            self._consume(
-                TokenType.COLON,
-                "Expect ':' after left-hand expression in ternary expression.",
-            )
-            right = self._conditional()
-            expr = Conditional(expr, left, right)
+        while True:
+            rule = RULES.get(self._peek().type)
+            if rule is None or rule.infix is None or rule.precedence < precedence:
+                return expr
 
-        return expr
+            self._advance()
+            expr = rule.infix(self, expr)
 
-    def _assignment(self) -> Optional[Expr]:
-        expr = self._or()
+    # Prefix rules
 
-        if self._match(TokenType.EQUAL):
-            equals: Token = self._previous()
-            value: Optional[Expr] = self._assignment()
-
-            if isinstance(expr, Variable):
-                name: Token = expr.name
-                return Assign(name, value)  # type:ignore
-
-            self._error(equals, "Invalid assignment target.")
-
-        return expr
-
-    def _or(self) -> Optional[Expr]:
-        expr = self._and()
-
-        while self._match(TokenType.OR):
-            operator: Token = self._previous()
-            right: Expr = self._and()  # type: ignore
-            expr = Logical(expr, operator, right)  # type: ignore
-
-        return expr
-
-    def _and(self) -> Optional[Expr]:
-        expr = self._equality()
-
-        while self._match(TokenType.AND):
-            operator: Token = self._previous()
-            right: Expr = self._equality()  # type: ignore
-            expr = Logical(expr, operator, right)  # type: ignore
-
-        return expr
-
-    def _equality(self) -> Optional[Expr]:
-        expr = self._comparison()
-        while self._match(
-            TokenType.BANG_EQUAL,
-            TokenType.EQUAL_EQUAL,
-        ):
-            operator = self._previous()
-            right = self._comparison()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def _comparison(self) -> Optional[Expr]:
-        expr = self._term()
-        while self._match(
-            TokenType.GREATER,
-            TokenType.GREATER_EQUAL,
-            TokenType.LESS,
-            TokenType.LESS_EQUAL,
-        ):
-            operator = self._previous()
-            right = self._term()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def _term(self) -> Optional[Expr]:
-        expr = self._factor()
-        while self._match(
-            TokenType.PLUS,
-            TokenType.MINUS,
-        ):
-            operator = self._previous()
-            right = self._factor()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def _factor(self) -> Optional[Expr]:
-        expr = self._unary()
-        while self._match(
-            TokenType.SLASH,
-            TokenType.STAR,
-        ):
-            operator = self._previous()
-            right = self._unary()
-            expr = Binary(expr, operator, right)
-
-        return expr
+    def _literal(self) -> Optional[Expr]:
+        token = self._previous()
+        match token.type:
+            case TokenType.FALSE:
+                return Literal(False)
+            case TokenType.TRUE:
+                return Literal(True)
+            case TokenType.NIL:
+                return Literal(None)
 
-    def _unary(self) -> Optional[Expr]:
-        if self._match(
-            TokenType.BANG,
-            TokenType.MINUS,
-        ):
-            operator = self._previous()
-            right = self._unary()
-            return Unary(operator, right)
+        return Literal(token.literal)
 
-        return self._call()
+    def _variable(self) -> Optional[Expr]:
+        return Variable(self._previous())
 
-    def _finishCall(self, callee: Expr) -> Expr:
+    def _grouping(self) -> Optional[Expr]:
+        expr = self._expression()
+        self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
+        return Grouping(expr)
+
+    def _this(self) -> Optional[Expr]:
+        keyword = self._previous()
+        if self.class_kind == ClassKind.NONE:
+            self._error(keyword, "Can't use 'this' outside of a class.")
+
+        return This(keyword)
+
+    def _super(self) -> Optional[Expr]:
+        keyword = self._previous()
+        if self.class_kind == ClassKind.NONE:
+            self._error(keyword, "Can't use 'super' outside of a class.")
+        elif self.class_kind == ClassKind.CLASS:
+            self._error(keyword, "Can't use 'super' in a class with no superclass.")
+
+        self._consume(TokenType.DOT, "Expect '.' after 'super'.")
+        method = self._consume(TokenType.IDENTIFIER, "Expect superclass method name.")
+        return Super(keyword, method)
+
+    def _unary(self) -> Optional[Expr]:
+        operator = self._previous()
+        right = self._parsePrecedence(Precedence.UNARY)
+        return Unary(operator, right)
+
+    # Error productions: a binary operator with no left-hand operand. The
+    # right-hand operand is still parsed so that parsing can carry on.
+
+    def _missingOperand(self) -> Optional[Expr]:
+        operator = self._previous()
+        self._error(operator, "Missing left-hand operand.")
+        self._parsePrecedence(MISSING_OPERAND_PRECEDENCES[operator.type])
+        return None
+
+    def _missingCondition(self) -> Optional[Expr]:
+        self._error(self._previous(), "Missing condition operand.")
+        self._finishConditional()
+        return None
+
+    # Infix rules
+
+    def _binary(self, left: Optional[Expr]) -> Optional[Expr]:
+        operator = self._previous()
+        right = self._parsePrecedence(RULES[operator.type].precedence + 1)
+        return Binary(left, operator, right)
+
+    def _logical(self, left: Optional[Expr]) -> Optional[Expr]:
+        operator = self._previous()
+        right = self._parsePrecedence(RULES[operator.type].precedence + 1)
+        return Logical(left, operator, right)  # type: ignore
+
+    def _conditional(self, condition: Optional[Expr]) -> Optional[Expr]:
+        left, right = self._finishConditional()
+        return Conditional(condition, left, right)
+
+    def _finishConditional(self) -> Tuple[Optional[Expr], Optional[Expr]]:
+        left = self._expression()
+        self._consume(
+            TokenType.COLON,
+            "Expect ':' after left-hand expression in ternary expression.",
+        )
+        right = self._parsePrecedence(Precedence.CONDITIONAL)
+        return left, right
+
+    def _assignment(self, target: Optional[Expr]) -> Optional[Expr]:
+        equals: Token = self._previous()
+        value: Optional[Expr] = self._parsePrecedence(Precedence.ASSIGNMENT)
+
+        if isinstance(target, Variable):
+            name: Token = target.name
+            return Assign(name, value)  # type:ignore
+
+        if isinstance(target, Get):
+            return Set(target.object, target.name, value)
+
+        self._error(equals, "Invalid assignment target.")
+        return target
+
+    def _dot(self, object: Optional[Expr]) -> Optional[Expr]:
+        name = self._consume(TokenType.IDENTIFIER, "Expect property name after '.'.")
+        return Get(object, name)
+
+    def _call(self, callee: Optional[Expr]) -> Optional[Expr]:
         arguments: List[Expr] = []
         if not self._check(TokenType.RIGHT_PAREN):
             hasMore = True
@@ -345,85 +466,14 @@ class Parser:
                 if len(arguments) >= 255:
                     self._error(self._peek(), "Cannot have more than 255 arguments.")
 
-                arguments.append(self._conditional())
+                argument = self._parsePrecedence(Precedence.CONDITIONAL)
+                arguments.append(argument)  # type: ignore
                 hasMore = self._match(TokenType.COMMA)
 
         paren = self._consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
 
         return Call(callee, paren, arguments)
 
-    def _call(self) -> Optional[Expr]:
-        expr = self._primary()
-        while True:
-            if self._match(TokenType.LEFT_PAREN):
-                expr = self._finishCall(expr)
-            else:
-                break
-        return expr
-
-    def _primary(self) -> Optional[Expr]:
-        if self._match(TokenType.FALSE):
-            return Literal(False)
-        if self._match(TokenType.TRUE):
-            return Literal(True)
-        if self._match(TokenType.NIL):
-            return Literal(None)
-
-        if self._match(TokenType.NUMBER, TokenType.STRING):
-            return Literal(self._previous().literal)
-
-        if self._match(TokenType.IDENTIFIER):
-            return Variable(self._previous())
-
-        if self._match(TokenType.LEFT_PAREN):
-            expr = self._expression()
-            self._consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
-            return Grouping(expr)
-
-        # Error production
-        if self._match(TokenType.COMMA):
-            self._error(self._previous(), "Missing left-hand operand.")
-            self._conditional()
-            return None
-
-        if self._match(TokenType.QUESTION):
-            self._error(self._previous(), "Missing condition operand.")
-            self._expression()
-            self._consume(
-                TokenType.COLON,
-                "Expect ':' after left-hand expression in ternary expression.",
-            )
-            self._conditional()
-
-            return None
-
-        if self._match(TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
-            self._error(self._previous(), "Missing left-hand operand.")
-            self._comparison()
-            return None
-
-        if self._match(
-            TokenType.GREATER,
-            TokenType.GREATER_EQUAL,
-            TokenType.LESS,
-            TokenType.LESS_EQUAL,
-        ):
-            self._error(self._previous(), "Missing left-hand operand.")
-            self._term()
-            return None
-
-        if self._match(TokenType.PLUS):
-            self._error(self._previous(), "Missing left-hand operand.")
-            self._factor()
-            return None
-
-        if self._match(TokenType.SLASH, TokenType.STAR):
-            self._error(self._previous(), "Missing left-hand operand.")
-            self._unary()
-            return None
-
-        raise self._error(self._peek(), "Expect expression.")
-
     # Helpers
 
     def _match(self, *types: TokenType) -> bool:
@@ -477,6 +527,7 @@ class Parser:
             if self._peek().type in [
                 TokenType.CLASS,
                 TokenType.FUN,
+                TokenType.IMPORT,
                 TokenType.VAR,
                 TokenType.FOR,
                 TokenType.IF,
@@ -487,3 +538,102 @@ class Parser:
                 return
 
             self._advance()
+
+
+def parseBody(function: Function) -> List[Stmt]:
+    """Return the body of a function, parsing it first if it was parsed lazily.
+
+    Raises ParseError, after reporting it, if the body has a syntax error.
+    """
+    lazyBody = function.lazy
+    if lazyBody is None:
+        return function.body
+
+    parser = Parser(lazyBody.tokens, lazy=True)
+    parser.current = lazyBody.start
+    parser.loop_depth = lazyBody.loop_depth
+    parser.class_kind = lazyBody.class_kind
+    parser.in_initializer = lazyBody.in_initializer
+
+    had_error = LoxError.had_error()
+    body = parser._block()
+    if LoxError.had_error() and not had_error:
+        raise ParseError()
+
+    function.body = body
+    function.lazy = None
+    return body
+
+
+@dataclass(frozen=True)
+class ParseRule:
+    prefix: Optional[Callable[[Parser], Optional[Expr]]]
+    infix: Optional[Callable[[Parser, Optional[Expr]], Optional[Expr]]]
+    precedence: Precedence
+
+
+# Expression parsing table: how each token starts an expression (prefix) and
+# how it continues one (infix), with the precedence of its infix form.
+RULES: Dict[TokenType, ParseRule] = {
+    TokenType.LEFT_PAREN: ParseRule(Parser._grouping, Parser._call, Precedence.CALL),
+    TokenType.DOT: ParseRule(None, Parser._dot, Precedence.CALL),
+    TokenType.COMMA: ParseRule(
+        Parser._missingOperand, Parser._binary, Precedence.COMMA
+    ),
+    TokenType.QUESTION: ParseRule(
+        Parser._missingCondition, Parser._conditional, Precedence.CONDITIONAL
+    ),
+    TokenType.EQUAL: ParseRule(None, Parser._assignment, Precedence.ASSIGNMENT),
+    TokenType.OR: ParseRule(None, Parser._logical, Precedence.OR),
+    TokenType.AND: ParseRule(None, Parser._logical, Precedence.AND),
+    TokenType.BANG_EQUAL: ParseRule(
+        Parser._missingOperand, Parser._binary, Precedence.EQUALITY
+    ),
+    TokenType.EQUAL_EQUAL: ParseRule(
+        Parser._missingOperand, Parser._binary, Precedence.EQUALITY
+    ),
+    TokenType.GREATER: ParseRule(
+        Parser._missingOperand, Parser._binary, Precedence.COMPARISON
+    ),
+    TokenType.GREATER_EQUAL: ParseRule(
+        Parser._missingOperand, Parser._binary, Precedence.COMPARISON
+    ),
+    TokenType.LESS: ParseRule(
+        Parser._missingOperand, Parser._binary, Precedence.COMPARISON
+    ),
+    TokenType.LESS_EQUAL: ParseRule(
+        Parser._missingOperand, Parser._binary, Precedence.COMPARISON
+    ),
+    TokenType.MINUS: ParseRule(Parser._unary, Parser._binary, Precedence.TERM),
+    TokenType.PLUS: ParseRule(Parser._missingOperand, Parser._binary, Precedence.TERM),
+    TokenType.SLASH: ParseRule(
+        Parser._missingOperand, Parser._binary, Precedence.FACTOR
+    ),
+    TokenType.STAR: ParseRule(
+        Parser._missingOperand, Parser._binary, Precedence.FACTOR
+    ),
+    TokenType.BANG: ParseRule(Parser._unary, None, Precedence.NONE),
+    TokenType.IDENTIFIER: ParseRule(Parser._variable, None, Precedence.NONE),
+    TokenType.STRING: ParseRule(Parser._literal, None, Precedence.NONE),
+    TokenType.NUMBER: ParseRule(Parser._literal, None, Precedence.NONE),
+    TokenType.FALSE: ParseRule(Parser._literal, None, Precedence.NONE),
+    TokenType.NIL: ParseRule(Parser._literal, None, Precedence.NONE),
+    TokenType.SUPER: ParseRule(Parser._super, None, Precedence.NONE),
+    TokenType.THIS: ParseRule(Parser._this, None, Precedence.NONE),
+    TokenType.TRUE: ParseRule(Parser._literal, None, Precedence.NONE),
+}
+
+# Where parsing resumes after a binary operator with a missing left operand:
+# the level just above that operator's, so the right operand is consumed.
+MISSING_OPERAND_PRECEDENCES: Dict[TokenType, Precedence] = {
+    TokenType.COMMA: Precedence.CONDITIONAL,
+    TokenType.BANG_EQUAL: Precedence.COMPARISON,
+    TokenType.EQUAL_EQUAL: Precedence.COMPARISON,
+    TokenType.GREATER: Precedence.TERM,
+    TokenType.GREATER_EQUAL: Precedence.TERM,
+    TokenType.LESS: Precedence.TERM,
+    TokenType.LESS_EQUAL: Precedence.TERM,
+    TokenType.PLUS: Precedence.FACTOR,
+    TokenType.SLASH: Precedence.UNARY,
+    TokenType.STAR: Precedence.UNARY,
+}
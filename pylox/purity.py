@@ -0,0 +1,197 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from pylox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Conditional,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from pylox.stmt import (
+    Block,
+    Break,
+    Class,
+    Expression,
+    For,
+    Function,
+    If,
+    Import,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from pylox.token import Token
+
+
+@dataclass
+class Purity:
+    """Result of analysing a function body on its own.
+
+    `pure` only covers the body itself: the function is pure if, in addition,
+    every name in `callees` resolves to a pure callable when it is called.
+    """
+
+    pure: bool
+    callees: List[Token] = field(default_factory=list)
+
+
+class PurityAnalyzer(ExprVisitor[None], StmtVisitor[None]):
+    """Decide whether a function body is free of observable side effects.
+
+    A body is impure if it prints, assigns to a variable it did not declare,
+    reads a captured variable, uses an instance, declares a nested function or
+    class or calls anything other than a free variable (those are recorded as
+    callees and checked when the function is called).
+    """
+
+    def __init__(self) -> None:
+        self.scopes: List[set[str]] = []
+        self.callees: List[Token] = []
+        self.pure: bool = True
+
+    def analyze(self, function: Function) -> Purity:
+        """Analyse a function whose body has been parsed."""
+        self.scopes = [{p.lexeme for p in function.params}]
+        self.callees = []
+        self.pure = True
+
+        self._analyzeStatements(function.body)
+
+        return Purity(self.pure, self.callees if self.pure else [])
+
+    def visitBlockStmt(self, stmt: Block) -> None:
+        self.scopes.append(set())
+        try:
+            self._analyzeStatements(stmt.statements)
+        finally:
+            self.scopes.pop()
+
+    def visitBreakStmt(self, stmt: Break) -> None:
+        pass
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        self.pure = False
+
+    def visitExpressionStmt(self, stmt: Expression) -> None:
+        self._analyzeExpr(stmt.expression)
+
+    def visitForStmt(self, stmt: For) -> None:
+        self.scopes.append(set())
+        try:
+            if stmt.initializer is not None:
+                stmt.initializer.accept(self)
+            self._analyzeExpr(stmt.condition)
+            self._analyzeExpr(stmt.increment)
+            stmt.body.accept(self)
+        finally:
+            self.scopes.pop()
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        # A fresh closure is a new object on every call: caching it would
+        # share its captured state between callers.
+        self.pure = False
+
+    def visitIfStmt(self, stmt: If) -> None:
+        self._analyzeExpr(stmt.condition)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch is not None:
+            stmt.elseBranch.accept(self)
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        self.pure = False
+
+    def visitPrintStmt(self, stmt: Print) -> None:
+        self.pure = False
+
+    def visitReturnStmt(self, stmt: Return) -> None:
+        self._analyzeExpr(stmt.value)
+
+    def visitVarStmt(self, stmt: Var) -> None:
+        self._analyzeExpr(stmt.initializer)
+        self.scopes[-1].add(stmt.name.lexeme)
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        self._analyzeExpr(stmt.condition)
+        stmt.body.accept(self)
+
+    def visitAssignExpr(self, expr: Assign) -> None:
+        self._analyzeExpr(expr.value)
+        if not self._isLocal(expr.name):
+            self.pure = False
+
+    def visitBinaryExpr(self, expr: Binary) -> None:
+        self._analyzeExpr(expr.left)
+        self._analyzeExpr(expr.right)
+
+    def visitCallExpr(self, expr: Call) -> None:
+        callee = expr.callee
+        if isinstance(callee, Variable) and not self._isLocal(callee.name):
+            self.callees.append(callee.name)
+        else:
+            self.pure = False
+
+        for argument in expr.arguments:
+            self._analyzeExpr(argument)
+
+    def visitConditionalExpr(self, expr: Conditional) -> None:
+        self._analyzeExpr(expr.condition)
+        self._analyzeExpr(expr.left)
+        self._analyzeExpr(expr.right)
+
+    def visitGetExpr(self, expr: Get) -> None:
+        # Fields are mutable state shared with every holder of the instance.
+        self.pure = False
+
+    def visitGroupingExpr(self, expr: Grouping) -> None:
+        self._analyzeExpr(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> None:
+        pass
+
+    def visitLogicalExpr(self, expr: Logical) -> None:
+        self._analyzeExpr(expr.left)
+        self._analyzeExpr(expr.right)
+
+    def visitSetExpr(self, expr: Set) -> None:
+        self.pure = False
+
+    def visitSuperExpr(self, expr: Super) -> None:
+        self.pure = False
+
+    def visitThisExpr(self, expr: This) -> None:
+        self.pure = False
+
+    def visitUnaryExpr(self, expr: Unary) -> None:
+        self._analyzeExpr(expr.right)
+
+    def visitVariableExpr(self, expr: Variable) -> None:
+        # Captured variables may change between calls.
+        if not self._isLocal(expr.name):
+            self.pure = False
+
+    def _analyzeStatements(self, statements: List[Stmt]) -> None:
+        for statement in statements:
+            if not self.pure:
+                return
+            statement.accept(self)
+
+    def _analyzeExpr(self, expr: Optional[Expr]) -> None:
+        if expr is not None and self.pure:
+            expr.accept(self)
+
+    def _isLocal(self, name: Token) -> bool:
+        return any(name.lexeme in scope for scope in self.scopes)
@@ -13,6 +13,7 @@ KEYWORDS_MAP = {
     "for": TokenType.FOR,
     "fun": TokenType.FUN,
     "if": TokenType.IF,
+    "import": TokenType.IMPORT,
     "nil": TokenType.NIL,
     "or": TokenType.OR,
     "print": TokenType.PRINT,
@@ -26,12 +27,12 @@ KEYWORDS_MAP = {
 
 
 class Scanner:
-    def __init__(self, source: str) -> None:
+    def __init__(self, source: str, line: int = 1) -> None:
         self.source: str = source
         self.tokens: List[Token] = []
         self.start: int = 0
         self.current: int = 0
-        self.line: int = 1
+        self.line: int = line
 
     def scan_tokens(self) -> List[Token]:
         while not self._is_at_end():
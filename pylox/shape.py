@@ -0,0 +1,27 @@
+from typing import Dict, Optional
+
+
+class Shape:
+    """The layout shared by instances that got the same fields in the same
+    order: where each field lives in their list of values.
+
+    Every class has its own empty shape, so a shape also identifies the class
+    of its instances and what a property name resolves to on them.
+    """
+
+    __slots__ = ("slots", "transitions")
+
+    def __init__(self, slots: Optional[Dict[str, int]] = None) -> None:
+        self.slots: Dict[str, int] = slots if slots is not None else {}
+        self.transitions: Dict[str, Shape] = {}
+
+    def withField(self, name: str) -> "Shape":
+        """The shape instances of this shape take when `name` is added."""
+        shape = self.transitions.get(name)
+        if shape is None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = Shape(slots)
+            self.transitions[name] = shape
+
+        return shape
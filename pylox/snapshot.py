@@ -0,0 +1,301 @@
+import gc
+import hashlib
+import io
+import os
+import pickle
+import struct
+import zlib
+from array import array
+from dataclasses import fields
+from functools import cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pylox.callable import LoxCallable
+from pylox.environment import Cell, Environment
+from pylox.error import NativeError
+from pylox.expr import Expr
+from pylox.function import LoxFunction
+from pylox.interpreter import Interpreter
+from pylox.lox_array import LoxArray
+from pylox.lox_class import LoxClass
+from pylox.lox_file import LoxFile
+from pylox.lox_instance import LoxInstance
+from pylox.lox_list import LoxList
+from pylox.lox_map import LoxMap
+from pylox.module import Module, ModuleExport
+from pylox.native import NativeMethod, builtinNatives, nativeKey
+from pylox.shape import Shape
+from pylox.stmt import Function, Stmt
+from pylox.token import Token
+from pylox.token_type import TokenType
+
+# Start of a snapshot file, changed whenever the format or the classes it
+# stores change.
+MAGIC = b"LOXSNAP1"
+
+# Then the SHA-256 of the script and the index of the top-level statement to
+# resume at, before the compressed globals.
+HEADER = struct.Struct("<32sQ")
+
+# Fields of syntax nodes kept in a snapshot besides those that define them:
+# a function body that was not parsed yet is still needed.
+KEPT_ANNOTATIONS = {(Function, "lazy")}
+
+# The classes a snapshot may create, besides syntax nodes. Loading anything
+# else is refused: a snapshot file could otherwise run arbitrary code.
+STORED_CLASSES = (
+    Cell,
+    Environment,
+    LoxArray,
+    LoxClass,
+    LoxFunction,
+    LoxInstance,
+    LoxList,
+    LoxMap,
+    NativeMethod,
+    Shape,
+    Token,
+    TokenType,
+)
+
+
+class SnapshotError(Exception):
+    """A snapshot file of the script that can't be loaded."""
+
+
+class Snapshot:
+    """The globals of a script saved to `path` after its setup code, and the
+    top-level statement to resume at.
+
+    A snapshot only applies to the script it was taken from, as identified by
+    the hash of its source: any other script ignores it, and replaces it when
+    it calls snapshot().
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.digest: bytes = b""
+
+        # Index in the whole script of the first statement run, when resumed.
+        self.start: int = 0
+
+    def resume(
+        self, interpreter: Interpreter, source: str, statements: List[Stmt]
+    ) -> List[Stmt]:
+        """Restore the globals from the snapshot, if it was taken from this
+        source, and return the statements left to run."""
+        self.digest = hashlib.sha256(source.encode()).digest()
+
+        try:
+            with open(self.path, "rb") as file:
+                if file.read(len(MAGIC)) != MAGIC:
+                    return statements
+                digest, position = HEADER.unpack(file.read(HEADER.size))
+                if digest != self.digest:
+                    return statements
+                data = zlib.decompress(file.read())
+        except (OSError, struct.error, zlib.error):
+            return statements
+
+        # Every object unpickled stays alive: don't let the garbage collector
+        # walk them over and over.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            values = _Unpickler(io.BytesIO(data), interpreter).load()
+        except pickle.UnpicklingError as e:
+            raise SnapshotError(f"Can't load snapshot '{self.path}': {e}") from None
+        except Exception:
+            raise SnapshotError(
+                f"Can't load snapshot '{self.path}': it is corrupted."
+            ) from None
+        finally:
+            if enabled:
+                gc.enable()
+
+        interpreter.globals.values.update(values)
+        self.start = position
+        return statements[position:]
+
+    def save(self, interpreter: Interpreter) -> None:
+        """Save the globals, to resume after the top-level statement being
+        run."""
+        data = io.BytesIO()
+        try:
+            _Pickler(data, interpreter).dump(interpreter.globals.values)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            raise NativeError(f"Can't snapshot the globals: {e}.") from None
+
+        position = self.start + interpreter.position + 1
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(temporary, "wb") as file:
+                file.write(MAGIC)
+                file.write(HEADER.pack(self.digest, position))
+                file.write(zlib.compress(data.getbuffer(), 1))
+            os.replace(temporary, self.path)
+        except OSError as e:
+            raise NativeError(
+                f"Can't write snapshot '{self.path}': {e.strerror}."
+            ) from None
+
+
+class SnapshotNative(LoxCallable):
+    """`snapshot()`: with --snapshot, save the globals so that later runs of
+    the script resume after the current top-level statement. Does nothing
+    otherwise."""
+
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter: Interpreter, arguments: List[Any]) -> Any:
+        snapshot = interpreter.snapshot
+        if snapshot is None:
+            return None
+        if interpreter.environment is not interpreter.globals:
+            raise NativeError("Can only take a snapshot at the top level.")
+
+        snapshot.save(interpreter)
+        return None
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+class _Pickler(pickle.Pickler):
+    """Pickles Lox values, with references to what the interpreter loading
+    them provides: its globals environment and native functions."""
+
+    def __init__(self, file: io.BytesIO, interpreter: Interpreter) -> None:
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.interpreter = interpreter
+        self.natives = builtinNatives()
+
+    def persistent_id(self, obj: Any) -> Optional[Tuple[str, str]]:
+        if obj is self.interpreter.globals:
+            return ("globals", "")
+
+        name = self.natives.get(nativeKey(obj))
+        if name is not None:
+            return ("native", name)
+
+        return None
+
+    def reducer_override(self, obj: Any) -> Any:
+        if isinstance(obj, (Expr, Stmt)):
+            # Without what running the program cached in the tree.
+            values = {
+                f.name: getattr(obj, f.name)
+                for f in fields(obj)
+                if f.compare or (type(obj), f.name) in KEPT_ANNOTATIONS
+            }
+            return _node, (type(obj), values)
+
+        # Functions and methods are created before their state, which may
+        # refer back to them.
+        if isinstance(obj, LoxFunction):
+            # Memoized results are computed again.
+            state = dict(vars(obj), memo=None, dependencies=None)
+            return _new, (LoxFunction,), state
+
+        if isinstance(obj, NativeMethod):
+            name = next(
+                name
+                for name, (_, function) in obj.target.methods.items()
+                if function is obj.function
+            )
+            return _new, (NativeMethod,), (obj.target, name), None, None, _bindMethod
+
+        if isinstance(obj, LoxMap):
+            # Without the types of the keys, which are Python classes.
+            entries = [(key, value) for (_, key), value in obj.entries.items()]
+            return _new, (LoxMap,), entries, None, None, _fillMap
+
+        if isinstance(obj, LoxArray):
+            # As raw elements, with or without NumPy. Slices come back as
+            # copies.
+            return _array, (obj.data.tobytes(),)
+
+        if isinstance(obj, LoxFile):
+            raise NativeError("Can't snapshot open files.")
+
+        if isinstance(obj, (Module, ModuleExport)):
+            raise NativeError("Can't snapshot imported modules.")
+
+        return NotImplemented
+
+
+class _Unpickler(pickle.Unpickler):
+    """Unpickles what _Pickler stores, and refuses anything else."""
+
+    def __init__(self, file: io.BytesIO, interpreter: Interpreter) -> None:
+        super().__init__(file)
+        self.interpreter = interpreter
+        self.natives: Dict[str, Any] = dict(interpreter.globals.values)
+
+    def find_class(self, module: str, name: str) -> Any:
+        value = _allowedGlobals().get((module, name))
+        if value is None:
+            raise pickle.UnpicklingError(
+                f"it refers to '{module}.{name}', which a snapshot can't hold."
+            )
+
+        return value
+
+    def persistent_load(self, pid: Any) -> Any:
+        if pid == ("globals", ""):
+            return self.interpreter.globals
+
+        kind, name = pid
+        if kind == "native" and name in builtinNatives().values():
+            return self.natives[name]
+
+        raise pickle.UnpicklingError(f"it refers to an unknown native '{name}'.")
+
+
+def _node(cls: type, values: Dict[str, Any]) -> Any:
+    return cls(**values)
+
+
+def _new(cls: type) -> Any:
+    return cls.__new__(cls)
+
+
+def _bindMethod(method: NativeMethod, state: Tuple[Any, str]) -> None:
+    target, name = state
+    arity, function = target.methods[name]
+    NativeMethod.__init__(method, target, arity, function)
+
+
+def _fillMap(map: LoxMap, entries: List[Tuple[Any, Any]]) -> None:
+    LoxMap.__init__(map)
+    map.entries = {(type(key), key): value for key, value in entries}
+
+
+def _array(data: bytes) -> LoxArray:
+    elements = array("d")
+    elements.frombytes(data)
+    return LoxArray.fromIterable(elements)
+
+
+@cache
+def _allowedGlobals() -> Dict[Tuple[str, str], Any]:
+    """What a snapshot may refer to, by module and name."""
+    allowed: List[Any] = [
+        *STORED_CLASSES,
+        _node,
+        _new,
+        _bindMethod,
+        _fillMap,
+        _array,
+    ]
+
+    # Every kind of syntax node.
+    bases = [Expr, Stmt]
+    while bases:
+        for subclass in bases.pop().__subclasses__():
+            allowed.append(subclass)
+            bases.append(subclass)
+
+    return {(value.__module__, value.__qualname__): value for value in allowed}
@@ -1,10 +1,17 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import List, Optional, Protocol, TypeVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional, Protocol, TypeVar
 
-from pylox.expr import Expr
+from pylox.expr import Expr, Variable
 from pylox.token import Token
 
+if TYPE_CHECKING:
+    from pylox.capture import Captures
+    from pylox.optimizer import Slot
+    from pylox.parser import LazyBody
+    from pylox.purity import Purity
+    from pylox.tracing import LoopProfile
+
 T = TypeVar("T", covariant=True)
 
 
@@ -23,10 +30,22 @@ class Block(Stmt):
 
 @dataclass
 class Break(Stmt):
+    keyword: Token
+
     def accept(self, visitor: "StmtVisitor[T]") -> T:
         return visitor.visitBreakStmt(self)
 
 
+@dataclass
+class Class(Stmt):
+    name: Token
+    superclass: Optional[Variable]
+    methods: List["Function"]
+
+    def accept(self, visitor: "StmtVisitor[T]") -> T:
+        return visitor.visitClassStmt(self)
+
+
 @dataclass
 class Expression(Stmt):
     expression: Expr
@@ -35,18 +54,47 @@ class Expression(Stmt):
         return visitor.visitExpressionStmt(self)
 
 
+@dataclass
+class For(Stmt):
+    keyword: Token
+    initializer: Optional[Stmt]
+    condition: Optional[Expr]
+    increment: Optional[Expr]
+    body: Stmt
+
+    # Iteration count and compiled trace, when running with --trace.
+    profile: Optional["LoopProfile"] = field(default=None, compare=False, repr=False)
+
+    # Slots of the loop invariants found by pylox.optimizer, emptied on each
+    # run of the loop.
+    invariants: List["Slot"] = field(default_factory=list, compare=False, repr=False)
+
+    def accept(self, visitor: "StmtVisitor[T]") -> T:
+        return visitor.visitForStmt(self)
+
+
 @dataclass
 class Function(Stmt):
     name: Token
     params: List[Token]
     body: List[Stmt]
 
+    # Set while the body has not been parsed yet, see pylox.parser.parseBody.
+    lazy: Optional["LazyBody"] = field(default=None, compare=False, repr=False)
+
+    # Filled in the first time the function is called in memoizing mode.
+    purity: Optional["Purity"] = field(default=None, compare=False, repr=False)
+
+    # Filled in the first time a closure is created for the function.
+    captures: Optional["Captures"] = field(default=None, compare=False, repr=False)
+
     def accept(self, visitor: "StmtVisitor[T]") -> T:
         return visitor.visitFunctionStmt(self)
 
 
 @dataclass
 class If(Stmt):
+    keyword: Token
     condition: Expr
     thenBranch: Stmt
     elseBranch: Optional[Stmt]
@@ -55,8 +103,18 @@ class If(Stmt):
         return visitor.visitIfStmt(self)
 
 
+@dataclass
+class Import(Stmt):
+    keyword: Token
+    path: Token
+
+    def accept(self, visitor: "StmtVisitor[T]") -> T:
+        return visitor.visitImportStmt(self)
+
+
 @dataclass
 class Print(Stmt):
+    keyword: Token
     expression: Expr
 
     def accept(self, visitor: "StmtVisitor[T]") -> T:
@@ -83,9 +141,17 @@ class Var(Stmt):
 
 @dataclass
 class While(Stmt):
+    keyword: Token
     condition: Expr
     body: Stmt
 
+    # Iteration count and compiled trace, when running with --trace.
+    profile: Optional["LoopProfile"] = field(default=None, compare=False, repr=False)
+
+    # Slots of the loop invariants found by pylox.optimizer, emptied on each
+    # run of the loop.
+    invariants: List["Slot"] = field(default_factory=list, compare=False, repr=False)
+
     def accept(self, visitor: "StmtVisitor[T]") -> T:
         return visitor.visitWhileStmt(self)
 
@@ -95,12 +161,18 @@ class StmtVisitor(Protocol[T]):
 
     def visitBreakStmt(self, stmt: Break) -> T: ...
 
+    def visitClassStmt(self, stmt: Class) -> T: ...
+
     def visitExpressionStmt(self, stmt: Expression) -> T: ...
 
+    def visitForStmt(self, stmt: For) -> T: ...
+
     def visitFunctionStmt(self, stmt: Function) -> T: ...
 
     def visitIfStmt(self, stmt: If) -> T: ...
 
+    def visitImportStmt(self, stmt: Import) -> T: ...
+
     def visitPrintStmt(self, stmt: Print) -> T: ...
 
     def visitReturnStmt(self, stmt: Return) -> T: ...
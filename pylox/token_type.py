@@ -45,6 +45,7 @@ class TokenType(Enum):
     FUN = auto()
     FOR = auto()
     IF = auto()
+    IMPORT = auto()
     NIL = auto()
     OR = auto()
 
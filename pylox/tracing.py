@@ -0,0 +1,473 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from pylox.environment import Environment
+from pylox.error import LoxRuntimeError
+from pylox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Conditional,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from pylox.stmt import (
+    Block,
+    Break,
+    Class,
+    Expression,
+    For,
+    Function,
+    If,
+    Import,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from pylox.token import Token
+from pylox.token_type import TokenType
+
+if TYPE_CHECKING:
+    from pylox.interpreter import Interpreter
+
+# Iterations after which a loop is compiled.
+HOT_LOOP_ITERATIONS = 50
+
+# Guard failures after which a compiled loop is thrown away.
+DEOPTIMIZATION_LIMIT = 8
+
+# Python operators for Binary nodes on two numbers, and the type they yield.
+NUMBER_OPERATORS: Dict[TokenType, Tuple[str, type]] = {
+    TokenType.BANG_EQUAL: ("!=", bool),
+    TokenType.EQUAL_EQUAL: ("==", bool),
+    TokenType.GREATER: (">", bool),
+    TokenType.GREATER_EQUAL: (">=", bool),
+    TokenType.LESS: ("<", bool),
+    TokenType.LESS_EQUAL: ("<=", bool),
+    TokenType.MINUS: ("-", float),
+    TokenType.PLUS: ("+", float),
+    TokenType.STAR: ("*", float),
+}
+
+# Types a compiled loop can keep its variables in.
+TRACEABLE_TYPES = (float, bool)
+
+
+class Deoptimize(Exception):
+    """A guard failed in compiled code: go back to the tree-walker."""
+
+
+class Untraceable(Exception):
+    """The loop uses something the compiler does not handle."""
+
+
+def _divide(left: float, right: float) -> float:
+    # The tree-walker reports the error.
+    if right == 0:
+        raise Deoptimize()
+
+    return left / right
+
+
+@dataclass
+class Trace:
+    """A loop compiled to a Python function over its variables.
+
+    The function takes the values of `names` and runs the loop to its end. It
+    returns the new values and True, or, when a guard fails, the values at the
+    start of the iteration it could not finish and False. Iterations have no
+    effect other than on those variables, so the tree-walker can run that
+    iteration again.
+    """
+
+    names: List[Token]
+    # Types the variables had when the loop was compiled, guarded on entry.
+    types: List[type]
+    function: Callable[[List[Any]], Tuple[List[Any], bool]]
+    source: str
+    deoptimizations: int = 0
+
+
+@dataclass
+class LoopProfile:
+    """Runtime information the tracer keeps on a While or For node."""
+
+    iterations: int = 0
+    trace: Optional[Trace] = None
+    # Set when the loop can't be compiled, or deoptimized too often.
+    failed: bool = False
+
+
+@dataclass
+class TraceStats:
+    compiled: int = 0
+    executed: int = 0
+    deoptimized: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"traces: {self.compiled} compiled, {self.executed} executed, "
+            f"{self.deoptimized} deoptimized"
+        )
+
+
+@dataclass
+class Tracer:
+    """Run loops, compiling those that get hot into type-specialised Python.
+
+    A loop is compiled once it has run HOT_LOOP_ITERATIONS iterations, for the
+    types its variables have at that point. Only loops whose body does nothing
+    but compute with numbers and booleans in existing variables are compiled:
+    no declarations, calls, prints or property accesses.
+    """
+
+    stats: TraceStats = field(default_factory=TraceStats)
+
+    def runLoop(
+        self,
+        interpreter: "Interpreter",
+        loop: Stmt,
+        condition: Optional[Expr],
+        body: List[Stmt],
+        increment: Optional[Expr],
+    ) -> None:
+        profile: LoopProfile = loop.profile  # type: ignore
+        if profile is None:
+            profile = LoopProfile()
+            loop.profile = profile  # type: ignore
+
+        while True:
+            if not profile.failed:
+                if self._enter(interpreter, profile, condition, body, increment):
+                    return
+
+            if condition is not None and not interpreter._isTruthy(
+                interpreter._evaluate(condition)
+            ):
+                return
+
+            for statement in body:
+                statement.accept(interpreter)
+
+            if increment is not None:
+                interpreter._evaluate(increment)
+
+    def _enter(
+        self,
+        interpreter: "Interpreter",
+        profile: LoopProfile,
+        condition: Optional[Expr],
+        body: List[Stmt],
+        increment: Optional[Expr],
+    ) -> bool:
+        """Run the rest of the loop in compiled code if possible, telling
+        whether it ran to its end."""
+        environment = interpreter.environment
+
+        trace = profile.trace
+        if trace is None:
+            profile.iterations += 1
+            if profile.iterations < HOT_LOOP_ITERATIONS:
+                return False
+
+            try:
+                trace = TraceCompiler().compile(condition, body, increment, environment)
+            except (Untraceable, LoxRuntimeError):
+                profile.failed = True
+                return False
+
+            profile.trace = trace
+            self.stats.compiled += 1
+
+        values = [environment.get(name) for name in trace.names]
+        if all(type(v) is t for v, t in zip(values, trace.types)):
+            self.stats.executed += 1
+            values, finished = trace.function(values)
+            for name, value in zip(trace.names, values):
+                environment.assign(name, value)
+
+            if finished:
+                return True
+
+        self.stats.deoptimized += 1
+        trace.deoptimizations += 1
+        if trace.deoptimizations >= DEOPTIMIZATION_LIMIT:
+            profile.trace = None
+            profile.failed = True
+
+        return False
+
+
+class TraceCompiler(ExprVisitor[Tuple[str, type]], StmtVisitor[None]):
+    """Compile a loop into the Python source of a Trace function.
+
+    Expressions compile to a Python expression and the type it yields, known
+    from the types the loop's variables have when it is compiled. Anything
+    else raises Untraceable.
+    """
+
+    def __init__(self) -> None:
+        self.environment: Environment = Environment()
+        self.locals: Dict[str, Tuple[str, type]] = {}
+        self.names: List[Token] = []
+        self.lines: List[str] = []
+        self.indent: int = 0
+
+    def compile(
+        self,
+        condition: Optional[Expr],
+        body: List[Stmt],
+        increment: Optional[Expr],
+        environment: Environment,
+    ) -> Trace:
+        self.environment = environment
+        self.locals = {}
+        self.names = []
+        self.lines = []
+        self.indent = 2
+
+        # Save the variables before the condition, which may assign them too.
+        self._emit("while True:")
+        self.indent += 1
+        self._emit("saved = [{variables}]")
+        if condition is not None:
+            self._emit(f"if not {self._truthy(condition)}:")
+            self._emit("    break")
+        self._compileStatements(body)
+        if increment is not None:
+            self._emit(self._compileExpr(increment)[0])
+
+        variables = ", ".join(slot for slot, _ in self.locals.values())
+        unpack = f"{variables}," if self.locals else "_"
+        lines = [
+            "def trace(values):",
+            f"    {unpack} = values",
+            "    saved = values",
+            "    try:",
+            *[line.replace("{variables}", variables) for line in self.lines],
+            "    except Deoptimize:",
+            "        return saved, False",
+            f"    return [{variables}], True",
+        ]
+        source = "\n".join(lines)
+
+        namespace: Dict[str, Any] = {"Deoptimize": Deoptimize, "_divide": _divide}
+        exec(source, namespace)
+
+        types = [type_ for _, type_ in self.locals.values()]
+        return Trace(self.names, types, namespace["trace"], source)
+
+    def visitBlockStmt(self, stmt: Block) -> None:
+        self._compileStatements(stmt.statements)
+
+    def visitBreakStmt(self, stmt: Break) -> None:
+        self._emit("break")
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        raise Untraceable()
+
+    def visitExpressionStmt(self, stmt: Expression) -> None:
+        self._emitDiscarded(stmt.expression)
+
+    def visitForStmt(self, stmt: For) -> None:
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        if stmt.condition is None:
+            self._emit("while True:")
+        else:
+            self._emit(f"while {self._truthy(stmt.condition)}:")
+        self.indent += 1
+        self._emit("pass")
+        stmt.body.accept(self)
+        if stmt.increment is not None:
+            self._emitDiscarded(stmt.increment)
+        self.indent -= 1
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        raise Untraceable()
+
+    def visitIfStmt(self, stmt: If) -> None:
+        self._emit(f"if {self._truthy(stmt.condition)}:")
+        self.indent += 1
+        self._emit("pass")
+        stmt.thenBranch.accept(self)
+        self.indent -= 1
+
+        if stmt.elseBranch is not None:
+            self._emit("else:")
+            self.indent += 1
+            self._emit("pass")
+            stmt.elseBranch.accept(self)
+            self.indent -= 1
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        raise Untraceable()
+
+    def visitPrintStmt(self, stmt: Print) -> None:
+        # Output can't be taken back when a later guard fails.
+        raise Untraceable()
+
+    def visitReturnStmt(self, stmt: Return) -> None:
+        raise Untraceable()
+
+    def visitVarStmt(self, stmt: Var) -> None:
+        raise Untraceable()
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        self._emit(f"while {self._truthy(stmt.condition)}:")
+        self.indent += 1
+        self._emit("pass")
+        stmt.body.accept(self)
+        self.indent -= 1
+
+    def visitAssignExpr(self, expr: Assign) -> Tuple[str, type]:
+        value, type_ = self._compileExpr(expr.value)
+        slot, variable_type = self._local(expr.name)
+        if type_ is not variable_type:
+            raise Untraceable()
+
+        return f"({slot} := {value})", type_
+
+    def visitBinaryExpr(self, expr: Binary) -> Tuple[str, type]:
+        left, left_type = self._compileExpr(expr.left)
+        right, right_type = self._compileExpr(expr.right)
+        operator = expr.operator.type
+
+        if operator in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+            python, _ = NUMBER_OPERATORS[operator]
+            return f"({left} {python} {right})", bool
+
+        if left_type is not float or right_type is not float:
+            raise Untraceable()
+
+        if operator == TokenType.SLASH:
+            return f"_divide({left}, {right})", float
+
+        if operator not in NUMBER_OPERATORS:
+            raise Untraceable()
+
+        python, type_ = NUMBER_OPERATORS[operator]
+        return f"({left} {python} {right})", type_
+
+    def visitCallExpr(self, expr: Call) -> Tuple[str, type]:
+        raise Untraceable()
+
+    def visitConditionalExpr(self, expr: Conditional) -> Tuple[str, type]:
+        # Python truthiness, like the tree-walker: 0 is false here.
+        condition, _ = self._compileExpr(expr.condition)
+        left, left_type = self._compileExpr(expr.left)
+        right, right_type = self._compileExpr(expr.right)
+        if left_type is not right_type:
+            raise Untraceable()
+
+        return f"({left} if {condition} else {right})", left_type
+
+    def visitGetExpr(self, expr: Get) -> Tuple[str, type]:
+        raise Untraceable()
+
+    def visitGroupingExpr(self, expr: Grouping) -> Tuple[str, type]:
+        return self._compileExpr(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> Tuple[str, type]:
+        if type(expr.value) not in TRACEABLE_TYPES:
+            raise Untraceable()
+
+        return repr(expr.value), type(expr.value)
+
+    def visitLogicalExpr(self, expr: Logical) -> Tuple[str, type]:
+        left, left_type = self._compileExpr(expr.left)
+        right, right_type = self._compileExpr(expr.right)
+        if left_type is not right_type:
+            raise Untraceable()
+
+        if left_type is bool:
+            python = "or" if expr.operator.type == TokenType.OR else "and"
+            return f"({left} {python} {right})", bool
+
+        # Numbers are always truthy: `or` yields the left operand without
+        # evaluating the right one, `and` evaluates both and yields the right.
+        if expr.operator.type == TokenType.OR:
+            return left, float
+
+        return f"({left}, {right})[1]", float
+
+    def visitSetExpr(self, expr: Set) -> Tuple[str, type]:
+        raise Untraceable()
+
+    def visitSuperExpr(self, expr: Super) -> Tuple[str, type]:
+        raise Untraceable()
+
+    def visitThisExpr(self, expr: This) -> Tuple[str, type]:
+        raise Untraceable()
+
+    def visitUnaryExpr(self, expr: Unary) -> Tuple[str, type]:
+        right, type_ = self._compileExpr(expr.right)
+
+        if expr.operator.type == TokenType.BANG:
+            return f"(not {self._truthyCode(right, type_)})", bool
+
+        if type_ is not float:
+            raise Untraceable()
+
+        return f"(-{right})", float
+
+    def visitVariableExpr(self, expr: Variable) -> Tuple[str, type]:
+        return self._local(expr.name)
+
+    def _local(self, name: Token) -> Tuple[str, type]:
+        """The Python local holding a variable, and the type it is guarded
+        to have."""
+        local = self.locals.get(name.lexeme)
+        if local is None:
+            # Raises LoxRuntimeError if it is not defined.
+            value = self.environment.get(name)
+            if type(value) not in TRACEABLE_TYPES:
+                raise Untraceable()
+
+            local = (f"v{len(self.locals)}", type(value))
+            self.locals[name.lexeme] = local
+            self.names.append(name)
+
+        return local
+
+    def _truthy(self, expr: Expr) -> str:
+        return self._truthyCode(*self._compileExpr(expr))
+
+    def _truthyCode(self, code: str, type_: type) -> str:
+        # Numbers are always truthy, still evaluate them for assignments.
+        return code if type_ is bool else f"({code}, True)[1]"
+
+    def _compileStatements(self, statements: List[Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def _compileExpr(self, expr: Optional[Expr]) -> Tuple[str, type]:
+        if expr is None:
+            raise Untraceable()
+
+        return expr.accept(self)
+
+    def _emitDiscarded(self, expr: Expr) -> None:
+        """Evaluate an expression for its effects only. The operands of a
+        comma are evaluated in turn; its value, nil, is never traced."""
+        if isinstance(expr, Binary) and expr.operator.type == TokenType.COMMA:
+            self._emitDiscarded(expr.left)
+            self._emitDiscarded(expr.right)
+        else:
+            self._emit(self._compileExpr(expr)[0])
+
+    def _emit(self, line: str) -> None:
+        self.lines.append("    " * self.indent + line)
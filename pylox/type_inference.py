@@ -0,0 +1,459 @@
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from pylox.expr import (
+    Assign,
+    Binary,
+    Call,
+    Conditional,
+    Expr,
+    ExprVisitor,
+    Get,
+    Grouping,
+    Literal,
+    Logical,
+    Set,
+    Super,
+    This,
+    Unary,
+    Variable,
+)
+from pylox.inliner import Bindings
+from pylox.interpreter import FLOAT_OPERATIONS
+from pylox.stmt import (
+    Block,
+    Break,
+    Class,
+    Expression,
+    For,
+    Function,
+    If,
+    Import,
+    Print,
+    Return,
+    Stmt,
+    StmtVisitor,
+    Var,
+    While,
+)
+from pylox.token_type import TokenType
+
+# Operators that check their operands are numbers.
+NUMBER_OPERATORS = (
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+    TokenType.MINUS,
+    TokenType.SLASH,
+    TokenType.STAR,
+)
+
+COMPARISONS = (
+    TokenType.BANG_EQUAL,
+    TokenType.EQUAL_EQUAL,
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+)
+
+
+class LoxType(Enum):
+    NUMBER = "number"
+    STRING = "string"
+    BOOLEAN = "boolean"
+    NIL = "nil"
+    # Anything, including the types above.
+    UNKNOWN = "unknown"
+
+
+# The types of the variables in each scope, innermost last, or None where
+# the code can't be reached.
+State = Optional[List[Dict[str, LoxType]]]
+
+
+class TypeInference(ExprVisitor[LoxType], StmtVisitor[None]):
+    """Prove that the operands of arithmetic and comparisons are numbers, so
+    that the interpreter can skip checking them.
+
+    The types of local variables are followed through each function body
+    and the top-level code, in the order statements run: joined after
+    branches and iterated to a fixed point around loops. A variable is known
+    to be a number after it is assigned one, such as a literal or the result
+    of arithmetic, or after an operation that checks it is one has succeeded.
+    Variables of enclosing functions and parameters are unknown.
+
+    A call may run any function, which may assign to the variables it doesn't
+    declare itself: after a call, those variables are unknown again. The
+    first run of the pass only finds them, the second annotates the program.
+    Programs that import modules or have function bodies that were not parsed
+    yet are left alone, since that code may declare or assign any name.
+    """
+
+    def __init__(self) -> None:
+        self.state: State = [{}]
+        self.in_function: bool = False
+
+        # Where loops are left by `break`, innermost last: the state at each
+        # `break` and the number of scopes around the loop.
+        self.breaks: List[Tuple[List[State], int]] = []
+
+        # Names assigned to by function bodies that don't declare them, once
+        # they are all known.
+        self.free_assigned: set[str] = set()
+        self.complete: bool = False
+
+        # Whether each checking operation, by id, always had number operands.
+        self.proven: Dict[int, Tuple[Binary | Unary, bool]] = {}
+
+    def infer(self, statements: List[Stmt]) -> None:
+        """Annotate a program, in place."""
+        program = Bindings()
+        program.analyze(statements)
+        if not program.complete:
+            return
+
+        # The first run, with every variable unknown after a call, finds the
+        # variables calls may assign to.
+        self._run(statements)
+        self.complete = True
+        self._run(statements)
+
+        for node, proven in self.proven.values():
+            if not proven:
+                continue
+
+            if isinstance(node, Binary):
+                node.typed = FLOAT_OPERATIONS[node.operator.type]
+            else:
+                node.typed = True
+
+    def _run(self, statements: List[Stmt]) -> None:
+        self.state = [{}]
+        self.proven = {}
+        for statement in statements:
+            statement.accept(self)
+
+    def visitBlockStmt(self, stmt: Block) -> None:
+        self._push()
+        for statement in stmt.statements:
+            statement.accept(self)
+        self._pop()
+
+    def visitBreakStmt(self, stmt: Break) -> None:
+        if self.state is not None and self.breaks:
+            states, depth = self.breaks[-1]
+            states.append(_copy(self.state[:depth]))
+
+        self.state = None
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        if stmt.superclass is not None:
+            stmt.superclass.accept(self)
+
+        self._declare(stmt.name.lexeme, LoxType.UNKNOWN)
+        for method in stmt.methods:
+            self._function(method)
+
+    def visitExpressionStmt(self, stmt: Expression) -> None:
+        self._infer(stmt.expression)
+
+    def visitForStmt(self, stmt: For) -> None:
+        self._push()
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        self._loop(stmt.condition, stmt.body, stmt.increment)
+        self._pop()
+
+    def visitFunctionStmt(self, stmt: Function) -> None:
+        # Declared first, so that the body can call the function.
+        self._declare(stmt.name.lexeme, LoxType.UNKNOWN)
+        self._function(stmt)
+
+    def visitIfStmt(self, stmt: If) -> None:
+        self._infer(stmt.condition)
+
+        before = _copy(self.state)
+        stmt.thenBranch.accept(self)
+        after = self.state
+
+        self.state = before
+        if stmt.elseBranch is not None:
+            stmt.elseBranch.accept(self)
+
+        self.state = _join(after, self.state)
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        pass
+
+    def visitPrintStmt(self, stmt: Print) -> None:
+        self._infer(stmt.expression)
+
+    def visitReturnStmt(self, stmt: Return) -> None:
+        if stmt.value is not None:
+            self._infer(stmt.value)
+
+        self.state = None
+
+    def visitVarStmt(self, stmt: Var) -> None:
+        kind = LoxType.NIL
+        if stmt.initializer is not None:
+            kind = self._infer(stmt.initializer)
+
+        self._declare(stmt.name.lexeme, kind)
+
+    def visitWhileStmt(self, stmt: While) -> None:
+        self._loop(stmt.condition, stmt.body, None)
+
+    def visitAssignExpr(self, expr: Assign) -> LoxType:
+        kind = self._infer(expr.value)
+
+        name = expr.name.lexeme
+        scope = self._lookup(name)
+        if scope is not None:
+            scope[name] = kind
+        elif self.in_function:
+            self.free_assigned.add(name)
+
+        return kind
+
+    def visitBinaryExpr(self, expr: Binary) -> LoxType:
+        left = self._infer(expr.left)
+        right = self._infer(expr.right)
+
+        operator = expr.operator.type
+        if operator in NUMBER_OPERATORS:
+            self._prove(expr, left is LoxType.NUMBER and right is LoxType.NUMBER)
+            # Past this point, the operation has checked both operands. The
+            # left one was read before the right one ran, which may have
+            # assigned to it.
+            if _isTrivial(expr.right):
+                self._refine(expr.left)
+            self._refine(expr.right)
+        elif operator == TokenType.PLUS:
+            numbers = left is LoxType.NUMBER and right is LoxType.NUMBER
+            self._prove(expr, numbers)
+            if numbers:
+                return LoxType.NUMBER
+            if LoxType.STRING in (left, right):
+                return LoxType.STRING
+            return LoxType.UNKNOWN
+
+        if operator in COMPARISONS:
+            return LoxType.BOOLEAN
+        if operator in (TokenType.MINUS, TokenType.SLASH, TokenType.STAR):
+            return LoxType.NUMBER
+        if operator == TokenType.COMMA:
+            # The interpreter evaluates both operands and gives nil.
+            return LoxType.NIL
+        return LoxType.UNKNOWN
+
+    def visitCallExpr(self, expr: Call) -> LoxType:
+        self._infer(expr.callee)
+        for argument in expr.arguments:
+            self._infer(argument)
+
+        self.state = _forget(self.state, self.free_assigned if self.complete else None)
+        return LoxType.UNKNOWN
+
+    def visitConditionalExpr(self, expr: Conditional) -> LoxType:
+        self._infer(expr.condition)
+
+        before = _copy(self.state)
+        left = self._infer(expr.left)
+        after = self.state
+
+        self.state = before
+        right = self._infer(expr.right)
+
+        self.state = _join(after, self.state)
+        return left if left is right else LoxType.UNKNOWN
+
+    def visitGetExpr(self, expr: Get) -> LoxType:
+        self._infer(expr.object)
+        return LoxType.UNKNOWN
+
+    def visitGroupingExpr(self, expr: Grouping) -> LoxType:
+        return self._infer(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> LoxType:
+        return _typeOf(expr.value)
+
+    def visitLogicalExpr(self, expr: Logical) -> LoxType:
+        left = self._infer(expr.left)
+
+        before = _copy(self.state)
+        right = self._infer(expr.right)
+        self.state = _join(before, self.state)
+
+        return left if left is right else LoxType.UNKNOWN
+
+    def visitSetExpr(self, expr: Set) -> LoxType:
+        self._infer(expr.object)
+        return self._infer(expr.value)
+
+    def visitSuperExpr(self, expr: Super) -> LoxType:
+        return LoxType.UNKNOWN
+
+    def visitThisExpr(self, expr: This) -> LoxType:
+        return LoxType.UNKNOWN
+
+    def visitUnaryExpr(self, expr: Unary) -> LoxType:
+        right = self._infer(expr.right)
+
+        if expr.operator.type == TokenType.BANG:
+            return LoxType.BOOLEAN
+
+        self._prove(expr, right is LoxType.NUMBER)
+        self._refine(expr.right)
+        return LoxType.NUMBER
+
+    def visitVariableExpr(self, expr: Variable) -> LoxType:
+        name = expr.name.lexeme
+        scope = self._lookup(name)
+        return scope[name] if scope is not None else LoxType.UNKNOWN
+
+    def _infer(self, expr: Optional[Expr]) -> LoxType:
+        if expr is None or self.state is None:
+            return LoxType.UNKNOWN
+
+        return expr.accept(self)
+
+    def _loop(
+        self, condition: Optional[Expr], body: Stmt, increment: Optional[Expr]
+    ) -> None:
+        depth = len(self.state) if self.state is not None else 0
+
+        # Each iteration may start with the state left by the previous one:
+        # iterate until joining it in changes nothing. There are few types,
+        # so this takes a few rounds at most.
+        head = _copy(self.state)
+        while True:
+            self.state = _copy(head)
+            self._infer(condition)
+            exit = _copy(self.state)
+
+            breaks: List[State] = []
+            self.breaks.append((breaks, depth))
+            try:
+                body.accept(self)
+                self._infer(increment)
+            finally:
+                self.breaks.pop()
+
+            joined = _join(head, self.state)
+            if joined == head:
+                break
+            head = joined
+
+        for state in breaks:
+            exit = _join(exit, state)
+        self.state = exit
+
+    def _function(self, stmt: Function) -> None:
+        # The body runs whenever the function is called: the variables it
+        # doesn't declare may have any type by then.
+        state, in_function, breaks = self.state, self.in_function, self.breaks
+        self.state = [{param.lexeme: LoxType.UNKNOWN for param in stmt.params}]
+        self.in_function = True
+        self.breaks = []
+        try:
+            for statement in stmt.body:
+                statement.accept(self)
+        finally:
+            self.state, self.in_function, self.breaks = state, in_function, breaks
+
+    def _prove(self, node: Binary | Unary, proven: bool) -> None:
+        entry = self.proven.get(id(node))
+        if entry is not None:
+            proven = proven and entry[1]
+        self.proven[id(node)] = (node, proven)
+
+    def _refine(self, expr: Optional[Expr]) -> None:
+        while type(expr) is Grouping:
+            expr = expr.expression
+        if type(expr) is Variable:
+            name = expr.name.lexeme
+            scope = self._lookup(name)
+            if scope is not None:
+                scope[name] = LoxType.NUMBER
+
+    def _declare(self, name: str, kind: LoxType) -> None:
+        if self.state is not None:
+            self.state[-1][name] = kind
+
+    def _lookup(self, name: str) -> Optional[Dict[str, LoxType]]:
+        if self.state is None:
+            return None
+
+        for scope in reversed(self.state):
+            if name in scope:
+                return scope
+
+        return None
+
+    def _push(self) -> None:
+        if self.state is not None:
+            self.state.append({})
+
+    def _pop(self) -> None:
+        if self.state is not None:
+            self.state.pop()
+
+
+def _typeOf(value: object) -> LoxType:
+    if isinstance(value, bool):
+        return LoxType.BOOLEAN
+    if isinstance(value, float):
+        return LoxType.NUMBER
+    if isinstance(value, str):
+        return LoxType.STRING
+    if value is None:
+        return LoxType.NIL
+
+    return LoxType.UNKNOWN
+
+
+def _isTrivial(expr: Optional[Expr]) -> bool:
+    while type(expr) is Grouping:
+        expr = expr.expression
+    return type(expr) in (Literal, Variable)
+
+
+def _copy(state: State) -> State:
+    return [dict(scope) for scope in state] if state is not None else None
+
+
+def _join(left: State, right: State) -> State:
+    """The state after either of two paths that meet."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+
+    joined = []
+    for left_scope, right_scope in zip(left, right):
+        scope = {}
+        for name in left_scope.keys() | right_scope.keys():
+            kind = left_scope.get(name)
+            scope[name] = kind if kind is right_scope.get(name) else LoxType.UNKNOWN
+        joined.append(scope)
+
+    return joined
+
+
+def _forget(state: State, names: Optional[set[str]]) -> State:
+    """The state once the variables in `names`, or all of them, may have
+    been assigned any value."""
+    if state is None:
+        return None
+
+    return [
+        {
+            name: kind if names is not None and name not in names else LoxType.UNKNOWN
+            for name, kind in scope.items()
+        }
+        for scope in state
+    ]